@@ -0,0 +1,261 @@
+"""Benchmark do crawl completo contra uma cópia local e sintética do site.
+
+Sobe `benchmarks.servidor_loja` em outro processo, executa `baixar_site` de ponta a
+ponta apontando para ele e gravando em um banco SQLite temporário (ou no banco de
+`--banco`) e imprime um JSON com páginas/s, tempo de parsing por página, pico de
+memória do processo e da etapa de processamento, tempo de gravação por etapa, os
+índices usados pelas consultas principais (`benchmarks.indices`) e a latência das
+consultas pontuais do histórico (`benchmarks.consultas`). Com `--saida` o
+resultado é acrescentado em um arquivo JSON Lines, para comparar execuções ao longo
+do tempo.
+
+O crawl roda em dois dias: no primeiro, com o banco vazio, só as listagens raiz (sem
+categoria); no seguinte as folhas, que categorizam os produtos e atualizam o índice por
+categoria (campo `folhas`). Os índices e as consultas são medidos depois do segundo dia.
+
+Uso:
+    python -m benchmarks.crawl --produtos 20000 --cidades 6 --taxa-429 0.02 --saida bench.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+RAIZ_REPO = Path(__file__).resolve().parent.parent
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def aguardar_servidor(url, processo, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError("Servidor do benchmark encerrou ao iniciar.")
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Servidor do benchmark não respondeu em {url}.")
+
+
+def versao_codigo():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ_REPO, text=True, stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def medir_parsing(args, repeticoes=5):
+    """Tempo médio de parsing (ms) de uma listagem de categoria raiz, por backend instalado."""
+    from benchmarks.servidor_loja import CatalogoSintetico, gerar_listagem
+    from scraper.utils.product_parser import BACKENDS, backend_disponivel, parsear_pagina
+
+    catalogo = CatalogoSintetico(args.produtos, args.raizes, args.folhas_por_raiz, args.cidades)
+    html = gerar_listagem(catalogo, "raiz-0", catalogo.cidades[0])
+    tempos = {}
+    for backend in BACKENDS:
+        if not backend_disponivel(backend):
+            continue
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            produtos, _, _ = parsear_pagina(html, None, backend)
+        tempos[backend] = round((time.perf_counter() - inicio) / repeticoes * 1000, 3)
+    return {"cards_por_pagina": len(produtos), "ms_por_pagina": tempos}
+
+
+def medir_processamento(args):
+    """Tempo e pico de memória (tracemalloc) de `processar_dados_brutos` sobre o catálogo inteiro.
+
+    Monta os resultados das listagens raiz (sem categoria) e das folhas (com a categoria) de
+    todas as cidades direto do catálogo sintético, sem HTML, e mede só a etapa de
+    processamento que antecede a gravação.
+    """
+    from benchmarks.servidor_loja import CatalogoSintetico
+    from database import processar_dados_brutos
+
+    catalogo = CatalogoSintetico(args.produtos, args.raizes, args.folhas_por_raiz, args.cidades)
+    listagens = [(f"raiz-{raiz}", None) for raiz in range(args.raizes)]
+    listagens += [(folha, folha) for folha in catalogo.folhas]
+    resultados = []
+    for caminho, categoria in listagens:
+        itens = catalogo.produtos(caminho)
+        for cidade in catalogo.cidades:
+            presentes = [i for i in itens if catalogo.disponivel(i, cidade)]
+            produtos = [(i, f"Produto {i}", f"/produto/produto-sintetico-{i}", categoria) for i in presentes]
+            precos = [(i, round(catalogo.preco(i, cidade) * 100)) for i in presentes]
+            resultados.append((produtos, precos, cidade))
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    dados = processar_dados_brutos(resultados)
+    tempo = time.perf_counter() - inicio
+    retido, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "linhas": sum(len(produtos) for produtos, _, _ in resultados),
+        "linhas_com_categoria": sum(len(produtos) for produtos, _, _ in resultados if produtos and produtos[0][3]),
+        "precos_variaveis": len(dados.precos_variaveis),
+        "tempo_ms": round(tempo * 1000, 1),
+        "pico_mb": round(pico / 1024 / 1024, 1),
+        "retido_mb": round(retido / 1024 / 1024, 1),
+    }
+
+
+def configurar_ambiente(args, diretorio, porta):
+    """Variáveis lidas na importação dos módulos do scraper; precisam vir antes dos imports."""
+    os.environ["DATABASE_URL"] = args.banco or f"sqlite:///{diretorio / 'benchmark.db'}"
+    os.environ["SITE_URL"] = f"http://127.0.0.1:{porta}"
+    os.environ["CACHE_ATIVO"] = "1" if args.cache else "0"
+    os.environ["CACHE_CAMINHO"] = str(diretorio / "cache_respostas.db")
+    os.environ["CHECKPOINT_ATIVO"] = "0"
+    os.environ["CONCORRENCIA_CAMINHO"] = str(diretorio / "concorrencia.json")
+    os.environ["ZONAS_ATIVO"] = "0"
+    # o primeiro dia (nenhum produto sem categoria) baixa as raízes e o seguinte as folhas
+    os.environ["LIMITE_SEM_CATEGORIA"] = "1"
+    if args.workers:
+        os.environ["CRAWLER_WORKERS"] = str(args.workers)
+    if args.backend:
+        os.environ["PARSER_BACKEND"] = args.backend
+
+    # o load_cookie lê o cookies.json do diretório atual
+    regioes = {f"Cidade {i}": [f"cidade-{i}"] for i in range(args.cidades)}
+    (diretorio / "cookies.json").write_text(json.dumps({"regions": regioes}), encoding="utf-8")
+    os.chdir(diretorio)
+
+
+def adiantar_data(dias):
+    """Faz `obter_data_atual` devolver a data `dias` à frente nos módulos do projeto já importados."""
+    from utils import data
+
+    original = data.obter_data_atual
+    adiantada = original() + timedelta(days=dias)
+    for nome, modulo in list(sys.modules.items()):
+        if nome.split(".")[0] not in {"database", "scraper", "utils"}:
+            continue
+        if getattr(modulo, "obter_data_atual", None) is original:
+            modulo.obter_data_atual = lambda: adiantada
+
+
+def estatisticas_servidor(porta):
+    with urllib.request.urlopen(f"http://127.0.0.1:{porta}/_estatisticas") as resposta:
+        return json.load(resposta)
+
+
+def executar_dia(porta):
+    """Executa o `baixar_site` de um dia e retorna os tempos e as páginas servidas nele."""
+    from scraper.site_downloader import baixar_site
+    from utils.metricas import CRONOMETRO
+
+    antes = estatisticas_servidor(porta)
+    CRONOMETRO.limpar()
+    inicio = time.perf_counter()
+    asyncio.run(baixar_site())
+    total = time.perf_counter() - inicio
+    depois = estatisticas_servidor(porta)
+
+    tempo_crawl = CRONOMETRO.resumo().get("crawl", total)
+    paginas = depois["200"] - antes["200"]
+    return {
+        "tempo_total_s": round(total, 3),
+        "tempo_crawl_s": round(tempo_crawl, 3),
+        "paginas": paginas,
+        "paginas_por_segundo": round(paginas / tempo_crawl, 2) if tempo_crawl else None,
+        "respostas_429": depois["429"] - antes["429"],
+        "respostas_503": depois["503"] - antes["503"],
+        "mb_baixados": round((depois["bytes"] - antes["bytes"]) / 1024 / 1024, 2),
+        "tempo_db_s": CRONOMETRO.resumo("db."),
+    }
+
+
+def executar(args):
+    porta = porta_livre()
+    comando = [
+        sys.executable, "-m", "benchmarks.servidor_loja",
+        "--porta", str(porta),
+        "--produtos", str(args.produtos),
+        "--raizes", str(args.raizes),
+        "--folhas-por-raiz", str(args.folhas_por_raiz),
+        "--cidades", str(args.cidades),
+        "--taxa-429", str(args.taxa_429),
+        "--taxa-503", str(args.taxa_503),
+    ]
+    servidor = subprocess.Popen(comando, cwd=RAIZ_REPO)
+    try:
+        aguardar_servidor(f"http://127.0.0.1:{porta}/_estatisticas", servidor)
+        with tempfile.TemporaryDirectory(prefix="benchmark_crawl_") as tmp:
+            diretorio_original = Path.cwd()
+            configurar_ambiente(args, Path(tmp), porta)
+            try:
+                from benchmarks.consultas import medir_consultas
+                from benchmarks.indices import verificar_indices
+                from database import ENGINE, aplicar_migracoes
+                from utils.metricas import pico_memoria_mb
+
+                aplicar_migracoes()
+                raizes = executar_dia(porta)
+                adiantar_data(1)
+                folhas = executar_dia(porta)
+                indices = verificar_indices(ENGINE)
+                consultas = medir_consultas()
+            finally:
+                os.chdir(diretorio_original)
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+    return {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "versao": versao_codigo(),
+        "parametros": vars(args),
+        **raizes,
+        "folhas": folhas,
+        "parsing": medir_parsing(args),
+        "processamento": medir_processamento(args),
+        "pico_rss_mb": round(pico_memoria_mb(), 1),
+        "indices": indices,
+        "consultas": consultas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--produtos", type=int, default=20000)
+    parser.add_argument("--raizes", type=int, default=40)
+    parser.add_argument("--folhas-por-raiz", type=int, default=4)
+    parser.add_argument("--cidades", type=int, default=6)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--taxa-503", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--backend", default=None, help="Backend de parsing (padrão: o mais rápido instalado)")
+    parser.add_argument("--cache", action="store_true", help="Liga o cache de respostas")
+    parser.add_argument("--banco", default=None, help="URL do banco (padrão: SQLite temporário)")
+    parser.add_argument("--saida", default=None, help="Arquivo JSON Lines onde acrescentar o resultado")
+    args = parser.parse_args()
+
+    resultado = executar(args)
+    texto = json.dumps(resultado, ensure_ascii=False)
+    print(texto)
+    if args.saida:
+        with open(args.saida, "a", encoding="utf-8") as arquivo:
+            arquivo.write(texto + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Servidor local que imita o site da loja para o benchmark do crawl.
+
+Serve uma página inicial com o menu de categorias e as listagens de produtos com a
+mesma marcação que `scraper.utils.product_parser` espera. O preço de cada produto
+depende da cidade, identificada pelo cookie `app`, e uma fração das respostas pode
+ser substituída por 429/503 para exercitar as retentativas e o controle de concorrência.
+
+Uso:
+    python -m benchmarks.servidor_loja --porta 8089 --produtos 5000 --cidades 4
+"""
+
+import argparse
+import hashlib
+import random
+from html import escape
+
+from aiohttp import web
+
+from scraper.utils.product_parser import CLASSE_NOME, CLASSE_PRECO
+
+
+def _numero(*partes):
+    """Número pseudoaleatório estável (0 a 1) a partir das partes, igual entre execuções."""
+    digest = hashlib.blake2b("|".join(map(str, partes)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest) / 2**64
+
+
+class CatalogoSintetico:
+    """Catálogo determinístico distribuído em categorias raiz e folha.
+
+    Args:
+        produtos: Quantidade total de produtos.
+        raizes: Quantidade de categorias raiz.
+        folhas_por_raiz: Quantidade de subcategorias (folhas) por raiz.
+        cidades: Quantidade de cidades; o cookie da cidade `i` é `cidade-i`.
+        variacao: Fração dos produtos cujo preço varia entre cidades.
+        ausencia: Fração de (produto, cidade) em que o produto não aparece.
+
+    """
+
+    def __init__(self, produtos, raizes=8, folhas_por_raiz=4, cidades=4, variacao=0.2, ausencia=0.05):
+        self.cidades = [f"cidade-{i}" for i in range(cidades)]
+        self.variacao = variacao
+        self.ausencia = ausencia
+        self.folhas = {}
+        for i in range(produtos):
+            raiz = f"raiz-{i % raizes}"
+            folha = f"{raiz}/folha-{(i // raizes) % folhas_por_raiz}"
+            self.folhas.setdefault(folha, []).append(i)
+
+    def produtos(self, caminho):
+        """Produtos da categoria raiz (todas as folhas) ou de uma folha."""
+        if "/" in caminho:
+            return self.folhas.get(caminho, [])
+        return [i for folha, itens in self.folhas.items() if folha.split("/")[0] == caminho for i in itens]
+
+    def preco(self, produto, cidade):
+        base = 1 + _numero("preco", produto) * 200
+        if _numero("varia", produto) < self.variacao:
+            base *= 0.9 + _numero("cidade", produto, cidade) * 0.2
+        return round(base, 2)
+
+    def disponivel(self, produto, cidade):
+        return _numero("ausente", produto, cidade) >= self.ausencia
+
+
+def formatar_preco(valor):
+    inteiro, centavos = f"{valor:.2f}".split(".")
+    return f"R$ {int(inteiro):,}".replace(",", ".") + f",{centavos}"
+
+
+def gerar_menu(catalogo):
+    itens = "".join(f'<li><a href="/categoria/{folha}">{escape(folha)}</a></li>' for folha in catalogo.folhas)
+    return f"<html><body><nav><ul>{itens}</ul></nav></body></html>"
+
+
+def gerar_listagem(catalogo, caminho, cidade):
+    cartoes = []
+    for i in catalogo.produtos(caminho):
+        if not catalogo.disponivel(i, cidade):
+            continue
+        cartoes.append(
+            '<div class="flex flex-col bg-white rounded">'
+            f'<div class="flex justify-center mt-5 cursor-pointer"><img src="/img/produto/{i}.jpg"></div>'
+            f'<div class="{CLASSE_NOME}"><a href="/produto/produto-sintetico-{i}">Produto {i} &amp; cia</a></div>'
+            f'<div class="flex flex-col items-center"><div class="{CLASSE_PRECO}">'
+            f"{formatar_preco(catalogo.preco(i, cidade))}</div></div></div>",
+        )
+    return "<html><body><ul><li>menu</li></ul><main>" + "\n".join(cartoes) + "</main></body></html>"
+
+
+def criar_app(catalogo, taxa_429=0.0, taxa_503=0.0, retry_after="0", semente=0):
+    """Aplicação aiohttp do site sintético; `GET /_estatisticas` retorna os contadores de respostas."""
+    sorteio = random.Random(semente)
+    estatisticas = {"200": 0, "429": 0, "503": 0, "bytes": 0}
+
+    def falha_injetada():
+        valor = sorteio.random()
+        if valor < taxa_429:
+            return 429
+        if valor < taxa_429 + taxa_503:
+            return 503
+        return None
+
+    async def inicio(request):
+        return web.Response(text=gerar_menu(catalogo), content_type="text/html")
+
+    async def categoria(request):
+        status = falha_injetada()
+        if status:
+            estatisticas[str(status)] += 1
+            return web.Response(status=status, headers={"Retry-After": retry_after})
+
+        cidade = request.cookies.get("app", catalogo.cidades[0])
+        html = gerar_listagem(catalogo, request.match_info["caminho"], cidade)
+        estatisticas["200"] += 1
+        estatisticas["bytes"] += len(html)
+        return web.Response(text=html, content_type="text/html")
+
+    async def obter_estatisticas(request):
+        return web.json_response(estatisticas)
+
+    app = web.Application()
+    app.router.add_get("/", inicio)
+    app.router.add_get("/_estatisticas", obter_estatisticas)
+    app.router.add_get("/categoria/{caminho:.+}", categoria)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--porta", type=int, default=8089)
+    parser.add_argument("--produtos", type=int, default=5000)
+    parser.add_argument("--raizes", type=int, default=8)
+    parser.add_argument("--folhas-por-raiz", type=int, default=4)
+    parser.add_argument("--cidades", type=int, default=4)
+    parser.add_argument("--variacao", type=float, default=0.2)
+    parser.add_argument("--ausencia", type=float, default=0.05)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--taxa-503", type=float, default=0.0)
+    parser.add_argument("--retry-after", default="0")
+    args = parser.parse_args()
+
+    catalogo = CatalogoSintetico(
+        args.produtos, args.raizes, args.folhas_por_raiz, args.cidades, args.variacao, args.ausencia,
+    )
+    app = criar_app(catalogo, args.taxa_429, args.taxa_503, args.retry_after)
+    web.run_app(app, host="127.0.0.1", port=args.porta, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
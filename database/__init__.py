@@ -1,15 +1,44 @@
 # Importa configurações de conexão
 from .connection import DATABASE_TYPE, ENGINE, Session
+from .contexto import ContextoExecucao
 from .gap import close_gap, log_execucao
 
 # Importa modelos do banco de dados
-from .models import Base, Cidade, DisponibilidadeCidade, HistoricoPreco, Imagem, LogExecucao, Produto, init_db
+from .models import (
+    Base,
+    Cidade,
+    DisponibilidadeCidade,
+    HistoricoPreco,
+    Imagem,
+    IndiceCategoriaProduto,
+    IndicePrecoCategoria,
+    LogExecucao,
+    MatrizPrecoDia,
+    MatrizPrecoPar,
+    MigracaoAplicada,
+    Produto,
+    ResumoPreco,
+    init_db,
+)
+
+# Importa migrações do schema
+from .migracoes import aplicar_migracoes
 
 # Importa operações de cidades
 from .operations.cidades import set_cidades
 
+# Importa consultas pontuais e por período do histórico
+from .operations.consultas import (
+    disponibilidade_no_periodo,
+    disponiveis_em,
+    disponivel_em,
+    preco_em,
+    precos_em,
+    precos_no_periodo,
+)
+
 # Importa operações de disponibilidade
-from .operations.disponibilidade import salvar_disponibilidade
+from .operations.disponibilidade import fechar_disponibilidades_ausentes, salvar_disponibilidade
 
 # Importa operações de imagens
 from .operations.imagens import (
@@ -20,8 +49,23 @@ from .operations.imagens import (
     save_images,
 )
 
+# Importa operações do índice de preços por categoria
+from .operations.indice_categorias import (
+    atualizar_indice_categorias,
+    carregar_indice_categorias,
+    reconstruir_indice_categorias,
+)
+
+# Importa operações da matriz diária de preços
+from .operations.matriz_precos import carregar_matriz_precos, materializar_precos_do_dia, reconstruir_matriz_precos
+
 # Importa operações de preços
-from .operations.precos import price_change, salvar_preco, verificar_mudancas_preco
+from .operations.precos import (
+    price_change,
+    reconstruir_resumo_precos,
+    salvar_preco,
+    verificar_mudancas_preco,
+)
 
 # Importa operações de produtos
 from .operations.produtos import (
@@ -34,18 +78,20 @@ from .operations.produtos import (
 
 # Importa utilitários
 from .operations.utils import (
-    atualizar_em_lotes,
+    carregar_tabela_temporaria,
+    fechar_historico_ausentes,
     last_execution,
     gerenciador_transacao,
     inserir_com_conflito,
     obter_mapeamento_id,
+    sincronizar_historico,
 )
 
 # Importa processadores de dados
-from .processors import processar_dados_brutos
+from .processors import AcumuladorPrecos, processar_dados_brutos
 
 # Importa schemas (estruturas de dados)
-from .schemas import DadosProcessados, DisponibilidadeInfo, PrecoInfo, PrecoVariavel, ProdutoInfo
+from .schemas import DadosProcessados, DisponibilidadeInfo, PrecoInfo, PrecoVariavel, ProdutoInfo, TabelaColunar
 
 # inicializa o banco de dados
 init_db()
@@ -53,6 +99,8 @@ init_db()
 # Define quais símbolos são exportados com "from database import *"
 
 __all__ = [
+    "AcumuladorPrecos",
+    "ContextoExecucao",
     "DATABASE_TYPE",
     "ENGINE",
     "Base",
@@ -62,14 +110,30 @@ __all__ = [
     "DisponibilidadeInfo",
     "HistoricoPreco",
     "Imagem",
+    "IndiceCategoriaProduto",
+    "IndicePrecoCategoria",
     "LogExecucao",
+    "MatrizPrecoDia",
+    "MatrizPrecoPar",
+    "MigracaoAplicada",
     "PrecoInfo",
     "PrecoVariavel",
     "Produto",
     "ProdutoInfo",
+    "ResumoPreco",
     "Session",
-    "atualizar_em_lotes",
+    "TabelaColunar",
+    "aplicar_migracoes",
+    "atualizar_indice_categorias",
+    "carregar_indice_categorias",
+    "carregar_matriz_precos",
+    "carregar_tabela_temporaria",
     "close_gap",
+    "disponibilidade_no_periodo",
+    "disponiveis_em",
+    "disponivel_em",
+    "fechar_disponibilidades_ausentes",
+    "fechar_historico_ausentes",
     "last_execution",
     "gerenciador_transacao",
     "get_count_products_without_images",
@@ -82,14 +146,22 @@ __all__ = [
     "init_db",
     "inserir_com_conflito",
     "log_execucao",
+    "materializar_precos_do_dia",
     "obter_mapeamento_id",
+    "preco_em",
+    "precos_em",
+    "precos_no_periodo",
     "price_change",
     "processar_dados_brutos",
+    "reconstruir_indice_categorias",
+    "reconstruir_matriz_precos",
+    "reconstruir_resumo_precos",
     "salvar_disponibilidade",
     "salvar_preco",
     "salvar_produto",
     "save_images",
     "set_cidades",
+    "sincronizar_historico",
     "update_categoria",
     "verificar_mudancas_preco",
 ]
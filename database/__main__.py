@@ -0,0 +1,52 @@
+import argparse
+
+from .migracoes import MIGRACOES, aplicar_migracoes, versoes_aplicadas
+from .operations.indice_categorias import reconstruir_indice_categorias
+from .operations.matriz_precos import reconstruir_matriz_precos
+from .operations.precos import reconstruir_resumo_precos
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m database", description="Manutenção do banco.")
+    parser.add_argument(
+        "comando",
+        choices=["status", "migrar", "resumo", "matriz", "indice", "exportar"],
+        help=(
+            "status/migrar: migrações do schema; resumo/matriz/indice: reconstroem resumo_precos/matriz_precos/"
+            "indice_precos_categorias a partir do histórico; exportar: grava o histórico novo em Parquet"
+        ),
+    )
+    parser.add_argument("--destino", default="exportacao", help="diretório da exportação Parquet")
+    args = parser.parse_args()
+
+    if args.comando == "exportar":
+        # o pyarrow só é necessário para a exportação
+        from .exportacao import exportar
+
+        print(f"Linhas exportadas: {exportar(args.destino)}")
+        return
+
+    if args.comando == "resumo":
+        print(f"Resumo de preços reconstruído: {reconstruir_resumo_precos()} pares.")
+        return
+
+    if args.comando == "matriz":
+        print(f"Matriz de preços reconstruída: {reconstruir_matriz_precos()} dias.")
+        return
+
+    if args.comando == "indice":
+        print(f"Índice de preços por categoria reconstruído: {reconstruir_indice_categorias()} dias.")
+        return
+
+    if args.comando == "migrar":
+        aplicadas = aplicar_migracoes()
+        print(f"Migrações aplicadas: {aplicadas or 'nenhuma pendente'}")
+
+    aplicadas = versoes_aplicadas()
+    for migracao in MIGRACOES:
+        situacao = "aplicada" if migracao.versao in aplicadas else "pendente"
+        print(f"{migracao.versao:>4}  {situacao:<9} {migracao.descricao}")
+
+
+if __name__ == "__main__":
+    main()
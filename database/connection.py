@@ -1,7 +1,7 @@
 import os
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from supabase import create_client
 
@@ -12,6 +12,26 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///ProdutosIG.db")
 ENGINE = create_engine(DATABASE_URL, pool_pre_ping=True)
 Session = sessionmaker(bind=ENGINE)
 DATABASE_TYPE = ENGINE.dialect.name
+
+# Perfil de desempenho do SQLite, aplicado a cada conexão aberta pelo pool
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -1024 * int(os.getenv("SQLITE_CACHE_MB", "64")),  # negativo = KiB
+    "mmap_size": 1024 * 1024 * int(os.getenv("SQLITE_MMAP_MB", "256")),
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+if DATABASE_TYPE == "sqlite":
+
+    @event.listens_for(ENGINE, "connect")
+    def aplicar_pragmas_sqlite(conexao_dbapi, _registro):
+        cursor = conexao_dbapi.cursor()
+        for pragma, valor in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {valor}")
+        cursor.close()
+
 SUPABASE_CLIENT = create_client(
     os.environ["PROJECT_URL"],
     os.environ["API_KEY_SECRET"],
@@ -0,0 +1,59 @@
+import logging
+from contextlib import contextmanager
+
+from .connection import Session
+from .models import Cidade, Produto
+from .operations.utils import obter_mapeamento_id
+
+logger = logging.getLogger(__name__)
+
+
+class ContextoExecucao:
+    """Estado compartilhado pelas etapas de gravação de uma execução do scraper.
+
+    Mantém uma única sessão (e conexão) aberta durante a execução e os mapeamentos
+    site_id -> id dos produtos e nome -> id das cidades, preenchidos pelo upsert de
+    produtos e consultados no banco apenas para as chaves que ainda não conhece.
+    As funções de gravação recebem o contexto por `contexto=` e então usam a sessão
+    dele em vez de abrir uma transação própria; cada `transacao()` agrupa todas as
+    etapas de um lote em uma única transação.
+    """
+
+    def __init__(self):
+        self.session = Session()
+        self.produtos = {}
+        self.cidades = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def fechar(self):
+        self.session.close()
+
+    @contextmanager
+    def transacao(self):
+        """Executa o bloco em uma transação da sessão do contexto (commit no fim, rollback em erro)."""
+        try:
+            yield self.session
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            # ids de produtos inseridos na transação desfeita não existem mais
+            self.produtos.clear()
+            raise
+
+    def ids_produtos(self, site_ids):
+        """Retorna o mapeamento site_id -> id, consultando apenas os ids ainda desconhecidos."""
+        faltantes = set(site_ids) - self.produtos.keys()
+        if faltantes:
+            self.produtos.update(obter_mapeamento_id(self.session, Produto, "site_id", faltantes))
+        return self.produtos
+
+    def ids_cidades(self, nomes):
+        """Retorna o mapeamento nome -> id, carregando a tabela de cidades (pequena) uma vez."""
+        if not self.cidades or not set(nomes) <= self.cidades.keys():
+            self.cidades = {nome: id_cidade for id_cidade, nome in self.session.query(Cidade.id, Cidade.nome)}
+        return self.cidades
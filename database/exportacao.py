@@ -0,0 +1,397 @@
+"""Exportação colunar (Parquet) do catálogo e das tabelas de histórico.
+
+Estrutura do destino:
+    manifesto.json
+    cidades/parte-00003.parquet
+    produtos/parte-00003.parquet
+    historico_precos/data_inicio=2025-01-10/parte-00001.parquet
+    disponibilidade_cidades/data_inicio=2025-01-10/parte-00001.parquet
+
+`cidades` e `produtos` (pequenas e alteradas no lugar) são regravadas inteiras, com a
+categoria em dicionário, quando o conteúdo muda. As tabelas de histórico recebem, particionadas
+pela data de início, apenas as linhas novas e as que estavam abertas na exportação anterior
+e foram fechadas (ou alteradas) desde então; na leitura, a versão mais recente de cada id
+prevalece. O manifesto é gravado por último e lista os arquivos válidos: `ler_exportacao`
+usa apenas ele e os arquivos Parquet (mapeados em memória), sem acessar o banco. Sem nenhuma
+mudança no banco, a exportação não grava nada.
+
+Uso:
+    python -m database exportar --destino exportacao
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import column, exists, func, or_, select, table, union_all
+
+from utils.data import obter_data_atual
+
+from .connection import Session
+from .models import Cidade, DisponibilidadeCidade, HistoricoPreco, Produto
+from .operations.utils import carregar_tabela_temporaria
+
+logger = logging.getLogger(__name__)
+
+MANIFESTO = "manifesto.json"
+VERSAO_MANIFESTO = 1
+TAMANHO_BLOCO = 50_000
+
+ESQUEMAS = {
+    "cidades": pa.schema([("id", pa.int32()), ("nome", pa.string())]),
+    "produtos": pa.schema(
+        [
+            ("id", pa.int32()),
+            ("site_id", pa.int64()),
+            ("nome", pa.string()),
+            ("link", pa.string()),
+            ("categoria", pa.dictionary(pa.int32(), pa.string())),
+            ("data_atualizacao", pa.date32()),
+        ],
+    ),
+    "historico_precos": pa.schema(
+        [
+            ("id", pa.int64()),
+            ("produto_id", pa.int32()),
+            ("cidade_id", pa.int16()),
+            ("preco", pa.int32()),  # centavos
+            ("data_inicio", pa.date32()),
+            ("data_fim", pa.date32()),
+        ],
+    ),
+    "disponibilidade_cidades": pa.schema(
+        [
+            ("id", pa.int64()),
+            ("produto_id", pa.int32()),
+            ("cidade_id", pa.int16()),
+            ("disponivel", pa.bool_()),
+            ("data_inicio", pa.date32()),
+            ("data_fim", pa.date32()),
+        ],
+    ),
+}
+
+MODELOS = {
+    "cidades": Cidade,
+    "produtos": Produto,
+    "historico_precos": HistoricoPreco,
+    "disponibilidade_cidades": DisponibilidadeCidade,
+}
+
+# tabela de histórico -> (coluna do valor, tipo SQL da coluna)
+HISTORICOS = {"historico_precos": ("preco", "INTEGER"), "disponibilidade_cidades": ("disponivel", "BOOLEAN")}
+
+# além do dicionário da categoria (tipo Arrow), a cidade é codificada em dicionário no Parquet
+COLUNAS_DICIONARIO = ["cidade_id", "categoria"]
+
+
+def _tabela_arrow(linhas, esquema):
+    colunas = list(zip(*linhas)) if linhas else [[] for _ in esquema]
+    return pa.Table.from_arrays(
+        [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)],
+        schema=esquema,
+    )
+
+
+def _escritor(caminho, esquema):
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    return pq.ParquetWriter(
+        caminho,
+        esquema,
+        use_dictionary=[nome for nome in COLUNAS_DICIONARIO if nome in esquema.names],
+        compression="zstd",
+    )
+
+
+def _blocos(session, consulta):
+    """Itera a consulta em blocos de `TAMANHO_BLOCO` linhas (cursor no servidor no PostgreSQL)."""
+    return session.execute(consulta, execution_options={"yield_per": TAMANHO_BLOCO}).partitions()
+
+
+class _EscritorParticionado:
+    """Grava blocos ordenados por `data_inicio` em um arquivo por partição da exportação."""
+
+    def __init__(self, destino, nome, numero):
+        self.destino = destino
+        self.nome = nome
+        self.numero = numero
+        self.esquema = ESQUEMAS[nome]
+        self.data = None
+        self.escritor = None
+        self.arquivos = []
+
+    def escrever(self, tabela):
+        datas = tabela["data_inicio"].to_numpy()
+        cortes = (np.flatnonzero(datas[1:] != datas[:-1]) + 1).tolist()
+        for inicio, fim in zip([0, *cortes], [*cortes, len(datas)]):
+            self._particao(datas[inicio].item())
+            self.escritor.write_table(tabela.slice(inicio, fim - inicio))
+            self.arquivos[-1]["linhas"] += fim - inicio
+
+    def _particao(self, data):
+        if data == self.data:
+            return
+        self.fechar()
+        caminho = Path(self.nome) / f"data_inicio={data.isoformat()}" / f"parte-{self.numero:05d}.parquet"
+        self.escritor = _escritor(self.destino / caminho, self.esquema)
+        self.data = data
+        self.arquivos.append({"arquivo": caminho.as_posix(), "exportacao": self.numero, "linhas": 0})
+
+    def fechar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            self.escritor = None
+
+
+def ler_manifesto(destino):
+    """Retorna o manifesto da exportação em `destino`, ou None se ainda não houver uma."""
+    caminho = Path(destino) / MANIFESTO
+    if not caminho.exists():
+        return None
+    return json.loads(caminho.read_text(encoding="utf-8"))
+
+
+def _particao(arquivo):
+    """Data de início (ISO) da partição de um arquivo de histórico."""
+    return Path(arquivo["arquivo"]).parent.name.partition("=")[2]
+
+
+def _ler(destino, manifesto, nome, colunas=None, particoes=None):
+    esquema = ESQUEMAS[nome]
+    if colunas is not None and nome in HISTORICOS and "id" not in colunas:
+        colunas = ["id", *colunas]
+    arquivos = manifesto["tabelas"].get(nome, {}).get("arquivos", [])
+    # todas as versões de um id ficam na partição da sua data de início
+    if particoes is not None:
+        arquivos = [arquivo for arquivo in arquivos if _particao(arquivo) in particoes]
+    partes = [pq.read_table(destino / arquivo["arquivo"], columns=colunas, memory_map=True) for arquivo in arquivos]
+    if not partes:
+        return esquema.empty_table().select(colunas or esquema.names)
+
+    dados = pa.concat_tables(partes)
+    if nome not in HISTORICOS:
+        return dados
+
+    # a versão de cada id gravada pela exportação mais recente prevalece
+    ids = dados["id"].to_numpy()
+    exportacoes = np.repeat([arquivo["exportacao"] for arquivo in arquivos], [parte.num_rows for parte in partes])
+    _, posicoes = np.unique(ids[::-1], return_index=True)
+    manter = np.sort(len(ids) - 1 - posicoes)
+
+    # ids removidos do banco (registros do dia substituídos) saem das exportações até a remoção
+    removidos = manifesto["tabelas"][nome].get("removidos", {})
+    if removidos:
+        ids_removidos = np.concatenate([np.asarray(lista, dtype=np.int64) for lista in removidos.values()])
+        exportacao_remocao = np.repeat([int(numero) for numero in removidos], [len(lista) for lista in removidos.values()])
+        ultima_remocao = dict(zip(ids_removidos.tolist(), exportacao_remocao.tolist()))
+        manter = np.array(
+            [i for i in manter.tolist() if exportacoes[i] > ultima_remocao.get(int(ids[i]), 0)],
+            dtype=np.int64,
+        )
+    return dados.take(manter)
+
+
+def ler_exportacao(destino, nome, colunas=None):
+    """Lê o estado atual de uma tabela exportada, sem acessar o banco.
+
+    Args:
+        destino: Diretório da exportação.
+        nome: Tabela ("cidades", "produtos", "historico_precos" ou "disponibilidade_cidades").
+        colunas: Colunas a ler; None lê todas. Nas tabelas de histórico o `id` é sempre lido.
+
+    Returns:
+        pa.Table: Linhas atuais da tabela (`.to_pandas()` para um DataFrame).
+
+    """
+    destino = Path(destino)
+    manifesto = ler_manifesto(destino)
+    if manifesto is None:
+        raise FileNotFoundError(f"Nenhuma exportação encontrada em {destino}")
+    return _ler(destino, manifesto, nome, colunas)
+
+
+def _exportar_completa(session, destino, manifesto, nome, numero):
+    """Regrava a tabela inteira se o conteúdo mudou desde a exportação anterior.
+
+    Returns:
+        tuple: (estado da tabela no novo manifesto, linhas gravadas).
+
+    """
+    modelo = MODELOS[nome]
+    esquema = ESQUEMAS[nome]
+    consulta = select(*(modelo.__table__.c[coluna] for coluna in esquema.names)).order_by(modelo.id)
+    resumo = hashlib.sha256()
+    blocos = []
+    for bloco in _blocos(session, consulta):
+        resumo.update(repr(bloco).encode())
+        blocos.append(_tabela_arrow(bloco, esquema))
+    anterior = manifesto["tabelas"].get(nome, {})
+    if anterior.get("hash") == resumo.hexdigest():
+        return anterior, 0
+
+    caminho = Path(nome) / f"parte-{numero:05d}.parquet"
+    with _escritor(destino / caminho, esquema) as escritor:
+        for tabela in blocos:
+            escritor.write_table(tabela)
+    linhas = sum(tabela.num_rows for tabela in blocos)
+    arquivos = [{"arquivo": caminho.as_posix(), "exportacao": numero, "linhas": linhas}]
+    return {"arquivos": arquivos, "hash": resumo.hexdigest()}, linhas
+
+
+def _contar_abertos(session, tabela, ultimo_id):
+    """Quantidade de registros abertos com id até `ultimo_id`, por data de início (ISO)."""
+    consulta = (
+        select(tabela.c.data_inicio, func.count())
+        .where(tabela.c.data_fim.is_(None), tabela.c.id <= ultimo_id)
+        .group_by(tabela.c.data_inicio)
+    )
+    return {data.isoformat(): quantidade for data, quantidade in session.execute(consulta)}
+
+
+def _particoes_alteradas(session, tabela, estado, data_referencia):
+    """Partições em que algum registro aberto na exportação anterior pode ter mudado.
+
+    Um registro já exportado só muda ao ser fechado, o que reduz a contagem de abertos da sua
+    partição, ou ao ser removido (substituído no mesmo dia), o que só acontece com registros
+    abertos a partir da data de referência da exportação anterior. None (manifesto sem as
+    contagens) indica todas as partições.
+
+    """
+    if "abertos" not in estado:
+        return None
+    anteriores = estado["abertos"]
+    atuais = _contar_abertos(session, tabela, estado["ultimo_id"])
+    return {
+        data
+        for data in anteriores.keys() | atuais.keys()
+        if anteriores.get(data) != atuais.get(data) or data >= data_referencia
+    }
+
+
+def _exportar_historico(session, destino, manifesto, nome, numero):
+    """Grava as linhas novas e as abertas na exportação anterior que mudaram desde então.
+
+    Returns:
+        tuple: (estado da tabela no novo manifesto, linhas gravadas).
+
+    """
+    coluna_valor, tipo_valor = HISTORICOS[nome]
+    estado = dict(manifesto["tabelas"].get(nome, {}))
+    ultimo_id = estado.get("ultimo_id", 0)
+    t = MODELOS[nome].__table__
+
+    # registros que a exportação anterior gravou abertos, como ficaram no Parquet; só são lidas
+    # as partições em que algum deles pode ter mudado
+    particoes = _particoes_alteradas(session, t, estado, manifesto.get("data_referencia"))
+    colunas_abertos = ["produto_id", "cidade_id", coluna_valor, "data_fim"]
+    abertos = _ler(destino, manifesto, nome, colunas_abertos, particoes)
+    abertos = abertos.filter(pc.is_null(abertos["data_fim"])).drop_columns(["data_fim"])
+    temporaria = f"tmp_exportados_{nome}"
+    carregar_tabela_temporaria(
+        session,
+        temporaria,
+        f"id INTEGER PRIMARY KEY, produto_id INTEGER, cidade_id INTEGER, {coluna_valor} {tipo_valor}",
+        abertos.to_pylist(),
+    )
+
+    a = table(temporaria, column("id"), column("produto_id"), column("cidade_id"), column(coluna_valor))
+    colunas = [t.c[coluna] for coluna in ESQUEMAS[nome].names]
+    # max(id) do momento: se o último registro foi removido, o SQLite pode reutilizar o id
+    maior_id = session.scalar(select(func.max(t.c.id))) or 0
+
+    novos = select(*colunas).where(t.c.id > ultimo_id)
+    alterados = (
+        select(*colunas)
+        .join(a, a.c.id == t.c.id)
+        .where(
+            t.c.id <= ultimo_id,
+            or_(
+                t.c.data_fim.is_not(None),
+                t.c.produto_id != a.c.produto_id,
+                t.c.cidade_id != a.c.cidade_id,
+                t.c[coluna_valor] != a.c[coluna_valor],
+            ),
+        )
+    )
+    uniao = union_all(novos, alterados).subquery()
+    escritor = _EscritorParticionado(destino, nome, numero)
+    linhas = 0
+    try:
+        for bloco in _blocos(session, select(uniao).order_by(uniao.c.data_inicio, uniao.c.id)):
+            escritor.escrever(_tabela_arrow(bloco, ESQUEMAS[nome]))
+            linhas += len(bloco)
+    finally:
+        escritor.fechar()
+
+    removidos = session.scalars(select(a.c.id).where(~exists().where(t.c.id == a.c.id))).all()
+    estado["arquivos"] = [*estado.get("arquivos", []), *escritor.arquivos]
+    estado["ultimo_id"] = maior_id
+    estado["abertos"] = _contar_abertos(session, t, maior_id)
+    if removidos:
+        estado["removidos"] = {**estado.get("removidos", {}), str(numero): sorted(removidos)}
+    return estado, linhas
+
+
+def _gravar_manifesto(destino, manifesto):
+    # substituição atômica: leitores nunca veem um manifesto parcial
+    temporario = destino / f"{MANIFESTO}.tmp"
+    temporario.write_text(json.dumps(manifesto, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(temporario, destino / MANIFESTO)
+
+
+def exportar(destino):
+    """Exporta o catálogo e o histórico para Parquet em `destino`, incrementalmente.
+
+    Todas as leituras usam uma única transação (REPEATABLE READ no PostgreSQL), e os arquivos
+    da exportação só passam a valer quando o novo manifesto substitui o anterior.
+
+    Args:
+        destino: Diretório da exportação; criado se não existir.
+
+    Returns:
+        dict: Linhas gravadas por tabela.
+
+    """
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    anterior = ler_manifesto(destino) or {"versao": VERSAO_MANIFESTO, "exportacoes": 0, "tabelas": {}}
+    numero = anterior["exportacoes"] + 1
+    manifesto = {
+        "versao": VERSAO_MANIFESTO,
+        "exportacoes": numero,
+        "data_exportacao": datetime.now().isoformat(timespec="seconds"),
+        # registros abertos a partir deste dia ainda podem ser substituídos no mesmo dia
+        "data_referencia": obter_data_atual().isoformat(),
+        "tabelas": {},
+    }
+
+    linhas = {}
+    with Session() as session:
+        if session.get_bind().dialect.name == "postgresql":
+            session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        for nome in ("cidades", "produtos"):
+            manifesto["tabelas"][nome], linhas[nome] = _exportar_completa(session, destino, anterior, nome, numero)
+        for nome in HISTORICOS:
+            manifesto["tabelas"][nome], linhas[nome] = _exportar_historico(session, destino, anterior, nome, numero)
+        session.rollback()
+
+    # nada mudou: mantém a exportação anterior (com a data de referência anterior, que só relê mais partições)
+    if manifesto["tabelas"] == anterior["tabelas"]:
+        logger.info(f"Nenhuma mudança desde a exportação {numero - 1} em {destino}.")
+        return linhas
+
+    _gravar_manifesto(destino, manifesto)
+    for nome in ("cidades", "produtos"):
+        for arquivo in anterior["tabelas"].get(nome, {}).get("arquivos", []):
+            if arquivo not in manifesto["tabelas"][nome]["arquivos"]:
+                (destino / arquivo["arquivo"]).unlink(missing_ok=True)
+
+    logger.info(f"Exportação {numero} gravada em {destino}: {linhas}")
+    return linhas
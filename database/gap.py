@@ -17,12 +17,20 @@ def close_gap(session):
         print("Tudo certo")
         return
 
-    session.query(DisponibilidadeCidade).filter(DisponibilidadeCidade.data_fim.is_(None)).update(
+    # só fecha registros anteriores à última execução: numa retomada no mesmo dia,
+    # os registros abertos hoje pela execução interrompida não fazem parte do gap
+    session.query(DisponibilidadeCidade).filter(
+        DisponibilidadeCidade.data_fim.is_(None),
+        DisponibilidadeCidade.data_inicio <= ultima_data,
+    ).update(
         {"data_fim": ultima_data},
         synchronize_session=False,
     )
 
-    session.query(HistoricoPreco).filter(HistoricoPreco.data_fim.is_(None)).update(
+    session.query(HistoricoPreco).filter(
+        HistoricoPreco.data_fim.is_(None),
+        HistoricoPreco.data_inicio <= ultima_data,
+    ).update(
         {"data_fim": ultima_data},
         synchronize_session=False,
     )
@@ -0,0 +1,213 @@
+"""Migrações versionadas do schema.
+
+`Base.metadata.create_all` cria tabelas e índices que ainda não existem, mas nunca altera
+uma tabela existente. As mudanças em tabelas já criadas ficam aqui, numeradas em ordem:
+`aplicar_migracoes` executa, cada uma em sua própria transação, as versões que ainda não
+constam em `migracoes_aplicadas`. Como o `create_all` já cria o schema atual em um banco
+novo, toda migração deve ser idempotente (verificar a coluna, `IF NOT EXISTS`).
+
+Importar o pacote `database` não aplica migrações: elas rodam no início do `main.py` ou
+pela linha de comando.
+
+Uso:
+    python -m database status
+    python -m database migrar
+"""
+
+import logging
+import re
+from collections.abc import Callable
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import Integer, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from .connection import ENGINE
+from .models import HistoricoPreco, MigracaoAplicada
+
+logger = logging.getLogger(__name__)
+
+
+class Migracao(NamedTuple):
+    versao: int
+    descricao: str
+    aplicar: Callable
+
+
+def preencher_site_id(conexao):
+    """Preenche `produtos.site_id` a partir do final do link dos produtos que ainda não o têm.
+
+    Links sem id numérico ficam com `site_id` nulo; se dois produtos resultarem no mesmo
+    id, só o primeiro recebe o valor e o conflito é registrado no log.
+    """
+    em_uso = {linha[0] for linha in conexao.execute(text("SELECT site_id FROM produtos WHERE site_id IS NOT NULL"))}
+    valores = []
+    for id_produto, link in conexao.execute(text("SELECT id, link FROM produtos WHERE site_id IS NULL ORDER BY id")):
+        match = re.search(r"-(\d+)$", link)
+        if not match:
+            continue
+        site_id = int(match.group(1))
+        if site_id in em_uso:
+            logger.warning(f"Produto {id_produto} tem o mesmo id do site ({site_id}) de outro produto: {link}")
+            continue
+        em_uso.add(site_id)
+        valores.append({"id": id_produto, "site_id": site_id})
+
+    if valores:
+        conexao.execute(text("UPDATE produtos SET site_id = :site_id WHERE id = :id"), valores)
+        logger.info(f"site_id preenchido em {len(valores)} produtos.")
+
+
+def _adicionar_site_id(conexao):
+    colunas = {coluna["name"] for coluna in inspect(conexao).get_columns("produtos")}
+    if "site_id" not in colunas:
+        conexao.execute(text("ALTER TABLE produtos ADD COLUMN site_id INTEGER"))
+    preencher_site_id(conexao)
+    conexao.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_produtos_site_id ON produtos (site_id)"))
+
+
+def _indices_historico(conexao):
+    for tabela in ("historico_precos", "disponibilidade_cidades"):
+        # registros abertos: comparação do retrato do dia e reconciliação dos ausentes
+        conexao.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS ix_{tabela}_abertos "
+                f"ON {tabela} (produto_id, cidade_id) WHERE data_fim IS NULL",
+            ),
+        )
+        conexao.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS ix_{tabela}_produto_cidade_fim "
+                f"ON {tabela} (produto_id, cidade_id, data_fim)",
+            ),
+        )
+
+
+def _indice_produtos_sem_categoria(conexao):
+    conexao.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_produtos_sem_categoria ON produtos (id) WHERE categoria IS NULL"),
+    )
+
+
+def _precos_em_centavos(conexao):
+    colunas = {coluna["name"]: coluna["type"] for coluna in inspect(conexao).get_columns("historico_precos")}
+    if isinstance(colunas["preco"], Integer):
+        return
+
+    if conexao.dialect.name == "postgresql":
+        conexao.execute(
+            text("ALTER TABLE historico_precos ALTER COLUMN preco TYPE INTEGER USING ROUND(preco * 100)::INTEGER"),
+        )
+        return
+
+    # o SQLite não altera o tipo de uma coluna: a tabela é recriada com o schema atual
+    tabela = HistoricoPreco.__table__
+    conexao.execute(text("ALTER TABLE historico_precos RENAME TO historico_precos_antigo"))
+    for indice in tabela.indexes:
+        conexao.execute(text(f"DROP INDEX IF EXISTS {indice.name}"))
+    tabela.create(conexao)
+    conexao.execute(
+        text(
+            "INSERT INTO historico_precos (id, produto_id, cidade_id, preco, data_inicio, data_fim) "
+            "SELECT id, produto_id, cidade_id, CAST(ROUND(preco * 100) AS INTEGER), data_inicio, data_fim "
+            "FROM historico_precos_antigo",
+        ),
+    )
+    conexao.execute(text("DROP TABLE historico_precos_antigo"))
+
+
+def _preencher_resumo_precos(conexao):
+    from .operations.precos import recalcular_resumo_precos
+
+    recalcular_resumo_precos(conexao)
+
+
+def _indices_periodo(conexao):
+    # no SQLite as consultas pontuais usam o índice de intervalos em memória (operations.consultas)
+    if conexao.dialect.name != "postgresql":
+        return
+
+    colunas = "cidade_id, produto_id, "
+    try:
+        with conexao.begin_nested():
+            conexao.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+    except SQLAlchemyError:
+        logger.warning("Extensão btree_gist indisponível: o índice de períodos cobre apenas as datas.")
+        colunas = ""
+    for tabela in ("historico_precos", "disponibilidade_cidades"):
+        conexao.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS ix_{tabela}_periodo "
+                f"ON {tabela} USING gist ({colunas}daterange(data_inicio, data_fim, '[]'))",
+            ),
+        )
+
+
+def _preencher_matriz_precos(conexao):
+    from .operations.matriz_precos import recalcular_matriz_precos
+
+    recalcular_matriz_precos(conexao)
+
+
+def _preencher_indice_categorias(conexao):
+    from .connection import Session
+    from .operations.indice_categorias import recalcular_indice_categorias
+
+    # a atualização diária lê só os registros abertos/fechados e os produtos alterados desde o último dia
+    for tabela, coluna in (
+        ("historico_precos", "data_inicio"),
+        ("historico_precos", "data_fim"),
+        ("produtos", "data_atualizacao"),
+    ):
+        conexao.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{tabela}_{coluna} ON {tabela} ({coluna})"))
+    # a sessão participa da transação da migração
+    with Session(bind=conexao) as session:
+        recalcular_indice_categorias(session)
+
+
+MIGRACOES = [
+    Migracao(1, "coluna produtos.site_id com índice único", _adicionar_site_id),
+    Migracao(2, "índices dos registros abertos do histórico", _indices_historico),
+    Migracao(3, "índice parcial de produtos sem categoria", _indice_produtos_sem_categoria),
+    Migracao(4, "historico_precos.preco em centavos (inteiro)", _precos_em_centavos),
+    Migracao(5, "resumo_precos preenchido a partir do histórico", _preencher_resumo_precos),
+    Migracao(6, "matriz_precos preenchida a partir do histórico", _preencher_matriz_precos),
+    Migracao(7, "índices GiST do período de vigência do histórico (PostgreSQL)", _indices_periodo),
+    Migracao(8, "índice de preços por categoria preenchido a partir do histórico", _preencher_indice_categorias),
+]
+
+
+def versoes_aplicadas(engine=ENGINE):
+    """Retorna o conjunto das versões já registradas em `migracoes_aplicadas`."""
+    MigracaoAplicada.__table__.create(engine, checkfirst=True)
+    with engine.connect() as conexao:
+        return {linha[0] for linha in conexao.execute(text("SELECT versao FROM migracoes_aplicadas"))}
+
+
+def migracoes_pendentes(engine=ENGINE):
+    aplicadas = versoes_aplicadas(engine)
+    return [migracao for migracao in MIGRACOES if migracao.versao not in aplicadas]
+
+
+def aplicar_migracoes(engine=ENGINE):
+    """Aplica em ordem as migrações pendentes, cada uma em uma transação.
+
+    Returns:
+        list: Versões aplicadas nesta chamada.
+
+    """
+    aplicadas = []
+    for migracao in migracoes_pendentes(engine):
+        with engine.begin() as conexao:
+            migracao.aplicar(conexao)
+            conexao.execute(
+                MigracaoAplicada.__table__.insert().values(
+                    versao=migracao.versao,
+                    descricao=migracao.descricao,
+                    data_aplicacao=datetime.now(),
+                ),
+            )
+        logger.info(f"Migração {migracao.versao} aplicada: {migracao.descricao}")
+        aplicadas.append(migracao.versao)
+    return aplicadas
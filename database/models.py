@@ -1,18 +1,39 @@
-from sqlalchemy import Boolean, Column, Date, Float, ForeignKey, Index, Integer, String, UniqueConstraint
+import logging
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    UniqueConstraint,
+    text,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 from .connection import ENGINE
 
+logger = logging.getLogger(__name__)
+
 Base = declarative_base()
 
 
 class Produto(Base):
     __tablename__ = "produtos"
     id = Column(Integer, primary_key=True)
+    # id numérico do produto no site (final do link); chave usada pelo scraper
+    site_id = Column(Integer, nullable=True)
     nome = Column(String(255), nullable=False)
     link = Column(String(1024), unique=True, nullable=False)
     categoria = Column(String(255), nullable=True)
+    # data da inclusão ou da última mudança de nome, link ou categoria
     data_atualizacao = Column(
         Date,
         nullable=False,
@@ -25,6 +46,18 @@ class Produto(Base):
         cascade="all, delete-orphan",
     )
 
+    __table_args__ = (
+        Index("ix_produtos_site_id", "site_id", unique=True),
+        Index(
+            "ix_produtos_sem_categoria",
+            "id",
+            postgresql_where=text("categoria IS NULL"),
+            sqlite_where=text("categoria IS NULL"),
+        ),
+        # produtos alterados desde uma data (recategorizações no índice de preços por categoria)
+        Index("ix_produtos_data_atualizacao", "data_atualizacao"),
+    )
+
 
 class Imagem(Base):
     __tablename__ = "imagens"
@@ -51,7 +84,7 @@ class HistoricoPreco(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     produto_id = Column(Integer, ForeignKey("produtos.id"), nullable=False)
     cidade_id = Column(Integer, ForeignKey("cidades.id"), nullable=False, default=1, server_default="1")
-    preco = Column(Float(precision=2), nullable=False)
+    preco = Column(Integer, nullable=False)  # centavos
     data_inicio = Column(
         Date,
         nullable=False,
@@ -64,7 +97,106 @@ class HistoricoPreco(Base):
     produto = relationship("Produto", back_populates="historico_precos")
     cidade = relationship("Cidade", back_populates="historico_precos")
 
-    __table_args__ = (UniqueConstraint("produto_id", "cidade_id", "data_inicio", name="uq_historico_preco_periodo"),)
+    __table_args__ = (
+        UniqueConstraint("produto_id", "cidade_id", "data_inicio", name="uq_historico_preco_periodo"),
+        Index(
+            "ix_historico_precos_abertos",
+            "produto_id",
+            "cidade_id",
+            postgresql_where=text("data_fim IS NULL"),
+            sqlite_where=text("data_fim IS NULL"),
+        ),
+        Index("ix_historico_precos_produto_cidade_fim", "produto_id", "cidade_id", "data_fim"),
+        # registros abertos ou fechados desde uma data (atualização do índice por categoria)
+        Index("ix_historico_precos_data_inicio", "data_inicio"),
+        Index("ix_historico_precos_data_fim", "data_fim"),
+    )
+
+
+class ResumoPreco(Base):
+    """Resumo do histórico de preços por par (produto, cidade), mantido por `salvar_preco`.
+
+    `data_inicial` e `data_final` são o início do primeiro e do último preço registrados e
+    `mudancas` conta as trocas de valor entre registros consecutivos.
+    """
+
+    __tablename__ = "resumo_precos"
+    produto_id = Column(Integer, ForeignKey("produtos.id"), primary_key=True)
+    cidade_id = Column(Integer, ForeignKey("cidades.id"), primary_key=True)
+    preco_inicial = Column(Integer, nullable=False)  # centavos
+    preco_final = Column(Integer, nullable=False)  # centavos
+    data_inicial = Column(Date, nullable=False)
+    data_final = Column(Date, nullable=False)
+    mudancas = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index(
+            "ix_resumo_precos_mudou",
+            "produto_id",
+            postgresql_where=text("preco_final <> preco_inicial"),
+            sqlite_where=text("preco_final <> preco_inicial"),
+        ),
+    )
+
+
+class IndicePrecoCategoria(Base):
+    """Estatísticas diárias de preço por categoria (cada nível do caminho) e cidade.
+
+    Mantida por `atualizar_indice_categorias` ao fim de cada execução. Todas as colunas são
+    somas e contagens, então os totais de uma cidade (somando a linha da cidade 1, dos preços
+    uniformes) ou de todas as cidades saem de um SUM. A variação média do dia é
+    `soma_variacao / comparaveis`, sobre os produtos com preço também no dia anterior.
+    """
+
+    __tablename__ = "indice_precos_categorias"
+    data = Column(Date, primary_key=True)
+    categoria = Column(String(255), primary_key=True)
+    cidade_id = Column(Integer, ForeignKey("cidades.id"), primary_key=True)
+    nivel = Column(Integer, nullable=False)
+    produtos = Column(Integer, nullable=False)
+    soma_precos = Column(BigInteger, nullable=False)  # centavos
+    comparaveis = Column(Integer, nullable=False)
+    mudancas = Column(Integer, nullable=False)
+    soma_variacao = Column(Float, nullable=False)  # pontos percentuais
+
+    __table_args__ = (Index("ix_indice_precos_categorias_nivel_data", "nivel", "data"),)
+
+
+class IndiceCategoriaProduto(Base):
+    """Categoria com que cada produto está contado nas linhas mais recentes de `indice_precos_categorias`.
+
+    Quando a categoria de um produto muda, a atualização do índice move a contribuição dele
+    da categoria guardada aqui para a nova, sem recalcular as demais.
+    """
+
+    __tablename__ = "indice_categorias_produtos"
+    produto_id = Column(Integer, ForeignKey("produtos.id"), primary_key=True)
+    categoria = Column(String(255), nullable=False)
+
+
+class MatrizPrecoPar(Base):
+    """Posição de cada par (produto, cidade) nos vetores diários de `matriz_precos`.
+
+    Pares novos recebem o próximo índice; um índice nunca muda depois de atribuído.
+    """
+
+    __tablename__ = "matriz_precos_pares"
+    indice = Column(Integer, primary_key=True, autoincrement=False)
+    produto_id = Column(Integer, ForeignKey("produtos.id"), nullable=False)
+    cidade_id = Column(Integer, ForeignKey("cidades.id"), nullable=False)
+
+    __table_args__ = (UniqueConstraint("produto_id", "cidade_id", name="uq_matriz_precos_par"),)
+
+
+class MatrizPrecoDia(Base):
+    """Coluna diária da matriz de preços: um vetor int32 comprimido (zlib) com o preço, em
+    centavos, de cada par de `matriz_precos_pares` naquele dia (0 = sem preço).
+    """
+
+    __tablename__ = "matriz_precos"
+    data = Column(Date, primary_key=True)
+    pares = Column(Integer, nullable=False)
+    precos = Column(LargeBinary, nullable=False)
 
 
 class DisponibilidadeCidade(Base):
@@ -87,6 +219,14 @@ class DisponibilidadeCidade(Base):
 
     __table_args__ = (
         UniqueConstraint("produto_id", "cidade_id", "data_inicio", name="uq_disponibilidade_cidade_periodo"),
+        Index(
+            "ix_disponibilidade_cidades_abertos",
+            "produto_id",
+            "cidade_id",
+            postgresql_where=text("data_fim IS NULL"),
+            sqlite_where=text("data_fim IS NULL"),
+        ),
+        Index("ix_disponibilidade_cidades_produto_cidade_fim", "produto_id", "cidade_id", "data_fim"),
     )
 
 
@@ -95,8 +235,25 @@ class LogExecucao(Base):
     data_execucao = Column(Date, primary_key=True)
 
 
+class MigracaoAplicada(Base):
+    __tablename__ = "migracoes_aplicadas"
+    versao = Column(Integer, primary_key=True, autoincrement=False)
+    descricao = Column(String(255), nullable=False)
+    data_aplicacao = Column(DateTime, nullable=False)
 
 
 def init_db():
-    """Inicializa o banco de dados criando todas as tabelas."""
+    """Inicializa o banco de dados criando as tabelas que ainda não existem.
+
+    As migrações pendentes não são aplicadas aqui: o `main.py` e o `python -m database migrar`
+    as aplicam, e `python -m database status` as lista.
+    """
+    from .migracoes import migracoes_pendentes
+
     Base.metadata.create_all(ENGINE)
+    pendentes = migracoes_pendentes(ENGINE)
+    if pendentes:
+        logger.warning(
+            f"Migrações pendentes: {[migracao.versao for migracao in pendentes]}; "
+            "aplique com `python -m database migrar`.",
+        )
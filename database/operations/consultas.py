@@ -0,0 +1,299 @@
+"""Consultas pontuais e por período sobre o histórico de preços e de disponibilidade.
+
+Respondem "quanto custava o produto X na cidade Y no dia D" e "o que estava disponível na
+cidade Y no dia D", individualmente ou para muitos produtos de uma vez. Preços uniformes são
+gravados na cidade 1 ("Sem Cidade"): o preço de um produto em uma cidade é o registro da
+própria cidade quando existe e, na falta dele, o uniforme.
+
+No PostgreSQL as consultas usam o índice GiST sobre `daterange(data_inicio, data_fim, '[]')`
+(migração 7). No SQLite cada tabela é carregada em um `IndiceIntervalos` (arrays ordenados
+com busca binária), recarregado quando outra conexão grava no banco.
+"""
+
+import threading
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select, text
+
+from database.connection import ENGINE, Session
+from database.models import DisponibilidadeCidade, HistoricoPreco
+
+CIDADE_UNIFORME = 1
+
+# expressão do índice GiST; as consultas precisam usá-la igual para que ele seja escolhido
+PERIODO = "daterange(data_inicio, data_fim, '[]')"
+
+VALORES = {HistoricoPreco: "preco", DisponibilidadeCidade: "disponivel"}
+
+# chave ordenável (produto, cidade, início): dias como ordinal cabem em 20 bits e cidades em 16
+DESLOCAMENTO_CIDADE = 20
+DESLOCAMENTO_PRODUTO = 36
+ABERTO = date.max.toordinal()
+
+
+class IndiceIntervalos:
+    """Intervalos [data_inicio, data_fim] de uma tabela de histórico em arrays ordenados.
+
+    Os registros ficam ordenados por (produto, cidade, início) em uma única chave int64; o
+    registro vigente em um dia é o último com chave menor ou igual à consultada, desde que
+    seja do mesmo par e não tenha terminado antes do dia.
+
+    Args:
+        produto_id: Array com o produto de cada registro.
+        cidade_id: Array com a cidade de cada registro.
+        valor: Array com o valor (preço ou disponibilidade) de cada registro.
+        inicio: Array com `data_inicio` como ordinal (`date.toordinal`).
+        fim: Array com `data_fim` como ordinal (`ABERTO` nos registros abertos).
+
+    """
+
+    def __init__(self, produto_id, cidade_id, valor, inicio, fim):
+        chave = self._chave(np.asarray(produto_id), np.asarray(cidade_id), np.asarray(inicio))
+        ordem = np.argsort(chave, kind="stable")
+        self.chave = chave[ordem]
+        self.par = self.chave >> DESLOCAMENTO_CIDADE
+        self.produto_id = np.asarray(produto_id, dtype=np.int64)[ordem]
+        self.cidade_id = np.asarray(cidade_id, dtype=np.int64)[ordem]
+        self.valor = np.asarray(valor)[ordem]
+        self.inicio = np.asarray(inicio, dtype=np.int64)[ordem]
+        self.fim = np.asarray(fim, dtype=np.int64)[ordem]
+
+    @staticmethod
+    def _chave(produto_id, cidade_id, inicio):
+        return (
+            (produto_id.astype(np.int64) << DESLOCAMENTO_PRODUTO)
+            | (cidade_id.astype(np.int64) << DESLOCAMENTO_CIDADE)
+            | inicio.astype(np.int64)
+        )
+
+    @classmethod
+    def carregar(cls, conexao, modelo):
+        """Carrega todos os registros de `modelo` (`HistoricoPreco` ou `DisponibilidadeCidade`)."""
+        linhas = conexao.execute(
+            select(
+                modelo.produto_id,
+                modelo.cidade_id,
+                getattr(modelo, VALORES[modelo]),
+                modelo.data_inicio,
+                modelo.data_fim,
+            ),
+        ).all()
+        colunas = list(zip(*linhas)) if linhas else [[]] * 5
+        return cls(
+            np.array(colunas[0], dtype=np.int64),
+            np.array(colunas[1], dtype=np.int64),
+            np.array(colunas[2], dtype=np.int64 if modelo is HistoricoPreco else bool),
+            np.fromiter((data.toordinal() for data in colunas[3]), np.int64, len(colunas[3])),
+            np.fromiter((data.toordinal() if data else ABERTO for data in colunas[4]), np.int64, len(colunas[4])),
+        )
+
+    def valores_em(self, produto_ids, cidade_ids, data):
+        """Retorna {(produto_id, cidade_id): valor} dos registros vigentes em `data`.
+
+        Com `produto_ids=None`, considera todos os produtos das cidades informadas.
+        """
+        dia = data.toordinal()
+        if produto_ids is None:
+            vigentes = np.flatnonzero(np.isin(self.cidade_id, cidade_ids) & (self.inicio <= dia) & (self.fim >= dia))
+        else:
+            produtos = np.repeat(np.asarray(produto_ids, dtype=np.int64), len(cidade_ids))
+            cidades = np.tile(np.asarray(cidade_ids, dtype=np.int64), len(produto_ids))
+            consulta = self._chave(produtos, cidades, np.full(len(produtos), dia))
+            posicoes = np.searchsorted(self.chave, consulta, side="right") - 1
+            validas = posicoes >= 0
+            posicoes = posicoes[validas]
+            mesmo_par = self.par[posicoes] == consulta[validas] >> DESLOCAMENTO_CIDADE
+            vigentes = posicoes[mesmo_par & (self.fim[posicoes] >= dia)]
+        return dict(
+            zip(
+                zip(self.produto_id[vigentes].tolist(), self.cidade_id[vigentes].tolist()),
+                self.valor[vigentes].tolist(),
+            ),
+        )
+
+    def intervalos(self, produto_id, cidade_id, inicio, fim):
+        """Retorna [(data_inicio, data_fim, valor)] do par que se sobrepõem a [inicio, fim].
+
+        `data_fim` é None nos registros abertos.
+        """
+        par = (produto_id << (DESLOCAMENTO_PRODUTO - DESLOCAMENTO_CIDADE)) | cidade_id
+        esquerda, direita = np.searchsorted(self.par, [par, par + 1])
+        faixa = slice(esquerda, direita)
+        sobrepostos = np.flatnonzero((self.inicio[faixa] <= fim.toordinal()) & (self.fim[faixa] >= inicio.toordinal()))
+        return [
+            (
+                date.fromordinal(int(self.inicio[esquerda + i])),
+                None if self.fim[esquerda + i] == ABERTO else date.fromordinal(int(self.fim[esquerda + i])),
+                self.valor[esquerda + i].item(),
+            )
+            for i in sobrepostos
+        ]
+
+
+class _CacheIndices:
+    """Índices em memória do SQLite, invalidados pelo `PRAGMA data_version`.
+
+    O `data_version` de uma conexão muda quando qualquer outra conexão (do processo ou não)
+    grava no banco; por isso o cache mantém uma conexão própria, usada só para leitura.
+    """
+
+    def __init__(self):
+        self.conexao = None
+        self.versao = None
+        self.indices = {}
+        self._lock = threading.Lock()
+
+    def obter(self, modelo):
+        with self._lock:
+            if self.conexao is None:
+                self.conexao = ENGINE.connect()
+            versao = self.conexao.exec_driver_sql("PRAGMA data_version").scalar()
+            if versao != self.versao:
+                self.indices.clear()
+                self.versao = versao
+            if modelo not in self.indices:
+                self.indices[modelo] = IndiceIntervalos.carregar(self.conexao, modelo)
+            self.conexao.rollback()
+            return self.indices[modelo]
+
+
+_CACHE = _CacheIndices()
+
+
+def _valores_em(modelo, produto_ids, cidade_ids, data):
+    if ENGINE.dialect.name != "postgresql":
+        return _CACHE.obter(modelo).valores_em(produto_ids, cidade_ids, data)
+
+    # os arrays viram junções: cada produto e cidade é uma igualdade, que o índice GiST atende
+    juncao_produtos = (
+        "" if produto_ids is None else "JOIN unnest(CAST(:produtos AS INTEGER[])) AS p(produto) ON produto_id = produto"
+    )
+    consulta = text(
+        f"SELECT produto_id, cidade_id, {VALORES[modelo]} FROM {modelo.__tablename__} "
+        "JOIN unnest(CAST(:cidades AS INTEGER[])) AS c(cidade) ON cidade_id = cidade "
+        f"{juncao_produtos} WHERE {PERIODO} @> CAST(:data AS DATE)",
+    )
+    parametros = {"cidades": list(cidade_ids), "data": data}
+    if produto_ids is not None:
+        parametros["produtos"] = list(produto_ids)
+    with Session() as session:
+        linhas = session.execute(consulta, parametros)
+        return {(produto_id, cidade_id): valor for produto_id, cidade_id, valor in linhas}
+
+
+def _intervalos(modelo, produto_id, cidade_id, inicio, fim):
+    if ENGINE.dialect.name != "postgresql":
+        return _CACHE.obter(modelo).intervalos(produto_id, cidade_id, inicio, fim)
+
+    consulta = text(
+        f"SELECT data_inicio, data_fim, {VALORES[modelo]} FROM {modelo.__tablename__} "
+        "WHERE produto_id = :produto AND cidade_id = :cidade "
+        f"AND {PERIODO} && daterange(CAST(:inicio AS DATE), CAST(:fim AS DATE), '[]') ORDER BY data_inicio",
+    )
+    with Session() as session:
+        return [
+            tuple(linha)
+            for linha in session.execute(
+                consulta,
+                {"produto": produto_id, "cidade": cidade_id, "inicio": inicio, "fim": fim},
+            )
+        ]
+
+
+def _recortar(intervalos, inicio, fim):
+    """Limita os intervalos a [inicio, fim], trocando o fim aberto (None) por `fim`."""
+    return [(max(de, inicio), min(ate or fim, fim), valor) for de, ate, valor in intervalos]
+
+
+def precos_em(produto_ids, cidade_id, data):
+    """Preço de vários produtos em uma cidade em uma data, com o uniforme na falta do da cidade.
+
+    Args:
+        produto_ids: Ids (`produtos.id`) dos produtos consultados.
+        cidade_id: Cidade consultada.
+        data: Data consultada.
+
+    Returns:
+        dict: produto_id -> preço em centavos; produtos sem preço na data ficam de fora.
+
+    """
+    produto_ids = list(produto_ids)
+    if not produto_ids:
+        return {}
+    valores = _valores_em(HistoricoPreco, produto_ids, [cidade_id, CIDADE_UNIFORME], data)
+    precos = {}
+    for produto_id in produto_ids:
+        preco = valores.get((produto_id, cidade_id), valores.get((produto_id, CIDADE_UNIFORME)))
+        if preco is not None:
+            precos[produto_id] = preco
+    return precos
+
+
+def preco_em(produto_id, cidade_id, data):
+    """Preço (centavos) do produto na cidade na data, ou None se não havia preço."""
+    return precos_em([produto_id], cidade_id, data).get(produto_id)
+
+
+def precos_no_periodo(produto_id, cidade_id, inicio, fim):
+    """Preços vigentes de um produto em uma cidade entre `inicio` e `fim` (inclusive).
+
+    Os trechos sem preço da própria cidade são preenchidos pelo preço uniforme.
+
+    Returns:
+        list: [(de, ate, preço em centavos)] em ordem, recortados ao período consultado.
+
+    """
+    da_cidade = _recortar(_intervalos(HistoricoPreco, produto_id, cidade_id, inicio, fim), inicio, fim)
+    if cidade_id == CIDADE_UNIFORME:
+        return da_cidade
+
+    trechos = list(da_cidade)
+    for de, ate, preco in _recortar(_intervalos(HistoricoPreco, produto_id, CIDADE_UNIFORME, inicio, fim), inicio, fim):
+        # partes do intervalo uniforme não cobertas por um preço da cidade
+        for cidade_de, cidade_ate, _ in da_cidade:
+            if cidade_ate < de or cidade_de > ate:
+                continue
+            if cidade_de > de:
+                trechos.append((de, date.fromordinal(cidade_de.toordinal() - 1), preco))
+            de = date.fromordinal(cidade_ate.toordinal() + 1)
+            if de > ate:
+                break
+        if de <= ate:
+            trechos.append((de, ate, preco))
+    return sorted(trechos)
+
+
+def disponiveis_em(cidade_id, data, produto_ids=None):
+    """Produtos disponíveis na cidade na data.
+
+    Args:
+        cidade_id: Cidade consultada.
+        data: Data consultada.
+        produto_ids: Restringe a consulta a estes produtos; None considera todos.
+
+    Returns:
+        set: Ids dos produtos disponíveis.
+
+    """
+    if produto_ids is not None:
+        produto_ids = list(produto_ids)
+        if not produto_ids:
+            return set()
+    valores = _valores_em(DisponibilidadeCidade, produto_ids, [cidade_id], data)
+    return {produto_id for (produto_id, _), disponivel in valores.items() if disponivel}
+
+
+def disponivel_em(produto_id, cidade_id, data):
+    """Indica se o produto estava disponível na cidade na data."""
+    return produto_id in disponiveis_em(cidade_id, data, [produto_id])
+
+
+def disponibilidade_no_periodo(produto_id, cidade_id, inicio, fim):
+    """Trechos de disponibilidade de um produto em uma cidade entre `inicio` e `fim`.
+
+    Returns:
+        list: [(de, ate, disponível)] em ordem, recortados ao período consultado.
+
+    """
+    return _recortar(_intervalos(DisponibilidadeCidade, produto_id, cidade_id, inicio, fim), inicio, fim)
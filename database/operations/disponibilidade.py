@@ -1,71 +1,94 @@
 import logging
 
 from database.models import Cidade, DisponibilidadeCidade, Produto
-from utils.data import obter_data_atual
 
-from .utils import atualizar_em_lotes, gerenciador_transacao, obter_mapeamento_id
+from .utils import fechar_historico_ausentes, gerenciador_transacao, obter_mapeamento_id, sincronizar_historico
 
 logger = logging.getLogger(__name__)
 
 
 @gerenciador_transacao
-def salvar_disponibilidade(session, disponibilidades):
+def salvar_disponibilidade(session, disponibilidades, *, fechar_ausentes=True, contexto=None):
     """Atualiza o histórico de disponibilidade de produtos por cidade no banco de dados.
 
     Identifica mudanças na disponibilidade de produtos entre cidades, registrando quando
-    produtos se tornam disponíveis ou indisponíveis. Utiliza operações de conjuntos e
-    processamento em lote para otimizar a performance, fechando registros antigos e
-    criando novos apenas quando há alterações efetivas.
+    produtos se tornam disponíveis ou indisponíveis. A comparação com os registros abertos
+    roda no banco (`sincronizar_historico`): um par com registro aberto de indisponível é
+    fechado e reaberto como disponível, e um par sem registro aberto ganha um novo.
+
+    Com `fechar_ausentes=False` apenas os pares recebidos são marcados como disponíveis;
+    os que deixaram de aparecer são tratados depois por `fechar_disponibilidades_ausentes`.
+    Com um `contexto` (`ContextoExecucao`), usa a transação e os mapeamentos de id dele.
+
+    Returns:
+        set: Pares (produto_id, cidade_id) disponíveis neste lote.
+
     """
     if not disponibilidades:
-        return
+        return set()
 
-    hoje = obter_data_atual()
-
-    links = {d.produto_link for d in disponibilidades}
+    site_ids = {d.site_id for d in disponibilidades}
     cidades = {d.cidade for d in disponibilidades}
 
-    link_to_id = obter_mapeamento_id(session, Produto, "link", links)
-    cidade_to_id = obter_mapeamento_id(session, Cidade, "nome", cidades)
+    if contexto is not None:
+        site_id_to_id = contexto.ids_produtos(site_ids)
+        cidade_to_id = contexto.ids_cidades(cidades)
+    else:
+        site_id_to_id = obter_mapeamento_id(session, Produto, "site_id", site_ids)
+        cidade_to_id = obter_mapeamento_id(session, Cidade, "nome", cidades)
 
     pares_disponiveis_hoje = {
-        (link_to_id.get(d.produto_link), cidade_to_id.get(d.cidade))
+        (site_id_to_id.get(d.site_id), cidade_to_id.get(d.cidade))
         for d in disponibilidades
-        if link_to_id.get(d.produto_link) and cidade_to_id.get(d.cidade)
+        if site_id_to_id.get(d.site_id) and cidade_to_id.get(d.cidade)
     }
-
-    registros_ativos = (
-        session.query(DisponibilidadeCidade.produto_id, DisponibilidadeCidade.cidade_id)
-        .filter(DisponibilidadeCidade.data_fim.is_(None), DisponibilidadeCidade.disponivel)
-        .all()
+    if not pares_disponiveis_hoje:
+        return set()
+
+    fechados, novos_disponiveis = sincronizar_historico(
+        session,
+        DisponibilidadeCidade,
+        [
+            {"produto_id": produto_id, "cidade_id": cidade_id, "disponivel": True}
+            for produto_id, cidade_id in pares_disponiveis_hoje
+        ],
+        "disponivel",
+        "BOOLEAN",
+        "t.disponivel <> s.disponivel",
     )
+    novos_indisponiveis = 0
+    if fechar_ausentes:
+        novos_indisponiveis = fechar_historico_ausentes(
+            session,
+            DisponibilidadeCidade,
+            pares_disponiveis_hoje,
+            filtro_aberto="AND t.disponivel",
+            valores_ausentes={"disponivel": False},
+        )
 
-    pares_disponiveis_atual = {(r.produto_id, r.cidade_id) for r in registros_ativos}
+    logger.info(f"{novos_disponiveis} produtos tornaram-se disponíveis.")
+    logger.info(f"{novos_indisponiveis} produtos tornaram-se indisponíveis.")
+    logger.info(f"Total de alterações: {fechados + novos_disponiveis + 2 * novos_indisponiveis}")
 
-    novos_disponiveis = pares_disponiveis_hoje - pares_disponiveis_atual
-    novos_indisponiveis = pares_disponiveis_atual - pares_disponiveis_hoje
+    return pares_disponiveis_hoje
 
-    valores_para_inserir = [
-        DisponibilidadeCidade(
-            produto_id=produto_id,
-            cidade_id=cidade_id,
-            disponivel=disponivel,
-            data_inicio=hoje,
-            data_fim=None,
-        )
-        for conjunto, disponivel in [(novos_disponiveis, True), (novos_indisponiveis, False)]
-        for produto_id, cidade_id in conjunto
-    ]
-    alteracoes = 0
-
-    pares_com_mudanca = list(novos_disponiveis.union(novos_indisponiveis))
-    if pares_com_mudanca:
-        alteracoes += atualizar_em_lotes(session, pares_com_mudanca, DisponibilidadeCidade)
-
-    if valores_para_inserir:
-        session.bulk_save_objects(valores_para_inserir)
-        alteracoes += len(valores_para_inserir)
-
-    logger.info(f"{len(novos_disponiveis)} produtos tornaram-se disponíveis.")
-    logger.info(f"{len(novos_indisponiveis)} produtos tornaram-se indisponíveis.")
-    logger.info(f"Total de alterações: {alteracoes}")
+
+@gerenciador_transacao
+def fechar_disponibilidades_ausentes(session, pares_vistos, *, contexto=None):
+    """Marca como indisponíveis os pares (produto_id, cidade_id) disponíveis que não foram vistos hoje.
+
+    Etapa de reconciliação executada após todos os lotes de `salvar_disponibilidade` com
+    `fechar_ausentes=False`.
+    """
+    if not pares_vistos:
+        logger.info("Nenhuma disponibilidade vista hoje, reconciliação de disponibilidade ignorada.")
+        return
+
+    novos_indisponiveis = fechar_historico_ausentes(
+        session,
+        DisponibilidadeCidade,
+        pares_vistos,
+        filtro_aberto="AND t.disponivel",
+        valores_ausentes={"disponivel": False},
+    )
+    logger.info(f"{novos_indisponiveis} produtos tornaram-se indisponíveis.")
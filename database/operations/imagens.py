@@ -1,6 +1,6 @@
 import logging
 
-from sqlalchemy import func, not_, or_
+from sqlalchemy import func, insert, not_, or_
 
 from database.connection import SUPABASE_CLIENT, Session
 from database.models import Imagem, Produto
@@ -51,16 +51,17 @@ def save_images(session, dados):
             img.produto_id for img in session.query(Imagem.produto_id).filter(Imagem.produto_id.in_(produto_ids)).all()
         }
 
-        # Filtrar apenas produtos sem imagem
-        objetos = [
-            Imagem(produto_id=produto_id, link_imagem=link, data_atualizacao=obter_data_atual())
+        # Filtrar apenas produtos sem imagem (o último link de um produto repetido prevalece)
+        hoje = obter_data_atual()
+        novas = {
+            produto_id: {"produto_id": produto_id, "link_imagem": link, "data_atualizacao": hoje}
             for produto_id, link in dados
             if produto_id not in produtos_com_imagem
-        ]
+        }
 
-        if objetos:
-            session.bulk_save_objects(objetos)
-            contador = len(objetos)
+        if novas:
+            session.execute(insert(Imagem.__table__), list(novas.values()))
+            contador = len(novas)
 
     logger.info(f"{contador} registros de imagens salvos ou atualizados com sucesso.")
 
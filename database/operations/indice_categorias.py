@@ -0,0 +1,315 @@
+"""Índice diário de preços por categoria.
+
+Cada linha de `indice_precos_categorias` soma, para um dia, uma categoria (cada nível do
+caminho) e uma cidade, os preços vigentes dos produtos da categoria. A execução diária não
+reagrega o histórico: as linhas de hoje partem das linhas do último dia calculado, somadas às
+contribuições dos registros de preço abertos e fechados desde então, e depois movem os
+produtos que mudaram de categoria (`indice_categorias_produtos` guarda a categoria com que
+cada produto está contado). Só as categorias desses produtos recebem contribuições.
+"""
+
+import logging
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from database.connection import Session
+from database.models import HistoricoPreco, IndiceCategoriaProduto, IndicePrecoCategoria, Produto
+from utils.data import obter_data_atual
+from utils.metricas import CRONOMETRO
+
+from .utils import _executar, carregar_tabela_temporaria, gerenciador_transacao
+
+logger = logging.getLogger(__name__)
+
+CATEGORIAS_PRODUTOS = "tmp_categorias_produtos"
+CIDADE_UNIFORME = 1
+
+# registros vigentes no dia `base` e não hoje (-1) e vigentes hoje mas não em `base` (+1)
+FECHADOS_DESDE_BASE = "h.data_fim >= :base AND h.data_fim < :hoje AND h.data_inicio <= :base"
+ABERTOS_DESDE_BASE = (
+    "h.data_inicio > :base AND h.data_inicio <= :hoje AND (h.data_fim IS NULL OR h.data_fim >= :hoje)"
+)
+VIGENTES_HOJE = "h.data_inicio <= :hoje AND (h.data_fim IS NULL OR h.data_fim >= :hoje)"
+
+
+def _prefixos(categoria):
+    """Retorna (prefixo, nivel) de cada nível do caminho, como as chaves de `get_categories`: "a", "a/b"."""
+    partes = [parte for parte in (categoria or "").split("/") if parte]
+    return [("/".join(partes[:nivel]), nivel) for nivel in range(1, len(partes) + 1)]
+
+
+def _carregar_categorias(session, categorias):
+    """Carrega (produto_id, prefixo, nivel, sinal) de cada prefixo das categorias informadas.
+
+    Args:
+        session: Sessão do SQLAlchemy (a tabela temporária fica na conexão dela).
+        categorias: Iterável de (produto_id, categoria, sinal); o sinal (+1 ou -1) multiplica
+            as contribuições do produto nas linhas do prefixo.
+
+    """
+    linhas = {}
+    for produto_id, categoria, sinal in categorias:
+        for prefixo, nivel in _prefixos(categoria):
+            chave = (produto_id, prefixo)
+            linhas[chave] = {
+                "produto_id": produto_id,
+                "categoria": prefixo,
+                "nivel": nivel,
+                "sinal": linhas.get(chave, {"sinal": 0})["sinal"] + sinal,
+            }
+    carregar_tabela_temporaria(
+        session,
+        CATEGORIAS_PRODUTOS,
+        "produto_id INTEGER NOT NULL, categoria VARCHAR(255) NOT NULL, nivel INTEGER NOT NULL, "
+        "sinal INTEGER NOT NULL, PRIMARY KEY (produto_id, categoria)",
+        # um prefixo que sai e volta (a/b -> a/c mantém "a") se anula
+        [linha for linha in linhas.values() if linha["sinal"]],
+    )
+
+
+def _contribuicoes(filtro, sinal):
+    """SELECT das contribuições dos registros `h` que atendem ao filtro, agregadas por categoria e cidade.
+
+    Um preço trocado hoje tem o registro anterior fechado ontem (`a`); um registro é comparável
+    quando o par também tinha preço ontem.
+    """
+    return f"""
+        SELECT :hoje, c.categoria, h.cidade_id, c.nivel,
+            SUM({sinal}),
+            SUM({sinal} * h.preco),
+            SUM({sinal} * CASE WHEN h.data_inicio = :hoje AND a.preco IS NULL THEN 0 ELSE 1 END),
+            SUM({sinal} * CASE WHEN a.preco <> h.preco THEN 1 ELSE 0 END),
+            COALESCE(SUM({sinal} * (h.preco - a.preco) * 100.0 / a.preco), 0)
+        FROM historico_precos h
+        JOIN {CATEGORIAS_PRODUTOS} c ON c.produto_id = h.produto_id
+        LEFT JOIN historico_precos a
+            ON h.data_inicio = :hoje
+            AND a.produto_id = h.produto_id AND a.cidade_id = h.cidade_id AND a.data_fim = :ontem
+        WHERE {filtro}
+        GROUP BY c.categoria, h.cidade_id, c.nivel
+    """
+
+
+def _calcular_dia(session, hoje, vigentes):
+    """Grava as linhas de `hoje` agregando todos os registros vigentes no dia (reconstrução)."""
+    _executar(session, "DELETE FROM indice_precos_categorias WHERE data = :hoje", hoje=hoje)
+    return _executar(
+        session,
+        "INSERT INTO indice_precos_categorias "
+        "(data, categoria, cidade_id, nivel, produtos, soma_precos, comparaveis, mudancas, soma_variacao) "
+        + _contribuicoes(vigentes, "c.sinal"),
+        hoje=hoje,
+        ontem=hoje - timedelta(days=1),
+    )
+
+
+def _somar_contribuicoes(session, hoje, filtro, sinal, **parametros):
+    """Soma às linhas de `hoje` as contribuições dos registros do filtro (cria as linhas que faltam)."""
+    return _executar(
+        session,
+        "INSERT INTO indice_precos_categorias "
+        "(data, categoria, cidade_id, nivel, produtos, soma_precos, comparaveis, mudancas, soma_variacao) "
+        + _contribuicoes(filtro, sinal)
+        + """
+        ON CONFLICT (data, categoria, cidade_id) DO UPDATE SET
+            produtos = indice_precos_categorias.produtos + excluded.produtos,
+            soma_precos = indice_precos_categorias.soma_precos + excluded.soma_precos,
+            comparaveis = indice_precos_categorias.comparaveis + excluded.comparaveis,
+            mudancas = indice_precos_categorias.mudancas + excluded.mudancas,
+            soma_variacao = indice_precos_categorias.soma_variacao + excluded.soma_variacao
+        """,
+        hoje=hoje,
+        ontem=hoje - timedelta(days=1),
+        **parametros,
+    )
+
+
+def _avancar_dia(session, base, hoje):
+    """Cria as linhas de `hoje` a partir das linhas de `base` e dos registros abertos e fechados desde então.
+
+    As linhas copiadas começam com todos os produtos comparáveis e sem mudanças; os registros
+    fechados saem das contagens e os abertos entram, com a comparação com ontem.
+    """
+    historico = HistoricoPreco
+    categorias = session.execute(
+        select(IndiceCategoriaProduto.produto_id, IndiceCategoriaProduto.categoria)
+        .join(historico, historico.produto_id == IndiceCategoriaProduto.produto_id)
+        .where(
+            (historico.data_fim >= base) & (historico.data_fim < hoje) & (historico.data_inicio <= base)
+            | (historico.data_inicio > base) & (historico.data_inicio <= hoje),
+        )
+        .distinct(),
+    )
+    _carregar_categorias(session, ((produto_id, categoria, 1) for produto_id, categoria in categorias))
+
+    _executar(
+        session,
+        """
+        INSERT INTO indice_precos_categorias
+            (data, categoria, cidade_id, nivel, produtos, soma_precos, comparaveis, mudancas, soma_variacao)
+        SELECT :hoje, categoria, cidade_id, nivel, produtos, soma_precos, produtos, 0, 0
+        FROM indice_precos_categorias
+        WHERE data = :base
+        """,
+        hoje=hoje,
+        base=base,
+    )
+    _somar_contribuicoes(session, hoje, FECHADOS_DESDE_BASE, "-c.sinal", base=base)
+    _somar_contribuicoes(session, hoje, ABERTOS_DESDE_BASE, "c.sinal", base=base)
+
+
+def _mover_recategorizados(session, hoje, desde):
+    """Move para a categoria atual os produtos alterados desde `desde` cuja categoria no índice mudou.
+
+    Returns:
+        int: Quantidade de produtos movidos.
+
+    """
+    produto, indexado = Produto.__table__, IndiceCategoriaProduto.__table__
+    mudancas = session.execute(
+        select(produto.c.id, indexado.c.categoria, produto.c.categoria)
+        .outerjoin(indexado, indexado.c.produto_id == produto.c.id)
+        .where(
+            produto.c.data_atualizacao >= desde,
+            (indexado.c.categoria.is_(None) & produto.c.categoria.is_not(None))
+            | (indexado.c.categoria.is_not(None) & produto.c.categoria.is_(None))
+            | (indexado.c.categoria != produto.c.categoria),
+        ),
+    ).all()
+    if not mudancas:
+        return 0
+
+    _carregar_categorias(
+        session,
+        [(produto_id, anterior, -1) for produto_id, anterior, _ in mudancas]
+        + [(produto_id, atual, 1) for produto_id, _, atual in mudancas],
+    )
+    _somar_contribuicoes(session, hoje, VIGENTES_HOJE, "c.sinal")
+
+    ids = [produto_id for produto_id, _, _ in mudancas]
+    session.execute(indexado.delete().where(indexado.c.produto_id.in_(ids)))
+    novas = [{"produto_id": produto_id, "categoria": atual} for produto_id, _, atual in mudancas if atual]
+    if novas:
+        session.execute(indexado.insert(), novas)
+    return len(mudancas)
+
+
+@gerenciador_transacao
+def atualizar_indice_categorias(session, *, contexto=None):
+    """Atualiza as linhas de hoje de `indice_precos_categorias`.
+
+    Executada após a reconciliação, quando o histórico de hoje está completo. Sem linhas de
+    hoje, elas são criadas a partir do último dia calculado e dos registros abertos e fechados
+    desde então; em seguida (e também ao reexecutar no mesmo dia, ex: depois de categorizar
+    mais produtos) os produtos que mudaram de categoria são movidos. Sem nenhum dia calculado,
+    o índice é reconstruído a partir de todo o histórico.
+
+    Returns:
+        int: Quantidade de produtos movidos de categoria (ou de dias, na reconstrução).
+
+    """
+    hoje = obter_data_atual()
+    ultimo = session.execute(select(func.max(IndicePrecoCategoria.data))).scalar()
+    if ultimo is None:
+        return recalcular_indice_categorias(session)
+
+    base = session.execute(
+        select(func.max(IndicePrecoCategoria.data)).where(IndicePrecoCategoria.data < hoje),
+    ).scalar()
+    if ultimo < hoje:
+        _avancar_dia(session, base, hoje)
+    movidos = _mover_recategorizados(session, hoje, base or hoje)
+
+    # categorias que ficaram sem produtos hoje
+    _executar(session, "DELETE FROM indice_precos_categorias WHERE data = :hoje AND produtos = 0", hoje=hoje)
+    logger.info(f"Índice de preços por categoria atualizado: {movidos} produtos mudaram de categoria.")
+    return movidos
+
+
+def recalcular_indice_categorias(session):
+    """Refaz `indice_precos_categorias` para todos os dias do histórico de preços.
+
+    As categorias atuais dos produtos valem para todos os dias e passam a ser as guardadas em
+    `indice_categorias_produtos`.
+
+    Args:
+        session: Sessão do SQLAlchemy (a tabela temporária das categorias fica na conexão dela).
+
+    Returns:
+        int: Quantidade de dias calculados.
+
+    """
+    inicio = session.execute(select(func.min(HistoricoPreco.data_inicio))).scalar()
+    session.execute(IndicePrecoCategoria.__table__.delete())
+    session.execute(IndiceCategoriaProduto.__table__.delete())
+    categorias = session.execute(
+        select(Produto.id, Produto.categoria).where(Produto.categoria.is_not(None)),
+    ).all()
+    if categorias:
+        session.execute(
+            IndiceCategoriaProduto.__table__.insert(),
+            [{"produto_id": produto_id, "categoria": categoria} for produto_id, categoria in categorias],
+        )
+    if inicio is None:
+        return 0
+
+    _carregar_categorias(session, ((produto_id, categoria, 1) for produto_id, categoria in categorias))
+    hoje = obter_data_atual()
+    dias = (hoje - inicio).days + 1
+    for dia in range(dias):
+        _calcular_dia(session, inicio + timedelta(days=dia), VIGENTES_HOJE)
+    return dias
+
+
+@gerenciador_transacao
+def reconstruir_indice_categorias(session):
+    """Reconstrói o índice de preços por categoria a partir de todo o histórico."""
+    with CRONOMETRO.etapa("db.indice_categorias"):
+        dias = recalcular_indice_categorias(session)
+    logger.info(f"Índice de preços por categoria reconstruído: {dias} dias.")
+    return dias
+
+
+def carregar_indice_categorias(nivel=1, cidade_id=None):
+    """Carrega as estatísticas diárias por categoria de um nível, somadas entre as cidades.
+
+    Args:
+        nivel: Nível da categoria (1 = raiz).
+        cidade_id: Restringe a uma cidade (com os preços uniformes da cidade 1); None soma todas.
+
+    Returns:
+        pd.DataFrame: data, categoria, produtos, comparaveis, mudancas, preco_medio (reais) e
+            variacao_percentual_diaria (média entre os comparáveis; 0 sem comparáveis).
+
+    """
+    import pandas as pd
+
+    indice = IndicePrecoCategoria
+    consulta = (
+        select(
+            indice.data,
+            indice.categoria,
+            func.sum(indice.produtos).label("produtos"),
+            func.sum(indice.soma_precos).label("soma_precos"),
+            func.sum(indice.comparaveis).label("comparaveis"),
+            func.sum(indice.mudancas).label("mudancas"),
+            func.sum(indice.soma_variacao).label("soma_variacao"),
+        )
+        .where(indice.nivel == nivel)
+        .group_by(indice.data, indice.categoria)
+        .order_by(indice.categoria, indice.data)
+    )
+    if cidade_id is not None:
+        consulta = consulta.where(indice.cidade_id.in_([cidade_id, CIDADE_UNIFORME]))
+    with Session() as session:
+        df = pd.DataFrame(session.execute(consulta).all(), columns=list(consulta.selected_columns.keys()))
+
+    df["data"] = pd.to_datetime(df["data"])
+    # SUM devolve NUMERIC (Decimal) no PostgreSQL
+    somas = ["produtos", "soma_precos", "comparaveis", "mudancas", "soma_variacao"]
+    df[somas] = df[somas].apply(pd.to_numeric)
+    df["preco_medio"] = df["soma_precos"] / df["produtos"] / 100
+    comparaveis = df["comparaveis"].where(df["comparaveis"] > 0)
+    df["variacao_percentual_diaria"] = (df["soma_variacao"] / comparaveis).fillna(0.0)
+    return df.drop(columns=["soma_precos", "soma_variacao"])
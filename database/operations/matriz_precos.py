@@ -0,0 +1,196 @@
+"""Matriz diária de preços materializada.
+
+Cada dia é uma linha de `matriz_precos` com um vetor int32 comprimido: a posição `i`
+guarda o preço, em centavos, do par (produto, cidade) de índice `i` em
+`matriz_precos_pares` (0 quando o par não tinha preço no dia). A execução diária acrescenta
+apenas a coluna do dia, a partir dos registros abertos do histórico, em vez de expandir todo
+o histórico dia a dia; `carregar_matriz_precos` devolve a matriz densa em uma chamada.
+"""
+
+import logging
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import delete, select
+
+from database.connection import Session
+from database.models import HistoricoPreco, MatrizPrecoDia, MatrizPrecoPar
+from utils.data import obter_data_atual
+from utils.metricas import CRONOMETRO
+
+from .utils import gerenciador_transacao
+
+logger = logging.getLogger(__name__)
+
+TIPO_VETOR = np.dtype("<i4")
+
+
+def _comprimir(vetor):
+    return zlib.compress(vetor.astype(TIPO_VETOR, copy=False).tobytes())
+
+
+def _descomprimir(blob):
+    return np.frombuffer(zlib.decompress(blob), dtype=TIPO_VETOR)
+
+
+def _indices_pares(session, pares):
+    """Retorna o mapeamento (produto_id, cidade_id) -> índice, registrando os pares novos."""
+    indices = {
+        (produto_id, cidade_id): indice
+        for indice, produto_id, cidade_id in session.execute(
+            select(MatrizPrecoPar.indice, MatrizPrecoPar.produto_id, MatrizPrecoPar.cidade_id),
+        )
+    }
+    novos = [par for par in dict.fromkeys(pares) if par not in indices]
+    if novos:
+        proximo = len(indices)
+        session.execute(
+            MatrizPrecoPar.__table__.insert(),
+            [
+                {"indice": proximo + i, "produto_id": produto_id, "cidade_id": cidade_id}
+                for i, (produto_id, cidade_id) in enumerate(novos)
+            ],
+        )
+        indices.update((par, proximo + i) for i, par in enumerate(novos))
+    return indices
+
+
+def _gravar_dias(session, dias):
+    """Substitui as colunas das datas informadas; `dias` é uma lista de (data, vetor)."""
+    session.execute(delete(MatrizPrecoDia).where(MatrizPrecoDia.data.in_([data for data, _ in dias])))
+    session.execute(
+        MatrizPrecoDia.__table__.insert(),
+        [{"data": data, "pares": len(vetor), "precos": _comprimir(vetor)} for data, vetor in dias],
+    )
+
+
+@gerenciador_transacao
+def materializar_precos_do_dia(session, *, contexto=None):
+    """Grava a coluna de hoje da matriz com os preços abertos no histórico.
+
+    Executada após a reconciliação do dia, quando os registros abertos de `historico_precos`
+    são exatamente os preços vistos hoje. Reexecutar no mesmo dia substitui a coluna.
+
+    Returns:
+        int: Quantidade de pares com preço no dia.
+
+    """
+    abertos = session.execute(
+        select(HistoricoPreco.produto_id, HistoricoPreco.cidade_id, HistoricoPreco.preco).where(
+            HistoricoPreco.data_fim.is_(None),
+        ),
+    ).all()
+
+    indices = _indices_pares(session, [(produto_id, cidade_id) for produto_id, cidade_id, _ in abertos])
+    vetor = np.zeros(len(indices), dtype=TIPO_VETOR)
+    if abertos:
+        posicoes = np.fromiter((indices[(produto_id, cidade_id)] for produto_id, cidade_id, _ in abertos), np.int64)
+        vetor[posicoes] = [preco for _, _, preco in abertos]
+
+    _gravar_dias(session, [(obter_data_atual(), vetor)])
+    logger.info(f"Matriz de preços: {len(abertos)} pares gravados na coluna do dia.")
+    return len(abertos)
+
+
+def recalcular_matriz_precos(session):
+    """Refaz todas as colunas da matriz a partir do histórico de preços.
+
+    Os índices já atribuídos são mantidos. Cada registro preenche os dias de `data_inicio`
+    até `data_fim` (registros abertos até hoje).
+
+    Args:
+        session: Sessão ou conexão do SQLAlchemy.
+
+    Returns:
+        int: Quantidade de dias gravados.
+
+    """
+    registros = session.execute(
+        select(
+            HistoricoPreco.produto_id,
+            HistoricoPreco.cidade_id,
+            HistoricoPreco.preco,
+            HistoricoPreco.data_inicio,
+            HistoricoPreco.data_fim,
+        ),
+    ).all()
+    session.execute(delete(MatrizPrecoDia))
+    if not registros:
+        return 0
+
+    indices = _indices_pares(session, [(produto_id, cidade_id) for produto_id, cidade_id, *_ in registros])
+    hoje = obter_data_atual()
+    inicio = min(registro.data_inicio for registro in registros)
+    matriz = np.zeros(((hoje - inicio).days + 1, len(indices)), dtype=TIPO_VETOR)
+    for produto_id, cidade_id, preco, data_inicio, data_fim in registros:
+        fim = (data_fim or hoje) - inicio
+        matriz[(data_inicio - inicio).days : fim.days + 1, indices[(produto_id, cidade_id)]] = preco
+
+    _gravar_dias(session, [(inicio + timedelta(days=dia), vetor) for dia, vetor in enumerate(matriz)])
+    return len(matriz)
+
+
+@gerenciador_transacao
+def reconstruir_matriz_precos(session):
+    """Reconstrói a matriz de preços a partir de todo o histórico (após cargas ou correções manuais)."""
+    with CRONOMETRO.etapa("db.matriz_precos"):
+        dias = recalcular_matriz_precos(session)
+    logger.info(f"Matriz de preços reconstruída: {dias} dias.")
+    return dias
+
+
+def carregar_matriz_precos(inicio=None, fim=None, como_dataframe=True):
+    """Carrega a matriz densa de preços diários.
+
+    Dias sem coluna gravada (execuções que não ocorreram) ficam sem preço, assim como os
+    pares registrados depois do dia.
+
+    Args:
+        inicio: Primeira data (inclusive); padrão é a primeira data gravada.
+        fim: Última data (inclusive); padrão é a última data gravada.
+        como_dataframe: Se False, retorna os arrays NumPy em vez do DataFrame.
+
+    Returns:
+        pd.DataFrame: Preços em reais (NaN sem preço), com as datas no índice e as colunas
+            indexadas por (produto_id, cidade_id). Com `como_dataframe=False`, a tupla
+            (datas, pares, precos): datas `datetime64[D]`, pares `(n, 2)` com
+            (produto_id, cidade_id) e precos int32 `(dias, n)` em centavos (0 = sem preço).
+
+    """
+    with Session() as session:
+        pares = np.array(
+            session.execute(
+                select(MatrizPrecoPar.produto_id, MatrizPrecoPar.cidade_id).order_by(MatrizPrecoPar.indice),
+            ).all(),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        consulta = select(MatrizPrecoDia.data, MatrizPrecoDia.precos).order_by(MatrizPrecoDia.data)
+        if inicio is not None:
+            consulta = consulta.where(MatrizPrecoDia.data >= inicio)
+        if fim is not None:
+            consulta = consulta.where(MatrizPrecoDia.data <= fim)
+        dias = session.execute(consulta).all()
+
+    if dias:
+        inicio = inicio or dias[0].data
+        fim = fim or dias[-1].data
+    if inicio is None or fim is None:
+        datas = np.array([], dtype="datetime64[D]")
+    else:
+        datas = np.arange(np.datetime64(inicio, "D"), np.datetime64(fim, "D") + 1)
+    precos = np.zeros((len(datas), len(pares)), dtype=TIPO_VETOR)
+    for data, blob in dias:
+        vetor = _descomprimir(blob)
+        precos[(data - inicio).days, : len(vetor)] = vetor
+
+    if not como_dataframe:
+        return datas, pares, precos
+
+    import pandas as pd
+
+    return pd.DataFrame(
+        np.where(precos > 0, precos / 100, np.nan),
+        index=pd.DatetimeIndex(datas, name="data"),
+        columns=pd.MultiIndex.from_arrays([pares[:, 0], pares[:, 1]], names=["produto_id", "cidade_id"]),
+    )
@@ -1,138 +1,185 @@
 import logging
+from itertools import chain
 
-from sqlalchemy import and_, func
+from sqlalchemy import text
 
 from database.connection import Session
-from database.models import Cidade, HistoricoPreco, Produto
+from database.models import Cidade, HistoricoPreco, Produto, ResumoPreco
 from utils.data import obter_data_atual
+from utils.metricas import CRONOMETRO
 
-from .utils import atualizar_em_lotes, gerenciador_transacao, obter_mapeamento_id
+from .utils import (
+    _executar,
+    fechar_historico_ausentes,
+    gerenciador_transacao,
+    nome_retrato,
+    obter_mapeamento_id,
+    sincronizar_historico,
+)
 
 logger = logging.getLogger(__name__)
 
 @gerenciador_transacao
-def salvar_preco(session, precos_uniformes, precos_variaveis):
+def salvar_preco(session, precos_uniformes, precos_variaveis, *, fechar_ausentes=True, contexto=None):
     """Atualiza o histórico de preços de produtos no banco de dados.
 
     Processa preços uniformes (mesmo preço em todas as cidades) e variáveis (preços específicos
-    por cidade), identificando e registrando apenas as mudanças efetivas. Fecha registros
-    antigos e cria novos quando há alteração de preço, usando operações em lote para otimizar
-    o desempenho com grandes volumes de dados.
+    por cidade), registrando apenas as mudanças efetivas. A comparação com os registros abertos,
+    o fechamento dos alterados e a abertura dos novos rodam no banco (`sincronizar_historico`),
+    sem carregar o histórico ativo no Python.
+
+    Os pares que ganharam um registro novo têm o `resumo_precos` recalculado na mesma
+    transação.
+
+    Com `fechar_ausentes=True` os registros abertos dos pares que não vieram são fechados; por
+    isso o pipeline grava todos os preços do dia de uma vez, na reconciliação
+    (`PipelineGravacao._reconciliar`). Com `fechar_ausentes=False` apenas os pares recebidos
+    são comparados.
+    Com um `contexto` (`ContextoExecucao`), usa a transação e os mapeamentos de id dele.
+
+    Returns:
+        set: Pares (produto_id, cidade_id) vistos neste lote.
+
     """
     if not precos_uniformes and not precos_variaveis:
         logger.info("Nenhum preço para salvar.")
-        return
-
-    hoje = obter_data_atual()
+        return set()
 
-    todos_os_links = {p.link for p in precos_uniformes + precos_variaveis}
+    todos_os_site_ids = {p.site_id for p in chain(precos_uniformes, precos_variaveis)}
     todas_as_cidades = {p.cidade for p in precos_variaveis}
 
-    link_to_id = obter_mapeamento_id(session, Produto, "link", todos_os_links)
-    cidade_to_id = obter_mapeamento_id(session, Cidade, "nome", todas_as_cidades)
+    if contexto is not None:
+        site_id_to_id = contexto.ids_produtos(todos_os_site_ids)
+        cidade_to_id = contexto.ids_cidades(todas_as_cidades)
+    else:
+        site_id_to_id = obter_mapeamento_id(session, Produto, "site_id", todos_os_site_ids)
+        cidade_to_id = obter_mapeamento_id(session, Cidade, "nome", todas_as_cidades)
     cidade_padrao_id = 1
 
     novos_precos = {
-        (link_to_id.get(p.link), cidade_padrao_id): p.preco for p in precos_uniformes if link_to_id.get(p.link)
+        (site_id_to_id.get(p.site_id), cidade_padrao_id): p.preco
+        for p in precos_uniformes
+        if site_id_to_id.get(p.site_id)
     }
     novos_precos.update(
         {
-            (link_to_id.get(p.link), cidade_to_id.get(p.cidade)): p.preco
+            (site_id_to_id.get(p.site_id), cidade_to_id.get(p.cidade)): p.preco
             for p in precos_variaveis
-            if link_to_id.get(p.link) and cidade_to_id.get(p.cidade)
+            if site_id_to_id.get(p.site_id) and cidade_to_id.get(p.cidade)
         },
     )
 
     if not novos_precos:
         logger.info("Nenhum preço válido para processar.")
-        return
-
-    registros_ativos = (
-        session.query(HistoricoPreco.produto_id, HistoricoPreco.cidade_id, HistoricoPreco.preco)
-        .filter(HistoricoPreco.data_fim.is_(None))
-        .all()
+        return set()
+
+    fechados, inseridos = sincronizar_historico(
+        session,
+        HistoricoPreco,
+        [
+            {"produto_id": produto_id, "cidade_id": cidade_id, "preco": preco}
+            for (produto_id, cidade_id), preco in novos_precos.items()
+        ],
+        "preco",
+        "INTEGER",
+        "t.preco <> s.preco",
+        manter_retrato=True,
     )
 
-    precos_atuais = {(r.produto_id, r.cidade_id): r.preco for r in registros_ativos}
+    # o resumo só é recalculado para os pares do lote que ganharam um registro hoje
+    retrato = nome_retrato(HistoricoPreco)
+    if inseridos:
+        with CRONOMETRO.etapa("db.resumo_precos"):
+            recalcular_resumo_precos(
+                session,
+                f"SELECT s.produto_id, s.cidade_id FROM {retrato} s JOIN historico_precos t "
+                "ON t.produto_id = s.produto_id AND t.cidade_id = s.cidade_id AND t.data_inicio = :hoje",
+                hoje=obter_data_atual(),
+            )
+    session.execute(text(f"DROP TABLE IF EXISTS {retrato}"))
+    if fechar_ausentes:
+        fechados += fechar_historico_ausentes(session, HistoricoPreco, novos_precos.keys())
 
-    pares_novos_precos = set(novos_precos.keys())
-    pares_precos_atuais = set(precos_atuais.keys())
+    logger.info(f"Total de alterações de preço: {fechados + inseridos}")
+    logger.info(f"{inseridos} novos registros de preço inseridos.")
+    logger.info(f"{fechados} registros de preço fechados.")
 
-    pares_novos = pares_novos_precos - pares_precos_atuais
-    pares_removidos = pares_precos_atuais - pares_novos_precos
+    return set(novos_precos)
 
-    pares_alterados = {
-        par
-        for par in pares_novos_precos.intersection(pares_precos_atuais)
-        if abs(precos_atuais[par] - novos_precos[par]) > 0.01
-    }
 
-    pares_com_mudanca = list(pares_alterados.union(pares_removidos))
+def recalcular_resumo_precos(session, pares_sql=None, **parametros):
+    """Recalcula `resumo_precos` a partir do histórico para os pares de `pares_sql` (ou todos).
 
-    valores_para_inserir = [
-        HistoricoPreco(
-            produto_id=produto_id,
-            cidade_id=cidade_id,
-            preco=novos_precos[(produto_id, cidade_id)],
-            data_inicio=hoje,
-            data_fim=None,
-        )
-        for produto_id, cidade_id in pares_novos.union(pares_alterados)
-    ]
+    Args:
+        session: Sessão ou conexão do SQLAlchemy.
+        pares_sql: SELECT que retorna (produto_id, cidade_id) dos pares a recalcular; None
+            recalcula a tabela inteira.
+        **parametros: Parâmetros usados em `pares_sql`.
 
-    alteracoes = 0
-    if pares_com_mudanca:
-        alteracoes += atualizar_em_lotes(session, pares_com_mudanca, HistoricoPreco)
+    Returns:
+        int: Quantidade de pares gravados no resumo.
 
-    if valores_para_inserir:
-        session.bulk_save_objects(valores_para_inserir)
-        alteracoes += len(valores_para_inserir)
+    """
+    filtro = f"WHERE (produto_id, cidade_id) IN ({pares_sql})" if pares_sql else ""
+    filtro_historico = f"WHERE (h.produto_id, h.cidade_id) IN ({pares_sql})" if pares_sql else ""
+    _executar(session, f"DELETE FROM resumo_precos {filtro}", **parametros)
+    return _executar(
+        session,
+        f"""
+        INSERT INTO resumo_precos
+            (produto_id, cidade_id, preco_inicial, preco_final, data_inicial, data_final, mudancas)
+        SELECT produto_id, cidade_id,
+            MAX(CASE WHEN ordem = 1 THEN preco END),
+            MAX(CASE WHEN ordem_inversa = 1 THEN preco END),
+            MIN(data_inicio),
+            MAX(data_inicio),
+            SUM(CASE WHEN anterior <> preco THEN 1 ELSE 0 END)
+        FROM (
+            SELECT h.produto_id, h.cidade_id, h.preco, h.data_inicio,
+                ROW_NUMBER() OVER (PARTITION BY h.produto_id, h.cidade_id ORDER BY h.data_inicio) AS ordem,
+                ROW_NUMBER() OVER (PARTITION BY h.produto_id, h.cidade_id ORDER BY h.data_inicio DESC) AS ordem_inversa,
+                LAG(h.preco) OVER (PARTITION BY h.produto_id, h.cidade_id ORDER BY h.data_inicio) AS anterior
+            FROM historico_precos h
+            {filtro_historico}
+        ) historico
+        GROUP BY produto_id, cidade_id
+        """,
+        **parametros,
+    )
 
-    logger.info(f"Total de alterações de preço: {alteracoes}")
-    logger.info(f"{len(valores_para_inserir)} novos registros de preço inseridos.")
-    logger.info(f"{len(pares_com_mudanca)} registros de preço fechados.")
+
+@gerenciador_transacao
+def reconstruir_resumo_precos(session):
+    """Reconstrói `resumo_precos` a partir de todo o histórico (após cargas ou correções manuais)."""
+    with CRONOMETRO.etapa("db.resumo_precos"):
+        pares = recalcular_resumo_precos(session)
+    logger.info(f"Resumo de preços reconstruído: {pares} pares.")
+    return pares
 
 
 def verificar_mudancas_preco():
+    """Retorna os pares (produto, cidade) cujo último preço difere do primeiro, pelo resumo indexado."""
     with Session() as session:
-        # Subquery para encontrar a primeira e a última data de cada produto
-        subquery = (
+        return (
             session.query(
-                HistoricoPreco.produto_id,
-                func.min(HistoricoPreco.data_inicio).label("primeira_data"),
-                func.max(HistoricoPreco.data_inicio).label("ultima_data"),
+                ResumoPreco.produto_id,
+                ResumoPreco.cidade_id,
+                ResumoPreco.preco_inicial,
+                ResumoPreco.preco_final,
+                ResumoPreco.data_inicial.label("primeira_data"),
+                ResumoPreco.data_final.label("ultima_data"),
+                ResumoPreco.mudancas,
             )
-            .group_by(HistoricoPreco.produto_id)
-            .subquery()
+            .filter(ResumoPreco.preco_final != ResumoPreco.preco_inicial)
+            .all()
         )
 
-        # Query principal para obter os preços correspondentes à primeira e última data
-        resultados = (
-            session.query(
-                HistoricoPreco.produto_id,
-                func.first_value(HistoricoPreco.preco)
-                .over(partition_by=HistoricoPreco.produto_id, order_by=HistoricoPreco.data_inicio)
-                .label("preco_inicial"),
-                func.first_value(HistoricoPreco.preco)
-                .over(partition_by=HistoricoPreco.produto_id, order_by=HistoricoPreco.data_inicio.desc())
-                .label("preco_final"),
-                subquery.c.primeira_data,
-                subquery.c.ultima_data,
-            )
-            .join(subquery, HistoricoPreco.produto_id == subquery.c.produto_id)
-            .filter(and_(HistoricoPreco.data_inicio.in_([subquery.c.primeira_data, subquery.c.ultima_data])))
-            .distinct()
-        )
-
-        # Filtrando apenas os produtos com mudança de preço
-        return [r for r in resultados if r.preco_inicial != r.preco_final]
-
 
 def price_change():
     mudancas = verificar_mudancas_preco()
     # for m in mudancas:
     #     print(f"Produto ID {m.produto_id} mudou de preço:")
-    #     print(f"  De R$ {m.preco_inicial:.2f} em {m.primeira_data.strftime('%d/%m/%Y')}")
-    #     print(f"  Para R$ {m.preco_final:.2f} em {m.ultima_data.strftime('%d/%m/%Y')}")
+    #     print(f"  De R$ {m.preco_inicial / 100:.2f} em {m.primeira_data.strftime('%d/%m/%Y')}")
+    #     print(f"  Para R$ {m.preco_final / 100:.2f} em {m.ultima_data.strftime('%d/%m/%Y')}")
     #     print("--------------------")
     logger.info(f"Total de produtos com mudança de preço: {len(mudancas)}")
@@ -1,54 +1,85 @@
 import logging
 
+from sqlalchemy import Integer, String, and_, bindparam, column, func, or_, update, values
+
 from database.connection import Session
 from database.models import Produto
 from utils.data import obter_data_atual
 
-from .utils import gerenciador_transacao
+from .utils import gerenciador_transacao, obter_mapeamento_id
 
 logger = logging.getLogger(__name__)
 
 
 @gerenciador_transacao
-def salvar_produto(session, produtos):
-    """Salva ou atualiza produtos no banco."""
-    if not produtos:
-        logger.info("Nenhum produto válido para inserir.")
-        return
+def salvar_produto(session, produtos, tamanho_lote=1000, *, contexto=None):
+    """Insere ou atualiza os produtos com INSERT ... ON CONFLICT (site_id) DO UPDATE em lotes.
 
-    hoje = obter_data_atual()
+    Os produtos são identificados pelo id numérico do site (`site_id`); o link é guardado
+    como atributo e atualizado se o site mudar o texto dele. Um produto existente só é
+    reescrito quando o nome, o link ou a categoria mudaram, e uma categoria vazia nunca apaga
+    a atual; `data_atualizacao` guarda a data da inclusão ou da última mudança. Em que dias
+    o produto foi visto fica no histórico de disponibilidade, não em `produtos`.
+    Com um `contexto` (`ContextoExecucao`), o mapeamento retornado também é guardado nele.
 
-    links_recebidos = {p.link for p in produtos}
-    produtos_atuais = {p.link: p for p in session.query(Produto).filter(Produto.link.in_(links_recebidos)).all()}
-
-    links_para_inserir = links_recebidos - produtos_atuais.keys()
-    links_para_atualizar = links_recebidos.intersection(produtos_atuais.keys())
-    produtos_para_inserir = []
-
-    for produto_info in produtos:
-        if produto_info.link in links_para_inserir:
-            produtos_para_inserir.append(
-                Produto(
-                    nome=produto_info.nome,
-                    link=produto_info.link,
-                    categoria=produto_info.categoria,
-                    data_atualizacao=hoje,
-                ),
-            )
-        elif produto_info.link in links_para_atualizar:
-            produto_atual = produtos_atuais[produto_info.link]
-            produto_atual.data_atualizacao = hoje
-            if produto_atual.nome != produto_info.nome or (
-                produto_info.categoria and produto_atual.categoria != produto_info.categoria
-            ):
-                produto_atual.nome = produto_info.nome
-                if produto_info.categoria:
-                    produto_atual.categoria = produto_info.categoria
+    Returns:
+        dict: Mapeamento site_id -> id de todos os produtos recebidos.
 
-    if produtos_para_inserir:
-        session.bulk_save_objects(produtos_para_inserir)
+    """
+    if not produtos:
+        logger.info("Nenhum produto válido para inserir.")
+        return {}
 
-    logger.info(f"{len(links_recebidos)} produtos atualizados ou inseridos com sucesso.")
+    hoje = obter_data_atual()
+    dialect = session.bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    # o mesmo produto pode vir de mais de uma categoria; fica o último com categoria
+    por_site_id = {}
+    for produto in produtos:
+        if produto.site_id not in por_site_id or produto.categoria:
+            por_site_id[produto.site_id] = produto
+    valores = [
+        {"site_id": p.site_id, "nome": p.nome, "link": p.link, "categoria": p.categoria, "data_atualizacao": hoje}
+        for p in por_site_id.values()
+    ]
+
+    # um único comando compilado uma vez e executado em lotes (executemany/insertmanyvalues);
+    # montar um VALUES com milhares de linhas custa mais para compilar do que para executar
+    tabela = Produto.__table__
+    stmt = insert(tabela)
+    novo = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabela.c.site_id],
+        set_={
+            "nome": novo.nome,
+            "link": novo.link,
+            "categoria": func.coalesce(novo.categoria, tabela.c.categoria),
+            "data_atualizacao": novo.data_atualizacao,
+        },
+        where=or_(
+            tabela.c.nome != novo.nome,
+            tabela.c.link != novo.link,
+            and_(novo.categoria.is_not(None), tabela.c.categoria.is_distinct_from(novo.categoria)),
+        ),
+    ).returning(tabela.c.site_id, tabela.c.id)
+
+    site_id_to_id = {}
+    for i in range(0, len(valores), tamanho_lote):
+        site_id_to_id.update(session.execute(stmt, valores[i : i + tamanho_lote]).all())
+
+    # linhas sem mudança não passam pelo DO UPDATE e não voltam no RETURNING
+    faltantes = por_site_id.keys() - site_id_to_id.keys()
+    if faltantes:
+        site_id_to_id.update(obter_mapeamento_id(session, Produto, "site_id", faltantes))
+    if contexto is not None:
+        contexto.produtos.update(site_id_to_id)
+
+    logger.info(f"{len(valores)} produtos atualizados ou inseridos com sucesso.")
+    return site_id_to_id
 
 
 def get_link_produto():
@@ -61,21 +92,45 @@ def get_null_product_category():
         return {produto.id for produto in session.query(Produto.id).filter(Produto.categoria.is_(None)).all()}
 
 
-def update_categoria(dados):
-    """Atualiza a categoria de múltiplos produtos no banco de dados.
+@gerenciador_transacao
+def update_categoria(session, dados, tamanho_lote=1000):
+    """Atualiza a categoria de múltiplos produtos no banco de dados (e a `data_atualizacao` deles).
+
+    No PostgreSQL cada lote é aplicado com um único `UPDATE ... FROM (VALUES ...)`; nos
+    demais bancos com um `executemany` do UPDATE por id.
 
     Args:
         dados: Lista de tuplas no formato (id_produto, categoria) contendo
               o ID do produto e sua nova categoria.
+        tamanho_lote: Quantidade de produtos por comando.
 
     """
-    with Session() as session:
-        for id_produto, categoria in dados:
-            produto = session.query(Produto).filter(Produto.id == id_produto).first()
-            produto.categoria = categoria
+    if not dados:
+        return
+
+    # o último valor recebido para um produto prevalece
+    linhas = list(dict(dados).items())
+    tabela = Produto.__table__
+    hoje = obter_data_atual()
+    for i in range(0, len(linhas), tamanho_lote):
+        lote = linhas[i : i + tamanho_lote]
+        if session.bind.dialect.name == "postgresql":
+            novas = values(column("id", Integer), column("categoria", String), name="novas").data(lote)
+            session.execute(
+                update(tabela)
+                .where(tabela.c.id == novas.c.id)
+                .values(categoria=novas.c.categoria, data_atualizacao=hoje),
+            )
+        else:
+            session.execute(
+                update(tabela)
+                .where(tabela.c.id == bindparam("b_id"))
+                .values(categoria=bindparam("b_categoria"), data_atualizacao=hoje),
+                [{"b_id": id_produto, "b_categoria": categoria} for id_produto, categoria in lote],
+            )
+
+    logger.info(f"{len(linhas)} categorias de produtos atualizadas com sucesso.")
 
-        session.commit()
-        logger.info(f"{len(dados)} categorias de produtos atualizadas com sucesso.")
 
 def get_produtos_sem_categoria(limite):
     with Session() as session:
@@ -1,13 +1,16 @@
+import csv
+import io
 import logging
-from datetime import timedelta
+from datetime import date, timedelta
 from functools import wraps
 
 import sqlalchemy
-from sqlalchemy import desc, tuple_
+from sqlalchemy import Date, desc
 
 from database.connection import Session
 from database.models import LogExecucao
 from utils.data import obter_data_atual
+from utils.metricas import CRONOMETRO
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +18,10 @@ logger = logging.getLogger(__name__)
 def gerenciador_transacao(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
+        contexto = kwargs.get("contexto")
+        if contexto is not None:
+            # a transação pertence ao contexto da execução (ContextoExecucao.transacao)
+            return func(contexto.session, *args, **kwargs)
         try:
             with Session() as session:
                 result = func(session, *args, **kwargs)
@@ -41,6 +48,15 @@ def gerenciador_transacao(func):
 
 
 def inserir_com_conflito(session, tabela, valores, indices_conflito):
+    """Insere as linhas ignorando as que conflitarem em `indices_conflito`.
+
+    No PostgreSQL é um único INSERT ... VALUES ... ON CONFLICT DO NOTHING; nos demais
+    bancos (SQLite) um único `executemany` do INSERT OR IGNORE.
+
+    Returns:
+        int: Quantidade de linhas inseridas no PostgreSQL; de linhas enviadas nos demais.
+
+    """
     if not valores:
         logger.info("Nenhum valor para inserir.")
         return 0
@@ -55,13 +71,211 @@ def inserir_com_conflito(session, tabela, valores, indices_conflito):
         result = session.execute(stmt)
         return result.rowcount
 
-    table = tabela.__table__
-    count = 0
-    for valor in valores:
-        stmt = table.insert().prefix_with("OR IGNORE").values(valor)
-        session.execute(stmt)
-        count += 1
-    return count
+    session.execute(tabela.__table__.insert().prefix_with("OR IGNORE"), valores)
+    return len(valores)
+
+
+def _copiar(session, nome_tabela, colunas, linhas):
+    """Preenche uma tabela via COPY FROM STDIN usando a conexão (e a transação) da sessão."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for linha in linhas:
+        # no formato CSV do COPY, campo vazio sem aspas é NULL
+        escritor.writerow(["" if linha[coluna] is None else linha[coluna] for coluna in colunas])
+    buffer.seek(0)
+
+    conexao = session.connection().connection.dbapi_connection
+    with conexao.cursor() as cursor:
+        sql = f"COPY {nome_tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)"
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with cursor.copy(sql) as copia:
+                copia.write(buffer.getvalue())
+
+
+def carregar_tabela_temporaria(session, nome, definicao, linhas):
+    """Cria a tabela temporária `nome` e a preenche com `linhas` (COPY no PostgreSQL, executemany nos demais).
+
+    Args:
+        session: Sessão do SQLAlchemy; a tabela só existe na conexão dela.
+        nome: Nome da tabela temporária.
+        definicao: Colunas em SQL, ex: "produto_id INTEGER, cidade_id INTEGER, PRIMARY KEY (produto_id, cidade_id)".
+        linhas: Lista de dicionários cujas chaves são as colunas da tabela.
+
+    """
+    postgresql = session.bind.dialect.name == "postgresql"
+    session.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {nome}"))
+    session.execute(sqlalchemy.text(f"CREATE TEMP TABLE {nome} ({definicao}){' ON COMMIT DROP' if postgresql else ''}"))
+    if not linhas:
+        return
+
+    colunas = list(linhas[0])
+    with CRONOMETRO.etapa(f"db.carga.{nome}"):
+        if postgresql:
+            _copiar(session, nome, colunas, linhas)
+        else:
+            session.execute(
+                sqlalchemy.text(
+                    f"INSERT INTO {nome} ({', '.join(colunas)}) VALUES ({', '.join(f':{c}' for c in colunas)})",
+                ),
+                linhas,
+            )
+        if postgresql:
+            # tabelas temporárias não são analisadas pelo autovacuum
+            session.execute(sqlalchemy.text(f"ANALYZE {nome}"))
+
+
+def _executar(session, sql, **parametros):
+    """Executa SQL textual com os parâmetros de data tipados (o SQLite grava datas como texto ISO)."""
+    stmt = sqlalchemy.text(sql).bindparams(
+        *(sqlalchemy.bindparam(nome, type_=Date) for nome, valor in parametros.items() if isinstance(valor, date)),
+    )
+    return session.execute(stmt, parametros).rowcount
+
+
+def nome_retrato(tabela):
+    """Nome da tabela temporária com o retrato do dia usada por `sincronizar_historico`."""
+    return f"tmp_retrato_{tabela.__tablename__}"
+
+
+def sincronizar_historico(session, tabela, linhas, coluna_valor, tipo_valor, condicao_mudanca, manter_retrato=False):
+    """Compara o retrato do dia com os registros abertos de uma tabela SCD2 inteiramente no banco.
+
+    O retrato (produto_id, cidade_id, valor) é carregado em uma tabela temporária e então:
+    registros abertos hoje cujo valor mudou são removidos (seriam substituídos no mesmo dia),
+    os demais registros abertos com valor diferente são fechados com um UPDATE ... FROM e os
+    pares sem registro aberto recebem um novo registro com um INSERT ... SELECT. Apenas os
+    pares do retrato são tocados, então o custo acompanha o tamanho do lote e das mudanças,
+    não o do catálogo.
+
+    Args:
+        session: Sessão do SQLAlchemy.
+        tabela: Modelo SCD2 (`HistoricoPreco` ou `DisponibilidadeCidade`).
+        linhas: Dicionários com produto_id, cidade_id e `coluna_valor`, um por par.
+        coluna_valor: Coluna comparada ("preco" ou "disponivel").
+        tipo_valor: Tipo SQL da coluna na tabela temporária.
+        condicao_mudanca: Expressão SQL que compara o registro aberto `t` com o retrato `s`.
+        manter_retrato: Não remove a tabela do retrato (`nome_retrato`) ao terminar, para que
+            o chamador a use na mesma transação.
+
+    Returns:
+        tuple: (registros fechados, registros inseridos).
+
+    """
+    nome = tabela.__tablename__
+    retrato = nome_retrato(tabela)
+    hoje = obter_data_atual()
+    carregar_tabela_temporaria(
+        session,
+        retrato,
+        f"produto_id INTEGER NOT NULL, cidade_id INTEGER NOT NULL, {coluna_valor} {tipo_valor} NOT NULL, "
+        "PRIMARY KEY (produto_id, cidade_id)",
+        linhas,
+    )
+
+    mudou = f"""
+        t.data_fim IS NULL
+        AND EXISTS (
+            SELECT 1 FROM {retrato} s
+            WHERE s.produto_id = t.produto_id AND s.cidade_id = t.cidade_id AND {condicao_mudanca}
+        )
+    """
+    with CRONOMETRO.etapa(f"db.fechar.{nome}"):
+        _executar(session, f"DELETE FROM {nome} AS t WHERE t.data_inicio = :hoje AND {mudou}", hoje=hoje)
+        fechados = _executar(
+            session,
+            f"UPDATE {nome} AS t SET data_fim = :ontem FROM {retrato} s "
+            "WHERE s.produto_id = t.produto_id AND s.cidade_id = t.cidade_id "
+            f"AND t.data_fim IS NULL AND {condicao_mudanca}",
+            ontem=hoje - timedelta(days=1),
+        )
+    with CRONOMETRO.etapa(f"db.inserir.{nome}"):
+        inseridos = _executar(
+            session,
+            f"INSERT INTO {nome} (produto_id, cidade_id, {coluna_valor}, data_inicio, data_fim) "
+            f"SELECT s.produto_id, s.cidade_id, s.{coluna_valor}, :hoje, NULL FROM {retrato} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {nome} t "
+            "WHERE t.produto_id = s.produto_id AND t.cidade_id = s.cidade_id AND t.data_fim IS NULL)",
+            hoje=hoje,
+        )
+    if not manter_retrato:
+        session.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {retrato}"))
+    return fechados, inseridos
+
+
+def fechar_historico_ausentes(session, tabela, pares_vistos, filtro_aberto="", valores_ausentes=None):
+    """Fecha, no banco, os registros abertos cujo par (produto_id, cidade_id) não foi visto hoje.
+
+    Os pares vistos são carregados em uma tabela temporária e os ausentes são encontrados com
+    NOT EXISTS, sem trazer os registros abertos para o Python. Registros abertos hoje são
+    removidos em vez de fechados.
+
+    Args:
+        session: Sessão do SQLAlchemy.
+        tabela: Modelo SCD2.
+        pares_vistos: Pares (produto_id, cidade_id) vistos hoje.
+        filtro_aberto: Condição SQL extra sobre os registros abertos `t` considerados.
+        valores_ausentes: Se informado (ex: {"disponivel": False}), abre um novo registro
+            com esses valores para cada par fechado.
+
+    Returns:
+        int: Quantidade de pares fechados.
+
+    """
+    nome = tabela.__tablename__
+    vistos = f"tmp_vistos_{nome}"
+    ausentes = f"tmp_ausentes_{nome}"
+    hoje = obter_data_atual()
+    carregar_tabela_temporaria(
+        session,
+        vistos,
+        "produto_id INTEGER NOT NULL, cidade_id INTEGER NOT NULL, PRIMARY KEY (produto_id, cidade_id)",
+        [{"produto_id": produto_id, "cidade_id": cidade_id} for produto_id, cidade_id in pares_vistos],
+    )
+    carregar_tabela_temporaria(
+        session,
+        ausentes,
+        "produto_id INTEGER NOT NULL, cidade_id INTEGER NOT NULL, PRIMARY KEY (produto_id, cidade_id)",
+        [],
+    )
+
+    em_ausentes = (
+        f"EXISTS (SELECT 1 FROM {ausentes} a WHERE a.produto_id = t.produto_id AND a.cidade_id = t.cidade_id)"
+    )
+    with CRONOMETRO.etapa(f"db.reconciliar.{nome}"):
+        quantidade = _executar(
+            session,
+            f"INSERT INTO {ausentes} (produto_id, cidade_id) "
+            f"SELECT DISTINCT t.produto_id, t.cidade_id FROM {nome} t WHERE t.data_fim IS NULL {filtro_aberto} "
+            f"AND NOT EXISTS (SELECT 1 FROM {vistos} v "
+            "WHERE v.produto_id = t.produto_id AND v.cidade_id = t.cidade_id)",
+        )
+        _executar(
+            session,
+            f"DELETE FROM {nome} AS t WHERE t.data_fim IS NULL AND t.data_inicio = :hoje AND {em_ausentes}",
+            hoje=hoje,
+        )
+        _executar(
+            session,
+            f"UPDATE {nome} AS t SET data_fim = :ontem WHERE t.data_fim IS NULL AND {em_ausentes}",
+            ontem=hoje - timedelta(days=1),
+        )
+        if valores_ausentes:
+            colunas = ", ".join(valores_ausentes)
+            _executar(
+                session,
+                f"INSERT INTO {nome} (produto_id, cidade_id, {colunas}, data_inicio, data_fim) "
+                f"SELECT a.produto_id, a.cidade_id, {', '.join(f':{c}' for c in valores_ausentes)}, :hoje, NULL "
+                f"FROM {ausentes} a",
+                hoje=hoje,
+                **valores_ausentes,
+            )
+
+    session.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {vistos}"))
+    session.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {ausentes}"))
+    return quantidade
 
 
 def obter_mapeamento_id(session, modelo, campo_chave, valores):
@@ -80,21 +294,3 @@ def last_execution(session):
     if ultima_data:
         return ultima_data[0]
     return None
-
-
-def atualizar_em_lotes(session, pares, tabela, tamanho_lote=500):
-    hoje = obter_data_atual()
-    ontem = hoje - timedelta(days=1)
-    atualizacoes = 0
-    for i in range(0, len(pares), tamanho_lote):
-        lote_atual = pares[i : i + tamanho_lote]
-        rows = (
-            session.query(tabela)
-            .filter(
-                tuple_(tabela.produto_id, tabela.cidade_id).in_(lote_atual),
-                tabela.data_fim.is_(None),
-            )
-            .update({"data_fim": ontem}, synchronize_session=False)
-        )
-        atualizacoes += rows
-    return atualizacoes
@@ -1,37 +1,114 @@
-from collections import defaultdict
+from array import array
 
-from .schemas import DadosProcessados, DisponibilidadeInfo, PrecoInfo, PrecoVariavel, ProdutoInfo
+import numpy as np
+
+from .schemas import DadosProcessados, DisponibilidadeInfo, PrecoInfo, PrecoVariavel, ProdutoInfo, TabelaColunar
+
+
+class AcumuladorPrecos:
+    """Colunas (produto, cidade, preço) acumuladas de vários resultados para classificar de uma vez.
+
+    Um produto tem preço uniforme quando todas as cidades em que aparece têm o mesmo preço, então
+    ele só pode ser classificado depois que todas as suas linhas chegaram; acumular os preços da
+    execução inteira evita classificar o mesmo produto de formas diferentes em lotes diferentes
+    (ex: um produto listado em mais de uma categoria). As cidades recebem um código inteiro, na
+    ordem em que aparecem.
+    """
+
+    def __init__(self):
+        self.cidades = []
+        self.codigos_cidades = {}
+        self.produto, self.cidade, self.preco = array("q"), array("h"), array("q")
+
+    def __len__(self):
+        return len(self.produto)
+
+    def codigo_cidade(self, cidade):
+        codigo = self.codigos_cidades.get(cidade)
+        if codigo is None:
+            codigo = self.codigos_cidades[cidade] = len(self.cidades)
+            self.cidades.append(cidade)
+        return codigo
+
+    def adicionar(self, ids_precos, cidade):
+        """Acrescenta os (site_id, preco em centavos) vistos em `cidade`."""
+        codigo = self.codigo_cidade(cidade)
+        for site_id, preco in ids_precos:
+            self.produto.append(site_id)
+            self.preco.append(preco)
+        self.cidade.extend([codigo] * len(ids_precos))
+
+    def classificar(self):
+        """Retorna (precos_uniformes, precos_variaveis) como `TabelaColunar`."""
+        return _classificar_precos(
+            np.frombuffer(self.produto, dtype=np.int64),
+            np.frombuffer(self.cidade, dtype=np.int16),
+            np.frombuffer(self.preco, dtype=np.int64),
+            self.cidades,
+        )
 
 
 def processar_dados_brutos(resultados):
-    produtos: set[ProdutoInfo] = set()
-    precos_por_link = defaultdict(list)
-    disponibilidades = []
-
-    # Extrair produtos e preços
-    for produtos_raw, links_precos, cidade in resultados:
-        for nome, link, categoria in produtos_raw:
-            produtos.add(ProdutoInfo(nome=nome, link=link, categoria=categoria))
-            disponibilidades.append(DisponibilidadeInfo(produto_link=link, cidade=cidade))
-
-        for link, preco in links_precos:
-            precos_por_link[link].append((preco, cidade))
-
-    # Classificar preços uniformes e variáveis
-    precos_uniformes: list[PrecoInfo] = []
-    precos_variaveis: list[PrecoVariavel] = []
-
-    for link, precos_cidades in precos_por_link.items():
-        primeiro_preco = precos_cidades[0][0]
-        if len(precos_cidades) == 1 or all(preco == primeiro_preco for preco, _ in precos_cidades[1:]):
-            precos_uniformes.append(PrecoInfo(link=link, preco=primeiro_preco))
-        else:
-            for preco, cidade in precos_cidades:
-                precos_variaveis.append(PrecoVariavel(link=link, preco=preco, cidade=cidade))
+    """Organiza os resultados do crawl em produtos, preços e disponibilidades.
+
+    Os produtos são identificados pelo `site_id` e as cidades por um código inteiro
+    (posição na lista de cidades do lote); preços (em centavos) e disponibilidades ficam em colunas
+    NumPy em vez de uma tupla por produto e cidade. Um produto tem preço uniforme quando
+    todas as cidades em que aparece têm o mesmo preço, e variável caso contrário; a
+    classificação é feita de uma vez sobre as colunas ordenadas por produto
+    (`AcumuladorPrecos`).
+
+    Args:
+        resultados: Lista de (produtos, precos, cidade), com produtos = [(site_id, nome, link,
+            categoria)] e precos = [(site_id, preco em centavos)].
+
+    Returns:
+        DadosProcessados: Produtos como lista de `ProdutoInfo`; preços e disponibilidades
+            como `TabelaColunar` de `PrecoInfo`, `PrecoVariavel` e `DisponibilidadeInfo`.
+
+    """
+    produtos: dict[int, ProdutoInfo] = {}
+    precos = AcumuladorPrecos()
+    disponivel_produto, disponivel_cidade = array("q"), array("h")
+
+    for produtos_raw, ids_precos, cidade in resultados:
+        for produto in produtos_raw:
+            site_id = produto[0]
+            # o mesmo produto pode vir de mais de uma categoria; fica o que tiver categoria
+            if site_id not in produtos or produto[3]:
+                produtos[site_id] = ProdutoInfo._make(produto)
+            disponivel_produto.append(site_id)
+        disponivel_cidade.extend([precos.codigo_cidade(cidade)] * len(produtos_raw))
+        precos.adicionar(ids_precos, cidade)
+
+    precos_uniformes, precos_variaveis = precos.classificar()
 
     return DadosProcessados(
-        produtos=list(produtos),
+        produtos=list(produtos.values()),
         precos_uniformes=precos_uniformes,
         precos_variaveis=precos_variaveis,
-        disponibilidades=disponibilidades,
+        disponibilidades=TabelaColunar(
+            DisponibilidadeInfo,
+            [np.frombuffer(disponivel_produto, dtype=np.int64), np.frombuffer(disponivel_cidade, dtype=np.int16)],
+            precos.cidades,
+        ),
+    )
+
+
+def _classificar_precos(produto, cidade, preco, cidades):
+    """Separa os preços em uniformes (um por produto) e variáveis (um por produto e cidade)."""
+    if not len(produto):
+        return TabelaColunar(PrecoInfo, [produto, preco]), TabelaColunar(PrecoVariavel, [produto, preco, cidade], cidades)
+
+    ordem = np.argsort(produto, kind="stable")
+    produto, cidade, preco = produto[ordem], cidade[ordem], preco[ordem]
+
+    # início de cada grupo de linhas do mesmo produto; uniforme quando o menor e o maior preço coincidem
+    inicios = np.flatnonzero(np.r_[True, produto[1:] != produto[:-1]])
+    uniforme = np.minimum.reduceat(preco, inicios) == np.maximum.reduceat(preco, inicios)
+    variavel = ~np.repeat(uniforme, np.diff(np.r_[inicios, len(produto)]))
+
+    return (
+        TabelaColunar(PrecoInfo, [produto[inicios[uniforme]], preco[inicios[uniforme]]]),
+        TabelaColunar(PrecoVariavel, [produto[variavel], preco[variavel], cidade[variavel]], cidades),
     )
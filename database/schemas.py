@@ -1,32 +1,82 @@
 from __future__ import annotations
 
+from collections.abc import Sequence
+from itertools import chain
 from typing import NamedTuple
 
 
 class PrecoInfo(NamedTuple):
-    link: str
-    preco: float
+    site_id: int
+    preco: int  # centavos
 
 
 class PrecoVariavel(NamedTuple):
-    link: str
-    preco: float
+    site_id: int
+    preco: int  # centavos
     cidade: str
 
 
 class DisponibilidadeInfo(NamedTuple):
-    produto_link: str
+    site_id: int
     cidade: str
 
 
 class ProdutoInfo(NamedTuple):
+    site_id: int
     nome: str
     link: str
     categoria: str | None
 
 
+class TabelaColunar(Sequence):
+    """Sequência somente leitura de NamedTuples guardada em colunas (arrays NumPy).
+
+    Cada linha só vira um `tipo` (ex: `PrecoVariavel`) quando é lida, então a lista de
+    objetos nunca existe inteira na memória. A coluna `cidade` guarda códigos inteiros
+    que são traduzidos pelos nomes em `cidades`.
+
+    Args:
+        tipo: NamedTuple das linhas; as colunas seguem `tipo._fields`.
+        colunas: Um array por campo de `tipo`, todos do mesmo tamanho.
+        cidades: Nomes das cidades indexados pelo código usado na coluna `cidade`.
+
+    """
+
+    TAMANHO_BLOCO = 10000
+
+    def __init__(self, tipo, colunas, cidades=()):
+        self.tipo = tipo
+        self.colunas = dict(zip(tipo._fields, colunas))
+        self.cidades = cidades
+
+    def __len__(self):
+        return len(next(iter(self.colunas.values())))
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return list(self)[indice]
+        return self.tipo._make(self._valores(campo, coluna[indice]) for campo, coluna in self.colunas.items())
+
+    def __iter__(self):
+        return chain.from_iterable(self._bloco(i) for i in range(0, len(self), self.TAMANHO_BLOCO))
+
+    def _bloco(self, inicio):
+        fim = inicio + self.TAMANHO_BLOCO
+        colunas = [self._valores(campo, coluna[inicio:fim]) for campo, coluna in self.colunas.items()]
+        return map(self.tipo._make, zip(*colunas))
+
+    def _valores(self, campo, valores):
+        # tolist() converte para int do Python, que os drivers do banco aceitam
+        valores = valores.tolist()
+        if campo != "cidade":
+            return valores
+        if isinstance(valores, list):
+            return [self.cidades[codigo] for codigo in valores]
+        return self.cidades[valores]
+
+
 class DadosProcessados(NamedTuple):
     produtos: list[ProdutoInfo]
-    precos_uniformes: list[PrecoInfo]
-    precos_variaveis: list[PrecoVariavel]
-    disponibilidades: list[DisponibilidadeInfo]
+    precos_uniformes: Sequence[PrecoInfo]
+    precos_variaveis: Sequence[PrecoVariavel]
+    disponibilidades: Sequence[DisponibilidadeInfo]
@@ -1,7 +1,7 @@
 import asyncio
 import logging
 
-from database import DATABASE_TYPE
+from database import DATABASE_TYPE, aplicar_migracoes, atualizar_indice_categorias
 from scraper.config.logging_config import setup_logger
 from scraper.images.bulk_image_links import get_images
 from scraper.images.image_downloader import baixar_imagem
@@ -12,13 +12,16 @@ logger = setup_logger(log_level=logging.INFO)
 
 
 async def main():
-    await baixar_site()  # pega os produtos e preços
+    completo = await baixar_site()  # pega os produtos e preços
     #get_images() # conseguir a maior contidade de links de imagens
     extrair_link_categoria_restante() # pega o restante dos links das imagens
+    if completo:  # com o dia incompleto o histórico de hoje não está fechado
+        atualizar_indice_categorias()  # inclui no índice do dia os produtos categorizados acima
     #await baixar_imagem(20000) # faz o download das imagens
 
 
 if __name__ == "__main__":
     logger.info(f"Conectando ao banco de dados: {DATABASE_TYPE}")
+    aplicar_migracoes()
 
     asyncio.run(main())
@@ -0,0 +1,101 @@
+import json
+import logging
+import sqlite3
+import threading
+import zlib
+
+from scraper.network.crawler import UnidadeTrabalho
+from utils.data import obter_data_atual
+
+logger = logging.getLogger(__name__)
+
+# Versão do formato dos resultados guardados (2: preço em centavos)
+VERSAO_FORMATO = "2"
+
+
+class CheckpointCrawl:
+    """Registro local das unidades de trabalho concluídas no dia e de seus resultados.
+
+    Se o processo morrer no meio do crawl, a próxima execução no mesmo dia baixa apenas
+    as unidades que faltam e reenvia os resultados salvos para o pipeline, que regrava
+    os lotes (a gravação é idempotente no dia) e reconcilia normalmente no final.
+    Checkpoints de outro dia são descartados ao abrir o arquivo.
+
+    Args:
+        caminho: Arquivo SQLite do checkpoint.
+
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS metadados (chave TEXT PRIMARY KEY, valor TEXT NOT NULL)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS unidades (
+                url TEXT NOT NULL,
+                cidade TEXT NOT NULL,
+                categoria TEXT,
+                resultado BLOB NOT NULL,
+                PRIMARY KEY (url, cidade)
+            )
+            """,
+        )
+
+        hoje = obter_data_atual().isoformat()
+        metadados = dict(self._conn.execute("SELECT chave, valor FROM metadados").fetchall())
+        if metadados.get("data") != hoje or metadados.get("formato") != VERSAO_FORMATO:
+            if metadados:
+                logger.info(f"Descartando checkpoint de {metadados.get('data')} (formato {metadados.get('formato')}).")
+            self._conn.execute("DELETE FROM unidades")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO metadados VALUES (?, ?)",
+                [("data", hoje), ("formato", VERSAO_FORMATO)],
+            )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def fechar(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def concluidas(self):
+        """Conjunto de (url, cidade) já concluídos hoje."""
+        with self._lock:
+            return set(self._conn.execute("SELECT url, cidade FROM unidades").fetchall())
+
+    def resultados(self):
+        """Gera (unidade, resultado) de cada unidade concluída, sem o cookie."""
+        with self._lock:
+            linhas = self._conn.execute("SELECT url, cidade, categoria, resultado FROM unidades").fetchall()
+        for url, cidade, categoria, resultado in linhas:
+            produtos, precos, cidade_resultado = json.loads(zlib.decompress(resultado))
+            yield (
+                UnidadeTrabalho(url, categoria, cidade, None),
+                ([tuple(produto) for produto in produtos], [tuple(preco) for preco in precos], cidade_resultado),
+            )
+
+    def salvar(self, unidade, resultado):
+        """Marca a unidade como concluída junto com seu resultado (produtos, precos, cidade)."""
+        dados = zlib.compress(json.dumps(resultado, ensure_ascii=False).encode())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO unidades VALUES (?, ?, ?, ?)",
+                (unidade.url, unidade.cidade, unidade.categoria, dados),
+            )
+            self._conn.commit()
+
+    def limpar(self):
+        """Remove as unidades salvas; chamado quando a execução do dia termina com sucesso."""
+        with self._lock:
+            self._conn.execute("DELETE FROM unidades")
+            self._conn.commit()
@@ -0,0 +1,65 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Endereço do site (sobrescrito pelo benchmark para apontar para um servidor local)
+SITE_URL = os.getenv("SITE_URL", "https://www.irmaosgoncalves.com.br")
+
+# Quantidade de workers que consomem a fila de trabalho (limite global de requisições simultâneas)
+CRAWLER_WORKERS = int(os.getenv("CRAWLER_WORKERS", "20"))
+
+# Limite de requisições simultâneas para um mesmo host
+CRAWLER_LIMITE_POR_HOST = int(os.getenv("CRAWLER_LIMITE_POR_HOST", "10"))
+
+# Tamanho máximo da fila de unidades de trabalho pendentes
+CRAWLER_TAMANHO_FILA = int(os.getenv("CRAWLER_TAMANHO_FILA", "100"))
+
+# Intervalo em segundos entre os relatórios de vazão no log
+CRAWLER_INTERVALO_RELATORIO = float(os.getenv("CRAWLER_INTERVALO_RELATORIO", "30"))
+
+# Com menos produtos sem categoria que isto, baixa só as categorias raiz (mais rápido, sem a categoria dos
+# produtos); a partir disso baixa as folhas, que trazem a categoria
+LIMITE_SEM_CATEGORIA = int(os.getenv("LIMITE_SEM_CATEGORIA", "10000"))
+
+# Quantidade de linhas de produto acumuladas antes de cada gravação no banco
+PIPELINE_TAMANHO_LOTE = int(os.getenv("PIPELINE_TAMANHO_LOTE", "20000"))
+
+# Backend de parsing do HTML ("selectolax", "lxml" ou "html.parser"); vazio escolhe o mais rápido instalado
+PARSER_BACKEND = os.getenv("PARSER_BACKEND") or None
+
+# Quantidade de workers do pool de parsing (0 usa a quantidade de CPUs)
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", "0"))
+
+# Tipo do pool de parsing: "processos" ou "threads"
+PARSER_EXECUTOR = os.getenv("PARSER_EXECUTOR", "processos")
+
+# Cache local das páginas de listagem (reaproveita o parsing de páginas que não mudaram)
+CACHE_ATIVO = os.getenv("CACHE_ATIVO", "1") == "1"
+CACHE_CAMINHO = os.getenv("CACHE_CAMINHO", "cache_respostas.db")
+CACHE_TAMANHO_MAXIMO_MB = int(os.getenv("CACHE_TAMANHO_MAXIMO_MB", "2048"))
+
+# Zonas de preço: baixa cada URL uma vez por grupo de cidades com catálogo idêntico
+ZONAS_ATIVO = os.getenv("ZONAS_ATIVO", "0") == "1"
+ZONAS_CAMINHO = os.getenv("ZONAS_CAMINHO", "zonas_preco.json")
+ZONAS_VALIDADE_DIAS = int(os.getenv("ZONAS_VALIDADE_DIAS", "7"))
+ZONAS_AMOSTRAS = int(os.getenv("ZONAS_AMOSTRAS", "3"))
+
+# Disjuntor por cidade: falhas seguidas para abrir e tempo (segundos) pausado, dobrando a cada reabertura
+DISJUNTOR_LIMITE_FALHAS = int(os.getenv("DISJUNTOR_LIMITE_FALHAS", "5"))
+DISJUNTOR_TEMPO_ABERTO = float(os.getenv("DISJUNTOR_TEMPO_ABERTO", "60"))
+DISJUNTOR_TEMPO_MAXIMO = float(os.getenv("DISJUNTOR_TEMPO_MAXIMO", "600"))
+
+# Concorrência adaptativa (AIMD): limite inicial e arquivo onde o limite aprendido é guardado entre execuções
+CONCORRENCIA_INICIAL = int(os.getenv("CONCORRENCIA_INICIAL", "4"))
+CONCORRENCIA_CAMINHO = os.getenv("CONCORRENCIA_CAMINHO", "concorrencia.json")
+
+# Checkpoint do crawl: unidades concluídas no dia, para retomar após uma interrupção
+CHECKPOINT_ATIVO = os.getenv("CHECKPOINT_ATIVO", "1") == "1"
+CHECKPOINT_CAMINHO = os.getenv("CHECKPOINT_CAMINHO", "checkpoint_crawl.db")
+
+# Gravação em segundo plano dos laços do Selenium (categorias e links de imagens): itens por lote e
+# tempo máximo (segundos) que um item espera no buffer
+GRAVADOR_TAMANHO_LOTE = int(os.getenv("GRAVADOR_TAMANHO_LOTE", "100"))
+GRAVADOR_INTERVALO = float(os.getenv("GRAVADOR_INTERVALO", "30"))
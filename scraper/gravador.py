@@ -0,0 +1,74 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_FIM = object()
+
+
+class GravadorEmSegundoPlano:
+    """Acumula itens e os grava em lotes em uma thread separada.
+
+    Usado nos laços síncronos do Selenium, que não devem esperar pelo banco a cada página:
+    `adicionar` apenas enfileira o item e a thread chama `gravar(lote)` quando o buffer
+    atinge `tamanho_lote` itens ou quando `intervalo` segundos se passaram desde a última
+    gravação. `fechar` (ou a saída do bloco `with`) grava o que restou e encerra a thread.
+
+    Args:
+        gravar: Função que recebe a lista de itens a gravar.
+        tamanho_lote: Quantidade de itens que dispara uma gravação.
+        intervalo: Tempo máximo, em segundos, que um item espera no buffer.
+        nome: Nome usado na thread e no log.
+
+    """
+
+    def __init__(self, gravar, tamanho_lote, intervalo, nome="gravador"):
+        self.gravar = gravar
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.nome = nome
+        self.gravados = 0
+        self._fila = queue.Queue()
+        self._thread = threading.Thread(target=self._executar, name=nome, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def adicionar(self, item):
+        self._fila.put(item)
+
+    def fechar(self):
+        self._fila.put(_FIM)
+        self._thread.join()
+
+    def _executar(self):
+        buffer = []
+        prazo = time.monotonic() + self.intervalo
+        while True:
+            try:
+                item = self._fila.get(timeout=max(prazo - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+
+            if item is not None and item is not _FIM:
+                buffer.append(item)
+            if buffer and (item is _FIM or item is None or len(buffer) >= self.tamanho_lote):
+                self._gravar(buffer)
+                buffer = []
+            if item is None or not buffer:
+                prazo = time.monotonic() + self.intervalo
+            if item is _FIM:
+                return
+
+    def _gravar(self, lote):
+        try:
+            self.gravar(lote)
+            self.gravados += len(lote)
+        except Exception:
+            logger.exception(f"{self.nome}: erro ao gravar {len(lote)} itens.")
@@ -13,6 +13,7 @@ from database import get_count_products_without_images, get_link_produto, save_i
 from scraper.config.driver_config import get_driver
 from scraper.cookies.load_cookies import load_cookie
 from scraper.utils.categories import get_categories
+from scraper.utils.product_parser import extrair_site_id
 from scraper.utils.selenium_helpers import (
     calculate_delay,
     check_for_noimage,
@@ -32,14 +33,6 @@ def extract_image_src(html_string):
     return None
 
 
-def extrair_product_id(link):
-    """Extrai o ID único do link."""
-    match = re.search(r"-(\d+)$", link)
-    if match:
-        return match.group(1)
-    return None
-
-
 def extract_image_id(url):
     pattern = r"/produto/(\d+)/"
     match = re.search(pattern, url)
@@ -48,14 +41,14 @@ def extract_image_id(url):
     return None
 
 
-produtos_dict = {produto.link: produto.id for produto in get_link_produto()}
+produtos_dict = {produto.site_id: produto.id for produto in get_link_produto() if produto.site_id is not None}
 CSS_SELECTOR = ".flex.justify-center.mt-5.cursor-pointer"
 
 
 def processar_e_salvar(row, imagens):
-    link = unquote(row["aa_href"])
-    if link in produtos_dict:
-        produto_id = produtos_dict[link]
+    site_id = extrair_site_id(unquote(row["aa_href"]))
+    if site_id in produtos_dict:
+        produto_id = produtos_dict[site_id]
         link_imagem = row["aa_innerHTML"]
         if link_imagem == "/img/noimage.png":
             return False
@@ -4,6 +4,8 @@ import aiohttp
 from tqdm import tqdm
 
 from database import get_image_links, save_images
+from scraper.config.crawler_config import CONCORRENCIA_CAMINHO, CONCORRENCIA_INICIAL, CRAWLER_WORKERS
+from scraper.network.concurrency import ControladorAIMD
 from scraper.network.request_async import fetch_async
 
 
@@ -15,9 +17,16 @@ async def baixar_imagem(linhas=20000):
     total_requests = get_image_links()[:linhas]
     if not total_requests:
         return
+    controlador = ControladorAIMD.carregar(
+        "imagens", CONCORRENCIA_CAMINHO, limite_inicial=CONCORRENCIA_INICIAL, maximo=CRAWLER_WORKERS,
+    )
     async with aiohttp.ClientSession() as session:
         with tqdm(total=len(total_requests), desc="Progresso") as pbar:
-            tasks = [fetch_async(session, url, pbar=pbar, tipo="imagens") for url in total_requests]
+            tasks = [
+                fetch_async(session, url, pbar=pbar, tipo="imagens", controlador=controlador)
+                for url in total_requests
+            ]
             results = await asyncio.gather(*tasks)
+    controlador.salvar(CONCORRENCIA_CAMINHO)
 
     save_images([(content, url) for url, content in results])
@@ -15,8 +15,10 @@ from database import (
     save_images,
     update_categoria,
 )
+from scraper.config.crawler_config import GRAVADOR_INTERVALO, GRAVADOR_TAMANHO_LOTE
 from scraper.config.driver_config import get_driver
 from scraper.cookies.load_cookies import load_cookie
+from scraper.gravador import GravadorEmSegundoPlano
 from scraper.utils.selenium_helpers import (
     calculate_delay,
     check_for_noimage,
@@ -85,7 +87,12 @@ def extrair_link_categoria_restante(limite=1000):
         logger.info("Pulando a extraçao de imagens.")
         return
 
-    with get_driver(headless=True) as driver, tqdm(total=len(produto_link_id), desc="Progresso") as pbar:
+    with (
+        get_driver(headless=True) as driver,
+        tqdm(total=len(produto_link_id), desc="Progresso") as pbar,
+        GravadorEmSegundoPlano(save_images, GRAVADOR_TAMANHO_LOTE, GRAVADOR_INTERVALO, "imagens") as imagens,
+        GravadorEmSegundoPlano(update_categoria, GRAVADOR_TAMANHO_LOTE, GRAVADOR_INTERVALO, "categorias") as categorias,
+    ):
         logger.info("Iniciando extração de imagens...")
         getframe = SeleniumFrame(
             driver=driver,
@@ -97,8 +104,6 @@ def extrair_link_categoria_restante(limite=1000):
             max_repeats=1,
             with_methods=False,
         )
-        pacote_imagens = []
-        pacote_categoria = []
 
         url_base = "https://www.irmaosgoncalves.com.br"
         driver.get(url_base)
@@ -107,19 +112,8 @@ def extrair_link_categoria_restante(limite=1000):
         for link, id_produto in produto_link_id.items():
             imagem, categoria = process_page(driver, getframe, link, pbar, id_produto, produtos_sem_categoria)
 
+            # a gravação no banco fica com as threads dos gravadores
             if imagem:
-                pacote_imagens.append((id_produto,imagem))
+                imagens.adicionar((id_produto, imagem))
             if categoria:
-                pacote_categoria.append((id_produto,categoria))
-
-            if len(pacote_imagens) >= 10:
-                save_images(pacote_imagens)
-                pacote_imagens.clear()
-            if len(pacote_categoria) >= 5:
-                update_categoria(pacote_categoria)
-                pacote_categoria.clear()
-
-        if pacote_imagens:
-            save_images(pacote_imagens)
-        if pacote_categoria:
-            update_categoria(pacote_categoria)
+                categorias.adicionar((id_produto, categoria))
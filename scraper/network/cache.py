@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Versão do formato dos cards guardados; entradas de outra versão são descartadas ao abrir
+# (2: preço em centavos)
+VERSAO_FORMATO = 2
+
+
+class EntradaCache(NamedTuple):
+    hash: str
+    etag: str | None
+    last_modified: str | None
+    cartoes: list
+
+
+def calcular_hash(texto):
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+class CacheRespostas:
+    """Cache local das páginas de listagem, chaveado por (url, cidade).
+
+    Guarda o hash do conteúdo, o corpo comprimido, os cabeçalhos de validação
+    (ETag/Last-Modified) e os cards já extraídos da página, para que uma página
+    idêntica à do dia anterior não precise ser parseada de novo. O tamanho total
+    é limitado a `tamanho_maximo` bytes, descartando as entradas acessadas há mais tempo.
+
+    Args:
+        caminho: Arquivo SQLite do cache.
+        tamanho_maximo: Tamanho máximo em bytes (corpo + cards comprimidos).
+
+    """
+
+    def __init__(self, caminho, tamanho_maximo):
+        self.caminho = caminho
+        self.tamanho_maximo = tamanho_maximo
+        self.acertos = 0
+        self.faltas = 0
+        self.removidas = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS respostas (
+                url TEXT NOT NULL,
+                cidade TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                corpo BLOB NOT NULL,
+                cartoes BLOB NOT NULL,
+                tamanho INTEGER NOT NULL,
+                acesso REAL NOT NULL,
+                PRIMARY KEY (url, cidade)
+            )
+            """,
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_respostas_acesso ON respostas (acesso)")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != VERSAO_FORMATO:
+            self._conn.execute("DELETE FROM respostas")
+            self._conn.execute(f"PRAGMA user_version = {VERSAO_FORMATO}")
+        self._conn.commit()
+        self._tamanho_total = self._conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def fechar(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def obter(self, url, cidade):
+        """Retorna a entrada da página ou None se ela não estiver no cache."""
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT hash, etag, last_modified, cartoes FROM respostas WHERE url = ? AND cidade = ?",
+                (url, cidade),
+            ).fetchone()
+            if linha is None:
+                return None
+            self._conn.execute(
+                "UPDATE respostas SET acesso = ? WHERE url = ? AND cidade = ?",
+                (time.time(), url, cidade),
+            )
+        hash_conteudo, etag, last_modified, cartoes = linha
+        return EntradaCache(hash_conteudo, etag, last_modified, json.loads(zlib.decompress(cartoes)))
+
+    @staticmethod
+    def cabecalhos_condicionais(entrada):
+        """Cabeçalhos para uma requisição condicional a partir da entrada em cache."""
+        if entrada is None:
+            return None
+        cabecalhos = {}
+        if entrada.etag:
+            cabecalhos["If-None-Match"] = entrada.etag
+        if entrada.last_modified:
+            cabecalhos["If-Modified-Since"] = entrada.last_modified
+        return cabecalhos or None
+
+    def reaproveitar(self, entrada, resposta):
+        """Retorna os cards em cache se a página não mudou (304 ou mesmo hash); senão None."""
+        if entrada is not None and (resposta.status == 304 or calcular_hash(resposta.texto) == entrada.hash):
+            self.acertos += 1
+            return entrada.cartoes
+        self.faltas += 1
+        return None
+
+    def salvar(self, url, cidade, resposta, cartoes):
+        """Grava a página e seus cards, descartando as entradas mais antigas se passar do limite."""
+        corpo = zlib.compress(resposta.texto.encode())
+        cartoes_comprimidos = zlib.compress(json.dumps(cartoes, ensure_ascii=False).encode())
+        tamanho = len(corpo) + len(cartoes_comprimidos)
+        with self._lock:
+            anterior = self._conn.execute(
+                "SELECT tamanho FROM respostas WHERE url = ? AND cidade = ?",
+                (url, cidade),
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    cidade,
+                    calcular_hash(resposta.texto),
+                    resposta.etag,
+                    resposta.last_modified,
+                    corpo,
+                    cartoes_comprimidos,
+                    tamanho,
+                    time.time(),
+                ),
+            )
+            self._tamanho_total += tamanho - (anterior[0] if anterior else 0)
+            if self._tamanho_total > self.tamanho_maximo:
+                self._remover_antigas()
+            self._conn.commit()
+
+    def _remover_antigas(self):
+        # remove até 90% do limite, para não despejar a cada nova gravação
+        alvo = self.tamanho_maximo * 0.9
+        for url, cidade, tamanho in self._conn.execute(
+            "SELECT url, cidade, tamanho FROM respostas ORDER BY acesso",
+        ).fetchall():
+            if self._tamanho_total <= alvo:
+                break
+            self._conn.execute("DELETE FROM respostas WHERE url = ? AND cidade = ?", (url, cidade))
+            self._tamanho_total -= tamanho
+            self.removidas += 1
+
+    def resumo(self):
+        total = self.acertos + self.faltas
+        taxa = self.acertos / total * 100 if total else 0
+        return (
+            f"{self.acertos} acertos, {self.faltas} faltas ({taxa:.1f}% de acerto), "
+            f"{self.removidas} removidas, {self._tamanho_total / 1024 / 1024:.1f} MB em disco"
+        )
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Status que indicam que o servidor está sendo sobrecarregado
+STATUS_SOBRECARGA = {429, 503}
+
+
+class ControladorAIMD:
+    """Controla o número de requisições simultâneas com aumento aditivo e redução multiplicativa.
+
+    A cada `limite` respostas bem-sucedidas o limite sobe em 1; uma resposta 429/503, ou uma
+    latência muito acima da média, multiplica o limite por `fator_reducao`. Reduções ficam
+    espaçadas por `intervalo_reducao` segundos para que uma rajada de erros conte como uma só.
+    Usado como gerenciador de contexto assíncrono em volta de cada requisição.
+
+    Args:
+        chave: Nome usado para persistir o limite aprendido (ex: "site", "imagens").
+        limite_inicial: Limite de partida.
+        minimo: Menor limite permitido.
+        maximo: Maior limite permitido.
+        fator_reducao: Fator aplicado ao limite em caso de sobrecarga.
+        fator_latencia: Latência acima de `fator_latencia` vezes a média conta como sobrecarga.
+        intervalo_reducao: Tempo mínimo em segundos entre duas reduções.
+
+    """
+
+    def __init__(
+        self,
+        chave,
+        limite_inicial=4,
+        minimo=1,
+        maximo=50,
+        fator_reducao=0.5,
+        fator_latencia=3.0,
+        intervalo_reducao=2.0,
+    ):
+        self.chave = chave
+        self.minimo = minimo
+        self.maximo = maximo
+        self.limite = float(min(max(limite_inicial, minimo), maximo))
+        self.fator_reducao = fator_reducao
+        self.fator_latencia = fator_latencia
+        self.intervalo_reducao = intervalo_reducao
+        self.em_uso = 0
+        self.reducoes = 0
+        self.latencia_media = None
+        self._amostras = 0
+        self._ultima_reducao = 0.0
+        self._condicao = asyncio.Condition()
+        # o loop guarda só referências fracas às tarefas: sem esta, uma notificação pendente pode ser coletada
+        self._notificacoes = set()
+
+    async def __aenter__(self):
+        async with self._condicao:
+            await self._condicao.wait_for(lambda: self.em_uso < int(self.limite))
+            self.em_uso += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._condicao:
+            self.em_uso -= 1
+            self._condicao.notify_all()
+
+    def registrar(self, status, latencia):
+        """Ajusta o limite a partir do status (None para falha de conexão) e da latência da resposta."""
+        if status in STATUS_SOBRECARGA:
+            self._reduzir(f"status {status}")
+            return
+        if status != 200:
+            return
+
+        pico = (
+            self.latencia_media is not None
+            and self._amostras >= 20
+            and latencia > self.fator_latencia * self.latencia_media
+        )
+        self.latencia_media = latencia if self.latencia_media is None else 0.9 * self.latencia_media + 0.1 * latencia
+        self._amostras += 1
+        if pico:
+            self._reduzir(f"latência de {latencia:.2f}s")
+            return
+
+        anterior = int(self.limite)
+        self.limite = min(self.limite + 1 / self.limite, self.maximo)
+        if int(self.limite) > anterior:
+            self._acordar()
+
+    def _reduzir(self, motivo):
+        agora = time.monotonic()
+        if agora - self._ultima_reducao < self.intervalo_reducao:
+            return
+        self._ultima_reducao = agora
+        self.limite = max(self.limite * self.fator_reducao, self.minimo)
+        self.reducoes += 1
+        logger.info(f"Concorrência de '{self.chave}' reduzida para {int(self.limite)} ({motivo}).")
+
+    def _acordar(self):
+        async def notificar():
+            async with self._condicao:
+                self._condicao.notify_all()
+
+        tarefa = asyncio.get_running_loop().create_task(notificar())
+        self._notificacoes.add(tarefa)
+        tarefa.add_done_callback(self._notificacoes.discard)
+
+    @classmethod
+    def carregar(cls, chave, caminho, **kwargs):
+        """Cria o controlador partindo do limite aprendido na última execução, se houver."""
+        if Path(caminho).is_file():
+            with open(caminho, encoding="utf-8") as arquivo:
+                try:
+                    limites = json.load(arquivo)
+                except json.JSONDecodeError:
+                    limites = {}
+            if chave in limites:
+                kwargs["limite_inicial"] = limites[chave]
+                logger.info(f"Concorrência de '{chave}' iniciando em {limites[chave]} (última execução).")
+        return cls(chave, **kwargs)
+
+    def salvar(self, caminho):
+        """Persiste o limite atual para que a próxima execução comece perto dele."""
+        limites = {}
+        if Path(caminho).is_file():
+            with open(caminho, encoding="utf-8") as arquivo:
+                try:
+                    limites = json.load(arquivo)
+                except json.JSONDecodeError:
+                    limites = {}
+        limites[self.chave] = int(self.limite)
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            json.dump(limites, arquivo, indent=4)
+        logger.info(f"Concorrência de '{self.chave}' salva em {int(self.limite)} ({self.reducoes} reduções).")
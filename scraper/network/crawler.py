@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from tqdm import tqdm
+
+from scraper.config.crawler_config import (
+    CRAWLER_INTERVALO_RELATORIO,
+    CRAWLER_LIMITE_POR_HOST,
+    CRAWLER_TAMANHO_FILA,
+    CRAWLER_WORKERS,
+    DISJUNTOR_LIMITE_FALHAS,
+    DISJUNTOR_TEMPO_ABERTO,
+    DISJUNTOR_TEMPO_MAXIMO,
+)
+from scraper.network.request_async import RespostaHttp, fetch_async
+from scraper.network.retry import Disjuntor, DisjuntorAberto
+
+logger = logging.getLogger(__name__)
+
+
+class UnidadeTrabalho(NamedTuple):
+    url: str
+    categoria: str | None
+    cidade: str
+    cookie: dict
+
+
+class EstatisticasCrawl:
+    """Acumula contadores de vazão do crawl (páginas, bytes e falhas)."""
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.paginas = 0
+        self.bytes = 0
+        self.falhas = 0
+
+    def registrar(self, conteudo):
+        if conteudo is None:
+            self.falhas += 1
+            return
+        if isinstance(conteudo, RespostaHttp):
+            conteudo = conteudo.texto or ""
+        self.paginas += 1
+        self.bytes += len(conteudo)
+
+    @property
+    def decorrido(self):
+        return max(time.monotonic() - self.inicio, 1e-9)
+
+    @property
+    def paginas_por_segundo(self):
+        return self.paginas / self.decorrido
+
+    @property
+    def bytes_por_segundo(self):
+        return self.bytes / self.decorrido
+
+    def resumo(self, profundidade_fila=None):
+        texto = (
+            f"{self.paginas} páginas, {self.falhas} falhas, "
+            f"{self.paginas_por_segundo:.2f} pág/s, {self.bytes_por_segundo / 1024:.1f} KB/s"
+        )
+        if profundidade_fila is not None:
+            texto += f", fila={profundidade_fila}"
+        return texto
+
+
+class Crawler:
+    """Motor de crawl com fila de trabalho limitada e pool fixo de workers.
+
+    As unidades de trabalho são produzidas sob demanda para uma fila de tamanho fixo
+    e consumidas por `num_workers` workers, de modo que o número de requisições em
+    andamento, de conexões abertas e de páginas em memória não depende da quantidade
+    de categorias ou cidades.
+
+    Com um `controlador` (`ControladorAIMD`), o número de requisições em andamento se
+    adapta às respostas do servidor, ficando entre 1 e `num_workers`.
+
+    Cada cidade tem um `Disjuntor`: enquanto ele está aberto as unidades da cidade são
+    estacionadas e voltam para a fila quando ele fecha, sem ocupar os workers.
+
+    Args:
+        processar: Corrotina `processar(crawler, unidade)` executada por unidade de trabalho.
+        ao_concluir: Corrotina opcional `ao_concluir(unidade, resultado)` chamada com o
+            resultado de cada unidade assim que ela termina.
+        num_workers: Quantidade de workers (limite global de concorrência).
+        limite_por_host: Limite de requisições simultâneas por host.
+        tamanho_fila: Quantidade máxima de unidades pendentes na fila.
+        controlador: `ControladorAIMD` opcional compartilhado por todas as requisições.
+
+    """
+
+    def __init__(
+        self,
+        processar,
+        ao_concluir=None,
+        num_workers=CRAWLER_WORKERS,
+        limite_por_host=CRAWLER_LIMITE_POR_HOST,
+        tamanho_fila=CRAWLER_TAMANHO_FILA,
+        controlador=None,
+    ):
+        self.processar = processar
+        self.ao_concluir = ao_concluir
+        self.num_workers = num_workers
+        self.limite_por_host = limite_por_host
+        self.controlador = controlador
+        self.fila = asyncio.Queue(maxsize=tamanho_fila)
+        self.estatisticas = EstatisticasCrawl()
+        self.session = None
+        self._semaforos_host = defaultdict(lambda: asyncio.Semaphore(self.limite_por_host))
+        self.disjuntores = {}
+        self._estacionadas = defaultdict(list)
+        self._pbar = None
+
+    def disjuntor(self, cidade):
+        if cidade not in self.disjuntores:
+            self.disjuntores[cidade] = Disjuntor(
+                cidade,
+                limite_falhas=DISJUNTOR_LIMITE_FALHAS,
+                tempo_aberto=DISJUNTOR_TEMPO_ABERTO,
+                tempo_maximo=DISJUNTOR_TEMPO_MAXIMO,
+            )
+        return self.disjuntores[cidade]
+
+    async def baixar(self, url, cookies, tipo="produtos", cabecalhos=None, cidade=None):
+        """Baixa uma URL respeitando o limite por host e o disjuntor da cidade e registra a vazão.
+
+        A vaga do host é ocupada a cada tentativa e liberada durante as esperas entre elas.
+        Com o disjuntor da cidade aberto levanta `DisjuntorAberto`, e o worker estaciona a unidade.
+        """
+        host = urlsplit(url).netloc
+        disjuntor = self.disjuntor(cidade) if cidade else None
+        conteudo = await fetch_async(
+            self.session,
+            url,
+            cookies,
+            tipo=tipo,
+            cabecalhos=cabecalhos,
+            disjuntor=disjuntor,
+            controlador=self.controlador,
+            vaga=self._semaforos_host[host],
+        )
+        self.estatisticas.registrar(conteudo)
+        return conteudo
+
+    async def _produzir(self, unidades):
+        for unidade in unidades:
+            await self.fila.put(unidade)
+
+    async def _liberar_estacionadas(self):
+        while True:
+            await asyncio.sleep(1)
+            for cidade, unidades in list(self._estacionadas.items()):
+                if unidades and not self.disjuntor(cidade).aberto:
+                    del self._estacionadas[cidade]
+                    for unidade in unidades:
+                        await self.fila.put(unidade)
+
+    async def _aguardar_conclusao(self, produtor):
+        await produtor
+        while True:
+            await self.fila.join()
+            if not any(self._estacionadas.values()):
+                return
+            await asyncio.sleep(1)
+
+    async def _worker(self):
+        while True:
+            unidade = await self.fila.get()
+            try:
+                if self.disjuntor(unidade.cidade).aberto:
+                    self._estacionadas[unidade.cidade].append(unidade)
+                    continue
+                try:
+                    resultado = await self.processar(self, unidade)
+                except DisjuntorAberto:
+                    # o disjuntor abriu durante a unidade: ela volta para a fila quando ele fechar
+                    self._estacionadas[unidade.cidade].append(unidade)
+                    continue
+                except Exception:
+                    logger.exception(f"Erro ao processar {unidade.url} ({unidade.cidade})")
+                    self._atualizar_progresso()
+                    continue
+                if self.ao_concluir:
+                    await self.ao_concluir(unidade, resultado)
+                self._atualizar_progresso()
+            finally:
+                self.fila.task_done()
+
+    def _atualizar_progresso(self):
+        if self._pbar is None:
+            return
+        self._pbar.update(1)
+        postfix = {
+            "pag_s": f"{self.estatisticas.paginas_por_segundo:.1f}",
+            "kb_s": f"{self.estatisticas.bytes_por_segundo / 1024:.0f}",
+            "fila": self.fila.qsize(),
+        }
+        if self.controlador:
+            postfix["conc"] = int(self.controlador.limite)
+        self._pbar.set_postfix(postfix, refresh=False)
+
+    async def _relatar(self):
+        while True:
+            await asyncio.sleep(CRAWLER_INTERVALO_RELATORIO)
+            logger.info(f"Crawl: {self.estatisticas.resumo(self.fila.qsize())}")
+
+    async def executar(self, unidades, total=None):
+        """Processa todas as unidades de trabalho e retorna as estatísticas do crawl.
+
+        Args:
+            unidades: Iterável (de preferência um gerador) de `UnidadeTrabalho`.
+            total: Quantidade total de unidades, usada apenas na barra de progresso.
+
+        """
+        self.estatisticas = EstatisticasCrawl()
+        connector = aiohttp.TCPConnector(limit=self.num_workers, limit_per_host=self.limite_por_host)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            self.session = session
+            with tqdm(total=total, desc="Progresso") as pbar:
+                self._pbar = pbar
+                produtor = asyncio.create_task(self._produzir(unidades))
+                conclusao = asyncio.create_task(self._aguardar_conclusao(produtor))
+                workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+                auxiliares = [asyncio.create_task(self._relatar()), asyncio.create_task(self._liberar_estacionadas())]
+                try:
+                    # os workers só terminam por exceção, que é propagada aqui
+                    prontas, _ = await asyncio.wait([conclusao, *workers], return_when=asyncio.FIRST_COMPLETED)
+                    for tarefa in prontas:
+                        tarefa.result()
+                finally:
+                    for tarefa in [produtor, conclusao, *workers, *auxiliares]:
+                        tarefa.cancel()
+                    self._pbar = None
+            self.session = None
+
+        logger.info(f"Crawl finalizado: {self.estatisticas.resumo()}")
+        return self.estatisticas
@@ -4,22 +4,41 @@ import time
 import requests
 
 from scraper.config.request_config import HEADERS
+from scraper.network.retry import POLITICA_PADRAO
 
 logger = logging.getLogger(__name__)
-def fetch(url, cookies=None, max_retries=6, initial_delay=10):
-    try:
-        for attempt in range(1, max_retries):
+
+
+def fetch(url, cookies=None, politica=None, disjuntor=None):
+    """Versão síncrona do fetch, com a mesma `PoliticaRetry` do `fetch_async`."""
+    politica = politica or POLITICA_PADRAO
+    inicio = time.monotonic()
+    tentativa = 0
+    while True:
+        tentativa += 1
+        if disjuntor:
+            disjuntor.aguardar_sync()
+
+        status = retry_after = None
+        try:
             with requests.get(url, headers=HEADERS, cookies=cookies) as response:
-                if response.status_code == 200:
+                status = response.status_code
+                retry_after = response.headers.get("Retry-After")
+                if status == 200:
+                    if disjuntor:
+                        disjuntor.registrar_sucesso()
                     return response.content
+        except requests.RequestException as erro:
+            logger.warning(f"Erro de conexão em {url}: {erro!r}")
 
-                delay = initial_delay * (2**attempt)
-                logger.warning(f"Status {response.status_code} recebido. Aguardando {delay} segundos.")
+        if disjuntor and politica.deve_retentar(status):
+            disjuntor.registrar_falha()
 
-                time.sleep(delay)
-    except requests.RequestException:
-        logger.exception(f"Erro ao fazer requisição para {url}")
-        time.sleep(5)
+        espera = politica.espera(tentativa, status, retry_after, time.monotonic() - inicio)
+        if espera is None:
+            break
+        logger.warning(f"Status {status} recebido. Aguardando {espera:.2f} segundos.")
+        time.sleep(espera)
 
-    logger.error(f"Falha após {max_retries} tentativas para {url}")
+    logger.error(f"Falha após {tentativa} tentativas para {url}")
     return None
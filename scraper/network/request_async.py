@@ -1,42 +1,106 @@
 import asyncio
 import logging
+import time
+from contextlib import nullcontext
+from typing import NamedTuple
 
 import aiohttp
 
 from scraper.config.request_config import HEADERS
-from scraper.utils.selenium_helpers import calculate_delay
+from scraper.network.retry import POLITICA_PADRAO, DisjuntorAberto
 
 logger = logging.getLogger(__name__)
 
 
-async def fetch_async(session, url, cookies=None, pbar=None, tipo="produtos", max_retries=25):
+class RespostaHttp(NamedTuple):
+    status: int
+    texto: str | None
+    etag: str | None
+    last_modified: str | None
+
+
+async def fetch_async(
+    session,
+    url,
+    cookies=None,
+    pbar=None,
+    tipo="produtos",
+    politica=None,
+    cabecalhos=None,
+    disjuntor=None,
+    controlador=None,
+    vaga=None,
+):
+    """Faz um GET com retentativas seguindo a `PoliticaRetry` informada.
+
+    Com `tipo="resposta"` retorna um `RespostaHttp` (inclusive para 304 Not Modified),
+    permitindo requisições condicionais via `cabecalhos` (If-None-Match / If-Modified-Since).
+    Com um `disjuntor`, cada tentativa informa a ele os sucessos e as falhas; com ele aberto
+    (antes de uma tentativa ou depois da falha que o abriu) levanta `DisjuntorAberto`, para que
+    quem chamou adie a requisição em vez de esperar. Com um `controlador` (`ControladorAIMD`),
+    cada tentativa ocupa uma vaga de concorrência e o status/latência da resposta ajustam o
+    limite. `vaga` é um gerenciador de contexto assíncrono extra (ex: o semáforo do host)
+    ocupado só durante cada tentativa; as esperas entre elas não o seguram.
+    """
     if cookies is None:
         cookies = {}
-    delay = calculate_delay(1)
-    for attempt in range(1, max_retries + 1):
+    politica = politica or POLITICA_PADRAO
+    headers = {**HEADERS, **cabecalhos} if cabecalhos else HEADERS
+    inicio = time.monotonic()
+    tentativa = 0
+    while True:
+        tentativa += 1
+        if disjuntor and disjuntor.aberto:
+            raise DisjuntorAberto(disjuntor.nome)
+        status = retry_after = None
         try:
-            async with session.get(url, headers=HEADERS, cookies=cookies) as response:
-                if response.status == 200:
-                    pbar.update(1)
-                    if tipo == "imagens":
-                        content = await response.read()
-                        return url, content
-                    return await response.text()
-                if response.status == 503 and tipo == "imagens":
-                    pbar.update(1)
-                    logger.warning(f"Status {response.status} nao fazer mais requesicoes para {url}")
-                    return (None, None)
-                if attempt < max_retries:
-                    delay = calculate_delay(attempt)
-                    # logger.warning(f"Status {response.status} recebido. Aguardando {delay:.2f} segundos.")
-
-                    await asyncio.sleep(delay)
-        except aiohttp.ClientError:  # noqa: PERF203
-            logger.exception(f"Erro ao fazer requisição para {url}")
-            await asyncio.sleep(delay)
-
-    logger.error(f"Falha após {max_retries} tentativas para {url}")
-    pbar.update(1)
-    if pbar:
+            async with vaga or nullcontext(), controlador or nullcontext():
+                inicio_tentativa = time.monotonic()
+                async with session.get(url, headers=headers, cookies=cookies) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    if controlador:
+                        controlador.registrar(status, time.monotonic() - inicio_tentativa)
+                    if tipo == "resposta" and status in (200, 304):
+                        texto = await response.text() if status == 200 else None
+                        if disjuntor:
+                            disjuntor.registrar_sucesso()
+                        return RespostaHttp(
+                            status,
+                            texto,
+                            response.headers.get("ETag"),
+                            response.headers.get("Last-Modified"),
+                        )
+                    if status == 200:
+                        if disjuntor:
+                            disjuntor.registrar_sucesso()
+                        if pbar:
+                            pbar.update(1)
+                        if tipo == "imagens":
+                            content = await response.read()
+                            return url, content
+                        return await response.text()
+                    if status == 503 and tipo == "imagens":
+                        if pbar:
+                            pbar.update(1)
+                        logger.warning(f"Status {status} nao fazer mais requesicoes para {url}")
+                        return (None, None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as erro:
+            logger.warning(f"Erro de conexão em {url}: {erro!r}")
+
+        if disjuntor and politica.deve_retentar(status):
+            disjuntor.registrar_falha()
+            if disjuntor.aberto:
+                raise DisjuntorAberto(disjuntor.nome)
+
+        espera = politica.espera(tentativa, status, retry_after, time.monotonic() - inicio)
+        if espera is None:
+            break
+        await asyncio.sleep(espera)
+
+    logger.error(f"Falha após {tentativa} tentativas para {url} (último status: {status})")
+    if tipo == "imagens":
+        if pbar:
+            pbar.update(1)
         return (None, None)
     return None
@@ -0,0 +1,154 @@
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Status que indicam sobrecarga/erro temporário do servidor e valem nova tentativa
+STATUS_SERVIDOR = {500, 502, 503, 504}
+STATUS_LIMITE = 429
+
+
+def interpretar_retry_after(valor):
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos de espera."""
+    if not valor:
+        return None
+    valor = valor.strip()
+    if valor.isdigit():
+        return float(valor)
+    try:
+        data = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    return max(data.timestamp() - time.time(), 0.0)
+
+
+class PoliticaRetry:
+    """Política de retentativas compartilhada pelos fetchers síncrono e assíncrono.
+
+    Cada tipo de falha tem o seu próprio atraso base: 429 (limite de requisições), 5xx
+    (erro do servidor) e falhas de conexão (status None). O atraso cresce exponencialmente
+    com jitter, respeita o Retry-After quando o servidor o envia e nunca ultrapassa o prazo
+    total da requisição. Outros status (404, 403, ...) não são retentados.
+
+    Args:
+        max_tentativas: Número máximo de tentativas por requisição.
+        prazo: Tempo máximo em segundos gasto em uma requisição, somando as esperas.
+        base_limite: Atraso base para 429.
+        base_servidor: Atraso base para 5xx.
+        base_conexao: Atraso base para falhas de conexão.
+        atraso_maximo: Maior espera entre duas tentativas.
+        jitter_factor: Fator de aleatoriedade (0.0 a 1.0).
+
+    """
+
+    def __init__(
+        self,
+        max_tentativas=8,
+        prazo=900,
+        base_limite=10,
+        base_servidor=5,
+        base_conexao=2,
+        atraso_maximo=300,
+        jitter_factor=0.1,
+    ):
+        self.max_tentativas = max_tentativas
+        self.prazo = prazo
+        self.base_limite = base_limite
+        self.base_servidor = base_servidor
+        self.base_conexao = base_conexao
+        self.atraso_maximo = atraso_maximo
+        self.jitter_factor = jitter_factor
+
+    @staticmethod
+    def deve_retentar(status):
+        return status is None or status == STATUS_LIMITE or status in STATUS_SERVIDOR
+
+    def espera(self, tentativa, status=None, retry_after=None, decorrido=0.0):
+        """Retorna quantos segundos esperar antes da próxima tentativa, ou None para desistir.
+
+        Args:
+            tentativa: Número da tentativa que acabou de falhar (começando em 1).
+            status: Status HTTP recebido, ou None para falha de conexão.
+            retry_after: Valor bruto do cabeçalho Retry-After, se houver.
+            decorrido: Segundos já gastos na requisição.
+
+        """
+        if tentativa >= self.max_tentativas or not self.deve_retentar(status):
+            return None
+
+        atraso = interpretar_retry_after(retry_after)
+        if atraso is None:
+            if status == STATUS_LIMITE:
+                base = self.base_limite
+            elif status is None:
+                base = self.base_conexao
+            else:
+                base = self.base_servidor
+            atraso = min(base * 2 ** (tentativa - 1), self.atraso_maximo)
+            atraso += random.uniform(0, atraso * self.jitter_factor)
+
+        if decorrido + atraso > self.prazo:
+            return None
+        return atraso
+
+
+class DisjuntorAberto(Exception):
+    """Tentativa interrompida porque o disjuntor da cidade está aberto."""
+
+    def __init__(self, nome):
+        super().__init__(f"Disjuntor de {nome} aberto.")
+        self.nome = nome
+
+
+class Disjuntor:
+    """Circuit breaker de uma cidade (cookie).
+
+    Após `limite_falhas` falhas seguidas o disjuntor abre e as requisições da cidade
+    ficam pausadas por `tempo_aberto` segundos: o `fetch` síncrono espera e o assíncrono
+    levanta `DisjuntorAberto`, para o crawler estacionar a unidade sem ocupar o worker.
+    Passado esse tempo ele fica meio-aberto:
+    o próximo sucesso o fecha e uma nova falha o reabre com o dobro do tempo (até
+    `tempo_maximo`).
+    """
+
+    def __init__(self, nome, limite_falhas=5, tempo_aberto=60, tempo_maximo=600):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto_inicial = tempo_aberto
+        self.tempo_aberto = tempo_aberto
+        self.tempo_maximo = tempo_maximo
+        self.falhas_seguidas = 0
+        self.aberturas = 0
+        self._reabre_em = 0.0
+
+    @property
+    def aberto(self):
+        return time.monotonic() < self._reabre_em
+
+    @property
+    def segundos_restantes(self):
+        return max(self._reabre_em - time.monotonic(), 0.0)
+
+    def registrar_sucesso(self):
+        self.falhas_seguidas = 0
+        self.tempo_aberto = self.tempo_aberto_inicial
+
+    def registrar_falha(self):
+        self.falhas_seguidas += 1
+        if self.falhas_seguidas < self.limite_falhas or self.aberto:
+            return
+        self._reabre_em = time.monotonic() + self.tempo_aberto
+        self.aberturas += 1
+        logger.warning(f"Disjuntor de {self.nome} aberto por {self.tempo_aberto:.0f} segundos.")
+        self.tempo_aberto = min(self.tempo_aberto * 2, self.tempo_maximo)
+        # meio-aberto: a primeira falha após reabrir já abre de novo
+        self.falhas_seguidas = self.limite_falhas - 1
+
+    def aguardar_sync(self):
+        while self.aberto:
+            time.sleep(self.segundos_restantes)
+
+
+POLITICA_PADRAO = PoliticaRetry()
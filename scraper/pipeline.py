@@ -0,0 +1,135 @@
+import asyncio
+import logging
+
+import sqlalchemy
+
+from database import (
+    AcumuladorPrecos,
+    ContextoExecucao,
+    atualizar_indice_categorias,
+    fechar_disponibilidades_ausentes,
+    materializar_precos_do_dia,
+    processar_dados_brutos,
+    salvar_disponibilidade,
+    salvar_preco,
+    salvar_produto,
+)
+from scraper.config.crawler_config import PIPELINE_TAMANHO_LOTE
+from utils.metricas import CRONOMETRO
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineGravacao:
+    """Acumula os resultados do crawl e grava no banco em lotes durante a execução.
+
+    Produtos e disponibilidades entram no buffer assim que chegam e são gravados quando ele
+    atinge `tamanho_lote` linhas. Os preços só são gravados em `finalizar`: a classificação em
+    preço uniforme ou variável depende de todas as cidades (e categorias) em que o produto
+    apareceu no dia, então eles ficam em colunas (`AcumuladorPrecos`) até o fim do crawl e são
+    classificados uma única vez. A gravação dos preços, o fechamento dos registros que não
+    apareceram no dia, a coluna do dia da matriz de preços e o índice de preços por categoria
+    do dia formam a reconciliação, em uma única transação.
+
+    Todas as gravações usam a conexão e os mapeamentos de id do `ContextoExecucao`, com
+    uma transação por lote (produtos e disponibilidade juntos).
+
+    Args:
+        contexto: `ContextoExecucao` da execução; se omitido, o pipeline cria o seu.
+        tamanho_lote: Quantidade de linhas de produto que dispara uma gravação.
+
+    """
+
+    def __init__(self, contexto=None, tamanho_lote=PIPELINE_TAMANHO_LOTE):
+        self.contexto = contexto or ContextoExecucao()
+        self.tamanho_lote = tamanho_lote
+        self.buffer = []
+        self.linhas_buffer = 0
+        self.precos = AcumuladorPrecos()
+        self.disponibilidades_vistas = set()
+        self.lotes_gravados = 0
+        self.lotes_com_falha = 0
+        self._lock = asyncio.Lock()
+
+    async def adicionar(self, resultado):
+        """Recebe o resultado (produtos, precos, cidade) de uma unidade; grava o buffer se estiver cheio."""
+        produtos, precos, cidade = resultado
+        self.precos.adicionar(precos, cidade)
+        self.buffer.append((produtos, [], cidade))
+        self.linhas_buffer += len(produtos)
+
+        if self.linhas_buffer >= self.tamanho_lote:
+            await self.flush()
+
+    async def flush(self):
+        """Grava o conteúdo atual do buffer sem bloquear o loop de eventos."""
+        async with self._lock:
+            if not self.buffer:
+                return
+            lote, self.buffer, self.linhas_buffer = self.buffer, [], 0
+            await asyncio.to_thread(self._gravar, lote)
+
+    def _gravar(self, lote):
+        with CRONOMETRO.etapa("db.processar"):
+            dados_processados = processar_dados_brutos(lote)
+
+        contexto = self.contexto
+        self.lotes_gravados += 1
+        try:
+            with contexto.transacao(), CRONOMETRO.etapa("db.transacao"):
+                with CRONOMETRO.etapa("db.produtos"):
+                    salvar_produto(dados_processados.produtos, contexto=contexto)
+                with CRONOMETRO.etapa("db.disponibilidade"):
+                    disponibilidades = salvar_disponibilidade(
+                        dados_processados.disponibilidades,
+                        fechar_ausentes=False,
+                        contexto=contexto,
+                    )
+        except (sqlalchemy.exc.SQLAlchemyError, ValueError):
+            self.lotes_com_falha += 1
+            logger.exception(f"Erro ao gravar o lote {self.lotes_gravados}, transação desfeita.")
+            return
+
+        self.disponibilidades_vistas |= disponibilidades
+        logger.info(f"Lote {self.lotes_gravados} gravado: {len(dados_processados.produtos)} produtos.")
+
+    def _reconciliar(self):
+        with CRONOMETRO.etapa("db.processar"):
+            precos_uniformes, precos_variaveis = self.precos.classificar()
+
+        try:
+            with self.contexto.transacao():
+                with CRONOMETRO.etapa("db.precos"):
+                    salvar_preco(precos_uniformes, precos_variaveis, contexto=self.contexto)
+                fechar_disponibilidades_ausentes(self.disponibilidades_vistas, contexto=self.contexto)
+                # com os ausentes fechados, os preços abertos são os do dia
+                with CRONOMETRO.etapa("db.matriz_precos"):
+                    materializar_precos_do_dia(contexto=self.contexto)
+                with CRONOMETRO.etapa("db.indice_categorias"):
+                    atualizar_indice_categorias(contexto=self.contexto)
+        except (sqlalchemy.exc.SQLAlchemyError, ValueError):
+            logger.exception("Erro na reconciliação, transação desfeita.")
+            return False
+        return True
+
+    async def finalizar(self):
+        """Grava os resultados restantes, os preços do dia e reconcilia os registros não vistos.
+
+        Returns:
+            bool: True se todos os lotes e a reconciliação foram gravados, ou seja, se o dia
+                está completo no banco; False caso contrário (a execução deve ser retomada).
+
+        """
+        await self.flush()
+
+        # com um lote perdido, pares vistos hoje seriam fechados por engano
+        if self.lotes_com_falha:
+            logger.error(f"{self.lotes_com_falha} lotes falharam, reconciliação ignorada.")
+            return False
+
+        with CRONOMETRO.etapa("db.reconciliacao"):
+            completo = await asyncio.to_thread(self._reconciliar)
+
+        logger.info(f"Produtos disponives: {len(self.disponibilidades_vistas)}")
+        logger.info(f"Tempo de gravação por etapa (s): {CRONOMETRO.resumo('db.')}")
+        return completo
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+from datetime import date
+from pathlib import Path
+from typing import NamedTuple
+
+from scraper.network.crawler import Crawler, UnidadeTrabalho
+from utils.data import obter_data_atual
+
+logger = logging.getLogger(__name__)
+
+
+class ZonaPreco(NamedTuple):
+    """Grupo de cidades cujos cookies retornam o mesmo catálogo (produtos e preços)."""
+
+    representante: str
+    cookie: dict
+    membros: list[str]
+
+
+def escolher_amostras(urls, quantidade):
+    """Escolhe `quantidade` URLs espalhadas uniformemente pela lista."""
+    if quantidade >= len(urls):
+        return list(urls)
+    passo = len(urls) / quantidade
+    return [urls[int(i * passo)] for i in range(quantidade)]
+
+
+def calcular_impressao(resultados):
+    """Impressão digital do catálogo de uma cidade a partir dos (site_id, preco) das amostras."""
+    itens = sorted({(site_id, preco) for _, precos, _ in resultados for site_id, preco in precos})
+    return hashlib.sha256(json.dumps(itens).encode()).hexdigest()
+
+
+async def detectar_zonas(cookies, urls_amostra, processar, controlador=None):
+    """Baixa as amostras com cada cookie e agrupa os cookies que retornam catálogos idênticos.
+
+    Cookies cujas amostras falharam (alguma página vazia) ficam sozinhos em sua zona.
+
+    Args:
+        cookies: Lista de (cidade, cookie).
+        urls_amostra: URLs de categoria usadas como amostra.
+        processar: Mesma corrotina `processar(crawler, unidade)` usada no crawl.
+        controlador: `ControladorAIMD` opcional, compartilhado com o crawl principal.
+
+    """
+    resultados = {cidade: [] for cidade, _ in cookies}
+
+    async def ao_concluir(unidade, resultado):
+        resultados[unidade.cidade].append(resultado)
+
+    unidades = [
+        UnidadeTrabalho(url, None, cidade, cookie) for url in urls_amostra for cidade, cookie in cookies
+    ]
+    await Crawler(processar, ao_concluir, controlador=controlador).executar(unidades, total=len(unidades))
+
+    grupos = {}
+    for cidade, cookie in cookies:
+        amostras = resultados[cidade]
+        if len(amostras) < len(urls_amostra) or any(not precos for _, precos, _ in amostras):
+            chave = f"isolada:{cidade}"
+        else:
+            chave = calcular_impressao(amostras)
+        grupos.setdefault(chave, []).append((cidade, cookie))
+
+    zonas = [ZonaPreco(membros[0][0], membros[0][1], [cidade for cidade, _ in membros]) for membros in grupos.values()]
+    logger.info(f"{len(cookies)} cookies agrupados em {len(zonas)} zonas de preço.")
+    return zonas
+
+
+def salvar_zonas(zonas, caminho):
+    """Salva a data da detecção e as cidades de cada zona (os cookies vêm do cookies.json ao carregar)."""
+    dados = {
+        "data": obter_data_atual().isoformat(),
+        "zonas": [{"representante": zona.representante, "membros": zona.membros} for zona in zonas],
+    }
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump(dados, arquivo, ensure_ascii=False, indent=4)
+
+
+def carregar_zonas(cookies, caminho, validade_dias):
+    """Carrega as zonas salvas se ainda forem válidas para os cookies atuais; senão retorna None.
+
+    O arquivo guarda só as cidades de cada zona; o cookie de cada zona é o atual do
+    representante, em `cookies`. As zonas são revalidadas quando passam de `validade_dias` dias
+    ou quando o conjunto de cidades (cookies) mudou desde a detecção.
+    """
+    if not Path(caminho).is_file():
+        return None
+
+    with open(caminho, encoding="utf-8") as arquivo:
+        try:
+            dados = json.load(arquivo)
+        except json.JSONDecodeError:
+            logger.warning(f"Arquivo de zonas {caminho} inválido, detectando novamente.")
+            return None
+
+    idade = (obter_data_atual() - date.fromisoformat(dados["data"])).days
+    if idade >= validade_dias:
+        logger.info(f"Zonas de preço com {idade} dias, revalidando.")
+        return None
+
+    if any("cookie" in zona for zona in dados["zonas"]):
+        # formato antigo, com os cookies gravados: detecta de novo para regravar o arquivo sem eles
+        logger.info(f"Arquivo de zonas {caminho} no formato antigo, detectando novamente.")
+        return None
+
+    cidades_zonas = {cidade for zona in dados["zonas"] for cidade in zona["membros"]}
+    if cidades_zonas != {cidade for cidade, _ in cookies}:
+        logger.info("Cidades mudaram desde a detecção das zonas, revalidando.")
+        return None
+
+    # usa sempre o cookie atual do representante
+    cookie_por_cidade = dict(cookies)
+    return [
+        ZonaPreco(zona["representante"], cookie_por_cidade[zona["representante"]], zona["membros"])
+        for zona in dados["zonas"]
+    ]
+
+
+async def obter_zonas(cookies, urls, processar, caminho, validade_dias, amostras, controlador=None):
+    """Retorna as zonas de preço, reaproveitando as salvas ou detectando-as novamente."""
+    zonas = carregar_zonas(cookies, caminho, validade_dias)
+    if zonas is not None:
+        logger.info(f"Usando {len(zonas)} zonas de preço salvas em {caminho}.")
+        return zonas
+
+    zonas = await detectar_zonas(cookies, escolher_amostras(urls, amostras), processar, controlador)
+    salvar_zonas(zonas, caminho)
+    return zonas
@@ -1,111 +1,202 @@
 import asyncio
 import logging
 import time
-
-import aiohttp
-from bs4 import BeautifulSoup
-from tqdm import tqdm
+from functools import partial
 
 from database import (
+    ContextoExecucao,
     close_gap,
     get_null_product_category,
     last_execution,
     log_execucao,
-    processar_dados_brutos,
-    salvar_disponibilidade,
-    salvar_preco,
-    salvar_produto,
     set_cidades,
 )
+from scraper.config.crawler_config import (
+    CACHE_ATIVO,
+    CACHE_CAMINHO,
+    CACHE_TAMANHO_MAXIMO_MB,
+    CHECKPOINT_ATIVO,
+    CHECKPOINT_CAMINHO,
+    CONCORRENCIA_CAMINHO,
+    CONCORRENCIA_INICIAL,
+    CRAWLER_LIMITE_POR_HOST,
+    CRAWLER_WORKERS,
+    LIMITE_SEM_CATEGORIA,
+    PARSER_BACKEND,
+    PARSER_EXECUTOR,
+    PARSER_WORKERS,
+    SITE_URL,
+    ZONAS_AMOSTRAS,
+    ZONAS_ATIVO,
+    ZONAS_CAMINHO,
+    ZONAS_VALIDADE_DIAS,
+)
+from scraper.checkpoint import CheckpointCrawl
 from scraper.cookies.load_cookies import load_cookie
-from scraper.network.request_async import fetch_async
+from scraper.network.cache import CacheRespostas
+from scraper.network.concurrency import ControladorAIMD
+from scraper.network.crawler import Crawler, UnidadeTrabalho
+from scraper.pipeline import PipelineGravacao
+from scraper.price_zones import ZonaPreco, obter_zonas
 from scraper.utils.categories import get_categories
+from scraper.utils.product_parser import criar_executor, extrair_site_id, parsear_pagina, resolver_backend
 from utils.data import obter_data_atual
+from utils.metricas import CRONOMETRO
 
 logger = logging.getLogger(__name__)
 
 
-def extrair_dados(soup):
-    # Nomes e links dos produtos
-    nome_link = [
-        i.find("a")
-        for i in soup.find_all(class_="h-[72px] text-ellipsis overflow-hidden cursor-pointer mt-2 text-center")
-    ]
-    nome = [nome.text.strip() for nome in nome_link if nome]
-    link = ["https://www.irmaosgoncalves.com.br" + link.get("href") for link in nome_link if link and link.get("href")]
-
-    # Preços dos produtos
-    preco = [a.text.strip() for a in soup.find_all("div", class_="text-xl text-secondary font-semibold h-7")]
-
-    return nome, preco, link
-
-
-def verificar_tamanhos(nome, preco, link):
-    if len(nome) != len(preco) != len(link):
-        msg = f"Nome={len(nome)}, Preço={len(preco)}, Link={len(link)}"
-        raise ValueError(msg)
+async def process_url(crawler, unidade, executor, backend, cache=None):
+    entrada = await asyncio.to_thread(cache.obter, unidade.url, unidade.cidade) if cache else None
+    resposta = await crawler.baixar(
+        unidade.url,
+        unidade.cookie,
+        tipo="resposta",
+        cabecalhos=CacheRespostas.cabecalhos_condicionais(entrada),
+        cidade=unidade.cidade,
+    )
+    if not resposta:
+        return [], [], unidade.cidade
+
+    # página igual à da última execução: reaproveita os cards já extraídos
+    cartoes = cache.reaproveitar(entrada, resposta) if cache else None
+    if cartoes is None:
+        if resposta.texto is None:
+            return [], [], unidade.cidade
+
+        # o parsing roda no pool para não bloquear o loop de eventos
+        loop = asyncio.get_running_loop()
+        produtos, precos, erros = await loop.run_in_executor(
+            executor, parsear_pagina, resposta.texto, unidade.categoria, backend,
+        )
+        for erro in erros:
+            logger.warning(f"Card malformado em {unidade.url} ({unidade.cidade}): {erro}")
+
+        if cache:
+            cartoes = [(nome, link, preco) for (_, nome, link, _), (_, preco) in zip(produtos, precos)]
+            await asyncio.to_thread(cache.salvar, unidade.url, unidade.cidade, resposta, cartoes)
+        return produtos, precos, unidade.cidade
+
+    # o cache guarda (nome, link, preco); o id do produto sai do link
+    produtos = [(extrair_site_id(link), nome, link, unidade.categoria) for nome, link, _ in cartoes]
+    precos = [(site_id, preco) for (site_id, _, _, _), (_, _, preco) in zip(produtos, cartoes)]
+    return produtos, precos, unidade.cidade
 
 
-async def process_url(session, url, cookies, categoria, cidade, pbar):
-    content = await fetch_async(session, url, cookies, pbar)
-    if not content:
-        return [], [], cidade
-
-    # logger.info("%s - %s", cidade, url.split("?")[0].split("/")[-1])
-    soup = BeautifulSoup(content, "html.parser")
-    nome_prod, preco, link = extrair_dados(soup)
-
-    verificar_tamanhos(nome_prod, preco, link)
-
-    produtos = [(n, l, categoria) for n, l in zip(nome_prod, link)]
-    precos = [(l, float(p.replace("R$", "").replace(".", "").replace(",", ".").strip())) for p, l in zip(preco, link)]
-
-    return produtos, precos, cidade
+async def baixar_site():
+    """Baixa os produtos e preços do dia e grava no banco.
 
+    Returns:
+        bool: True se o dia está completo no banco (inclusive quando já foi executado hoje).
 
-async def baixar_site():
+    """
     # se ja execultou hoje, nao execultar novamente
     execution = last_execution()
     if execution == obter_data_atual():
         logger.info(f"Ja executou hoje dia: {execution}")
-        return
+        return True
 
     inicio1 = time.time()
     cookies = load_cookie("requests")
     set_cidades([cidade for cidade, _ in cookies])
 
-    url_base = "https://www.irmaosgoncalves.com.br"
-    urls_folha, urls_raiz, categorias = get_categories(url_base)
+    urls_folha, urls_raiz, categorias = get_categories(SITE_URL)
     urls = urls_folha
 
-    # se tiver menos de 100 produtos sem categoria baixar os produtos sem a categoria para ir mais rapido
+    # com poucos produtos sem categoria baixar os produtos sem a categoria (raízes) para ir mais rapido
     logger.info(f"Produtos sem categoria: {len(get_null_product_category())}")
-    if len(get_null_product_category()) < 10000:
+    if len(get_null_product_category()) < LIMITE_SEM_CATEGORIA:
         urls = urls_raiz
         categorias = len(urls) * [None]
 
-    # fazer as requests de forma assíncrona
-    async with aiohttp.ClientSession() as session:
-        with tqdm(total=len(urls) * len(cookies), desc="Progresso") as pbar:
-            tasks = [
-                process_url(session, url, cookie, categoria, cidade, pbar)
-                for url, categoria in zip(urls, categorias)
-                for cidade, cookie in cookies
-            ]
-            resultados_brutos = await asyncio.gather(*tasks)
-
+    # fecha o gap antes do primeiro lote ser gravado
     close_gap()
-    dados_processados = processar_dados_brutos(resultados_brutos)
-
-    salvar_produto(dados_processados.produtos)
 
-    salvar_preco(dados_processados.precos_uniformes, dados_processados.precos_variaveis)
-
-    salvar_disponibilidade(dados_processados.disponibilidades)
-
-    log_execucao()
-
-    logger.info(f"Produtos disponives: {len(dados_processados.disponibilidades)}")
+    # conexão e mapeamentos de id compartilhados por todas as gravações da execução
+    contexto = ContextoExecucao()
+    pipeline = PipelineGravacao(contexto=contexto)
+    backend = resolver_backend(PARSER_BACKEND)
+    logger.info(f"Backend de parsing: {backend}")
+
+    cache = CacheRespostas(CACHE_CAMINHO, CACHE_TAMANHO_MAXIMO_MB * 1024 * 1024) if CACHE_ATIVO else None
+
+    # começa do limite de concorrência aprendido na última execução; todas as páginas vêm do mesmo
+    # host, então o limite não passa do semáforo por host do crawler
+    controlador = ControladorAIMD.carregar(
+        "site",
+        CONCORRENCIA_CAMINHO,
+        limite_inicial=CONCORRENCIA_INICIAL,
+        maximo=min(CRAWLER_WORKERS, CRAWLER_LIMITE_POR_HOST),
+    )
+
+    checkpoint = CheckpointCrawl(CHECKPOINT_CAMINHO) if CHECKPOINT_ATIVO else None
+
+    try:
+        with criar_executor(PARSER_WORKERS, PARSER_EXECUTOR) as executor:
+            processar = partial(process_url, executor=executor, backend=backend, cache=cache)
+
+            # sem zonas, cada cidade é a sua própria zona
+            if ZONAS_ATIVO:
+                zonas = await obter_zonas(
+                    cookies, urls, processar, ZONAS_CAMINHO, ZONAS_VALIDADE_DIAS, ZONAS_AMOSTRAS, controlador,
+                )
+            else:
+                zonas = [ZonaPreco(cidade, cookie, [cidade]) for cidade, cookie in cookies]
+            membros = {zona.representante: zona.membros for zona in zonas}
+
+            # o resultado do representante da zona vale para todas as cidades membro
+            async def enviar_pipeline(unidade, resultado):
+                produtos, precos, _ = resultado
+                for cidade in membros[unidade.cidade]:
+                    await pipeline.adicionar((produtos, precos, cidade))
+
+            async def ao_concluir(unidade, resultado):
+                # páginas vazias podem ser falhas de download, então são baixadas de novo ao retomar
+                if checkpoint and resultado[0]:
+                    await asyncio.to_thread(checkpoint.salvar, unidade, resultado)
+                await enviar_pipeline(unidade, resultado)
+
+            # retomando uma execução interrompida hoje: reenvia o que já foi baixado
+            concluidas = checkpoint.concluidas() if checkpoint else set()
+            if concluidas:
+                logger.info(f"Retomando execução: {len(concluidas)} unidades já concluídas.")
+                for unidade, resultado in checkpoint.resultados():
+                    if unidade.cidade in membros:
+                        await enviar_pipeline(unidade, resultado)
+
+            # fazer as requests de forma assíncrona, com uma fila drenada por um número fixo de workers;
+            # as unidades são geradas URL a URL para que todas as zonas de uma URL terminem próximas
+            pendentes = [
+                (url, categoria, zona)
+                for url, categoria in zip(urls, categorias)
+                for zona in zonas
+                if (url, zona.representante) not in concluidas
+            ]
+            unidades = (
+                UnidadeTrabalho(url, categoria, zona.representante, zona.cookie) for url, categoria, zona in pendentes
+            )
+            crawler = Crawler(processar, ao_concluir, controlador=controlador)
+            with CRONOMETRO.etapa("crawl"):
+                await crawler.executar(unidades, total=len(pendentes))
+    finally:
+        controlador.salvar(CONCORRENCIA_CAMINHO)
+        if cache:
+            logger.info(f"Cache de respostas: {cache.resumo()}")
+            cache.fechar()
+
+    completo = await pipeline.finalizar()
+    contexto.fechar()
+
+    # dia incompleto no banco: não registra a execução e mantém o checkpoint para a retomada
+    if completo:
+        log_execucao()
+        if checkpoint:
+            checkpoint.limpar()
+    else:
+        logger.error("Gravação do dia incompleta; execute novamente para retomar.")
+    if checkpoint:
+        checkpoint.fechar()
 
     fim1 = time.time()
     logger.info(f"Tempo de execução dos total: {(fim1 - inicio1) / 60:.2f} minutos.")
+    return completo
@@ -0,0 +1,289 @@
+import importlib.util
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+URL_SITE = "https://www.irmaosgoncalves.com.br"
+CLASSE_NOME = "h-[72px] text-ellipsis overflow-hidden cursor-pointer mt-2 text-center"
+CLASSE_PRECO = "text-xl text-secondary font-semibold h-7"
+
+# O link do produto termina com o id numérico dele no site (ex: /produto/arroz-tipo-1-5kg-12345)
+PADRAO_SITE_ID = re.compile(r"-(\d+)$")
+
+# Backends em ordem de preferência (do mais rápido para o mais lento)
+BACKENDS = ("selectolax", "lxml", "html.parser")
+
+# Tamanho dos pedaços entregues aos parsers de streaming
+TAMANHO_PEDACO = 64 * 1024
+
+
+class Cartao(NamedTuple):
+    """Card de produto extraído da listagem; `erro` é preenchido quando o card está malformado."""
+
+    posicao: int
+    nome: str | None
+    link: str | None
+    preco: int | None  # centavos
+    erro: str | None = None
+
+
+def backend_disponivel(backend):
+    """Verifica se a biblioteca do backend de parsing está instalada."""
+    if backend == "html.parser":
+        return True
+    if backend in ("selectolax", "lxml"):
+        return importlib.util.find_spec(backend) is not None
+    return False
+
+
+def resolver_backend(backend=None):
+    """Retorna o backend solicitado ou, se indisponível, o mais rápido instalado.
+
+    Args:
+        backend: Nome do backend ("selectolax", "lxml" ou "html.parser"). None escolhe o mais rápido.
+
+    """
+    if backend and backend_disponivel(backend):
+        return backend
+    escolhido = next(b for b in BACKENDS if backend_disponivel(b))
+    if backend:
+        logger.warning(f"Backend de parsing '{backend}' indisponível, usando '{escolhido}'.")
+    return escolhido
+
+
+def extrair_site_id(link):
+    """Extrai o id numérico do produto no site a partir do link, ou None se não houver."""
+    match = PADRAO_SITE_ID.search(link) if link else None
+    return int(match.group(1)) if match else None
+
+
+def converter_preco(texto):
+    """Converte um preço no formato "R$ 1.234,56" para centavos (123456), sem passar por float."""
+    inteiro, _, centavos = texto.replace("R$", "").replace(".", "").strip().partition(",")
+    if not inteiro.isdigit() or (centavos and not centavos.isdigit()) or len(centavos) > 2:
+        raise ValueError(f"preço inválido: {texto!r}")
+    return int(inteiro) * 100 + int(centavos.ljust(2, "0"))
+
+
+class MontadorCartoes:
+    """Monta cards a partir da sequência de blocos de nome e de preço, na ordem do documento.
+
+    Um bloco de nome abre um card e o próximo bloco de preço o completa. Um nome seguido de
+    outro nome, ou um preço sem nome antes, gera um card com `erro` em vez de desalinhar os
+    cards seguintes.
+    """
+
+    def __init__(self):
+        self.prontos = []
+        self._pendente = None
+        self._posicao = 0
+
+    def _emitir(self, nome, href, preco_texto, erro=None):
+        link = URL_SITE + href if href else None
+        preco = None
+        if erro is None and not href:
+            erro = "card sem link"
+        if erro is None and not nome:
+            erro = "card sem nome"
+        if erro is None:
+            try:
+                preco = converter_preco(preco_texto)
+            except ValueError:
+                erro = f"preço inválido: {preco_texto!r}"
+        self.prontos.append(Cartao(self._posicao, nome, link, preco, erro))
+        self._posicao += 1
+
+    def nome(self, nome, href):
+        if self._pendente is not None:
+            self._emitir(*self._pendente, None, erro="card sem preço")
+        self._pendente = (nome, href)
+
+    def preco(self, texto):
+        if self._pendente is None:
+            self._emitir(None, None, texto, erro="preço sem card")
+            return
+        nome, href = self._pendente
+        self._pendente = None
+        self._emitir(nome, href, texto)
+
+    def fechar(self):
+        if self._pendente is not None:
+            self._emitir(*self._pendente, None, erro="card sem preço")
+            self._pendente = None
+
+    def retirar(self):
+        prontos, self.prontos = self.prontos, []
+        return prontos
+
+
+class AlvoCartoes:
+    """Alvo de parsing em streaming (interface start/end/data/close do lxml).
+
+    Acompanha apenas os blocos de nome e de preço de cada card, sem construir a árvore.
+    """
+
+    def __init__(self):
+        self.montador = MontadorCartoes()
+        self._bloco = None
+        self._tag_bloco = None
+        self._profundidade = 0
+        self._dentro_link = False
+        self._href = None
+        self._texto = []
+
+    def start(self, tag, attrs):
+        if self._bloco is None:
+            classe = attrs.get("class")
+            if classe == CLASSE_NOME:
+                self._bloco = "nome"
+            elif classe == CLASSE_PRECO and tag == "div":
+                self._bloco = "preco"
+            else:
+                return
+            self._tag_bloco = tag
+            self._profundidade = 1
+            self._href = None
+            self._texto = []
+            return
+
+        if tag == self._tag_bloco:
+            self._profundidade += 1
+        if self._bloco == "nome" and tag == "a" and self._href is None:
+            self._dentro_link = True
+            self._href = attrs.get("href") or ""
+
+    def end(self, tag):
+        if self._bloco is None:
+            return
+        if tag == "a":
+            self._dentro_link = False
+        if tag != self._tag_bloco:
+            return
+        self._profundidade -= 1
+        if self._profundidade:
+            return
+
+        texto = "".join(self._texto).strip()
+        if self._bloco == "nome":
+            self.montador.nome(texto or None, self._href)
+        else:
+            self.montador.preco(texto)
+        self._bloco = None
+
+    def data(self, texto):
+        if self._bloco == "preco" or (self._bloco == "nome" and self._dentro_link):
+            self._texto.append(texto)
+
+    def close(self):
+        self.montador.fechar()
+
+
+class _ParserPadrao(HTMLParser):
+    """Adapta o `html.parser` da biblioteca padrão para o `AlvoCartoes`."""
+
+    def __init__(self, alvo):
+        super().__init__(convert_charrefs=True)
+        self.alvo = alvo
+
+    def handle_starttag(self, tag, attrs):
+        self.alvo.start(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self.alvo.end(tag)
+
+    def handle_data(self, data):
+        self.alvo.data(data)
+
+
+def _cartoes_streaming(html, backend):
+    alvo = AlvoCartoes()
+    if backend == "lxml":
+        from lxml import etree
+
+        parser = etree.HTMLParser(target=alvo)
+    else:
+        parser = _ParserPadrao(alvo)
+
+    for inicio in range(0, len(html), TAMANHO_PEDACO):
+        parser.feed(html[inicio : inicio + TAMANHO_PEDACO])
+        yield from alvo.montador.retirar()
+    parser.close()
+    if backend != "lxml":
+        alvo.close()
+    yield from alvo.montador.retirar()
+
+
+def _cartoes_selectolax(html):
+    from selectolax.lexbor import LexborHTMLParser
+
+    montador = MontadorCartoes()
+    tree = LexborHTMLParser(html)
+    # um único seletor percorre os blocos de nome e de preço na ordem do documento
+    for node in tree.css(f'[class="{CLASSE_NOME}"], div[class="{CLASSE_PRECO}"]'):
+        if node.attributes.get("class") == CLASSE_NOME:
+            link = node.css_first("a")
+            nome = link.text().strip() if link else ""
+            montador.nome(nome or None, link.attributes.get("href") if link else None)
+        else:
+            montador.preco(node.text().strip())
+        yield from montador.retirar()
+    montador.fechar()
+    yield from montador.retirar()
+
+
+def iterar_cartoes(html, backend="html.parser"):
+    """Percorre os cards de produto da página uma única vez, na ordem do documento.
+
+    Yields:
+        Cartao: Um por card, com `erro` preenchido quando o card está malformado.
+
+    """
+    if backend == "selectolax":
+        return _cartoes_selectolax(html)
+    return _cartoes_streaming(html, backend)
+
+
+def parsear_pagina(html, categoria, backend="html.parser"):
+    """Faz o parsing de uma página de listagem e retorna tuplas compactas.
+
+    Executada nos workers do pool de parsing, por isso recebe e devolve apenas
+    tipos simples. Cards malformados são descartados individualmente e descritos em `erros`.
+
+    Returns:
+        tuple: (produtos, precos, erros) com produtos = [(site_id, nome, link, categoria)],
+            precos = [(site_id, preco em centavos)] e erros = [descrição de cada card malformado]
+
+    """
+    produtos = []
+    precos = []
+    erros = []
+    for cartao in iterar_cartoes(html, backend):
+        site_id = extrair_site_id(cartao.link)
+        erro = cartao.erro or (None if site_id is not None else "link sem id do produto")
+        if erro:
+            erros.append(f"card {cartao.posicao}: {erro} ({cartao.nome!r}, {cartao.link!r})")
+            continue
+        produtos.append((site_id, cartao.nome, cartao.link, categoria))
+        precos.append((site_id, cartao.preco))
+
+    return produtos, precos, erros
+
+
+def criar_executor(num_workers=None, tipo="processos"):
+    """Cria o pool usado para o parsing das páginas fora do loop de eventos.
+
+    Args:
+        num_workers: Quantidade de workers. None usa a quantidade de CPUs.
+        tipo: "processos" (padrão, usa todos os núcleos) ou "threads" (útil apenas
+            com backends que liberam o GIL durante o parsing).
+
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    if tipo == "threads":
+        return ThreadPoolExecutor(max_workers=num_workers)
+    return ProcessPoolExecutor(max_workers=num_workers)
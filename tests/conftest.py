@@ -0,0 +1,62 @@
+"""Configuração dos testes: banco descartável e data de execução controlada.
+
+O pacote `database` escolhe o banco pela variável DATABASE_URL na importação, então ela é
+definida aqui antes de qualquer import do projeto: um SQLite temporário ou, para rodar os
+testes no PostgreSQL, o banco indicado em TESTE_DATABASE_URL (todas as tabelas são apagadas).
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+DIRETORIO_TESTES = Path(tempfile.mkdtemp(prefix="testes_produtos_"))
+
+os.environ["DATABASE_URL"] = os.environ.get("TESTE_DATABASE_URL", f"sqlite:///{DIRETORIO_TESTES / 'testes.db'}")
+os.environ.setdefault("PROJECT_URL", "https://teste.supabase.co")
+os.environ.setdefault("API_KEY_SECRET", "eyJhbGciOiJIUzI1NiJ9.e30.teste")
+
+import database  # noqa: E402
+from utils import data as modulo_data  # noqa: E402
+
+database.aplicar_migracoes()
+
+DIA_INICIAL = date(2026, 1, 1)
+
+
+class Relogio:
+    """Data devolvida por `obter_data_atual` em todos os módulos do projeto durante um teste."""
+
+    def __init__(self, monkeypatch, hoje):
+        self.hoje = hoje
+        original = modulo_data.obter_data_atual
+        for nome, modulo in list(sys.modules.items()):
+            if nome.split(".")[0] not in {"database", "scraper", "utils"}:
+                continue
+            if getattr(modulo, "obter_data_atual", None) is original:
+                monkeypatch.setattr(modulo, "obter_data_atual", lambda: self.hoje)
+
+
+def limpar_banco(engine):
+    """Apaga as linhas de todas as tabelas do modelo, reiniciando os ids (a cidade 1 é "Sem Cidade")."""
+    tabelas = [tabela.name for tabela in database.Base.metadata.sorted_tables if tabela.name != "migracoes_aplicadas"]
+    with engine.begin() as conexao:
+        if engine.dialect.name == "postgresql":
+            conexao.exec_driver_sql(f"TRUNCATE {', '.join(tabelas)} RESTART IDENTITY CASCADE")
+        else:
+            for tabela in reversed(tabelas):
+                conexao.exec_driver_sql(f"DELETE FROM {tabela}")
+
+
+@pytest.fixture
+def banco():
+    limpar_banco(database.ENGINE)
+    return database
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    return Relogio(monkeypatch, DIA_INICIAL)
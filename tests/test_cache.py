@@ -0,0 +1,143 @@
+import asyncio
+import itertools
+import random
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from test_product_parser import LISTAGEM
+
+from scraper import site_downloader
+from scraper.network import cache as modulo_cache
+from scraper.network.cache import CacheRespostas
+from scraper.network.crawler import UnidadeTrabalho
+from scraper.network.request_async import RespostaHttp
+from scraper.utils.product_parser import URL_SITE, resolver_backend
+
+URL = "https://loja/categoria/mercearia"
+CARTOES = [["Arroz", URL_SITE + "/produto/arroz-101", 2590], ["Leite", URL_SITE + "/produto/leite-107", 450]]
+
+
+def pagina(*cartoes):
+    return "<main>" + "".join(f'<a href="{link}">{nome}</a> {preco}' for nome, link, preco in cartoes) + "</main>"
+
+
+@pytest.fixture
+def relogio_cache(monkeypatch):
+    """Instantes de acesso estritamente crescentes, para a ordem LRU não depender da resolução do relógio."""
+    instantes = itertools.count(1)
+    monkeypatch.setattr(modulo_cache, "time", SimpleNamespace(time=lambda: next(instantes)))
+
+
+def test_304_reaproveita_os_cards_com_cabecalhos_condicionais(tmp_path):
+    with CacheRespostas(tmp_path / "cache.db", 10**6) as cache:
+        assert cache.obter(URL, "Cidade A") is None
+        assert CacheRespostas.cabecalhos_condicionais(None) is None
+
+        resposta = RespostaHttp(200, pagina(*CARTOES), '"v1"', "Thu, 01 Jan 2026 00:00:00 GMT")
+        cache.salvar(URL, "Cidade A", resposta, CARTOES)
+        entrada = cache.obter(URL, "Cidade A")
+        assert CacheRespostas.cabecalhos_condicionais(entrada) == {
+            "If-None-Match": '"v1"',
+            "If-Modified-Since": "Thu, 01 Jan 2026 00:00:00 GMT",
+        }
+        # a entrada é por (url, cidade): outra cidade não reaproveita
+        assert cache.obter(URL, "Cidade B") is None
+
+        assert cache.reaproveitar(entrada, RespostaHttp(304, None, None, None)) == CARTOES
+        assert (cache.acertos, cache.faltas) == (1, 0)
+
+
+def test_conteudo_diferente_nao_reaproveita(tmp_path):
+    with CacheRespostas(tmp_path / "cache.db", 10**6) as cache:
+        cache.salvar(URL, "Cidade A", RespostaHttp(200, pagina(*CARTOES), None, None), CARTOES)
+        entrada = cache.obter(URL, "Cidade A")
+        assert CacheRespostas.cabecalhos_condicionais(entrada) is None
+
+        alterada = RespostaHttp(200, pagina(CARTOES[0]), None, None)
+        assert cache.reaproveitar(entrada, alterada) is None
+        assert cache.reaproveitar(None, RespostaHttp(200, pagina(*CARTOES), None, None)) is None
+        assert (cache.acertos, cache.faltas) == (0, 2)
+
+
+class CrawlerFixo:
+    """Crawler que devolve sempre a resposta configurada."""
+
+    resposta = None
+
+    async def baixar(self, url, cookie, tipo=None, cabecalhos=None, cidade=None):
+        return self.resposta
+
+
+def test_mesmo_hash_pula_o_parsing(tmp_path, monkeypatch):
+    parseadas = []
+    parsear_original = site_downloader.parsear_pagina
+
+    def parsear_contando(html, categoria, backend):
+        parseadas.append(html)
+        return parsear_original(html, categoria, backend)
+
+    monkeypatch.setattr(site_downloader, "parsear_pagina", parsear_contando)
+    backend = resolver_backend()
+    crawler = CrawlerFixo()
+    unidade = UnidadeTrabalho(URL, "mercearia", "Cidade A", {})
+
+    def processar(cache):
+        return asyncio.run(site_downloader.process_url(crawler, unidade, None, backend, cache))
+
+    with CacheRespostas(tmp_path / "cache.db", 10**6) as cache:
+        crawler.resposta = RespostaHttp(200, LISTAGEM, None, None)
+        primeira = processar(cache)
+        assert len(parseadas) == 1
+        assert primeira[0]
+
+        # mesma página, sem ETag: o hash bate e os cards saem do cache
+        segunda = processar(cache)
+        assert len(parseadas) == 1
+        assert segunda == primeira
+        assert (cache.acertos, cache.faltas) == (1, 1)
+
+        crawler.resposta = RespostaHttp(200, LISTAGEM.replace("R$ 4,50", "R$ 4,90"), None, None)
+        terceira = processar(cache)
+        assert len(parseadas) == 2
+        assert dict(terceira[1]) == {**dict(primeira[1]), 107: 490}
+
+
+def test_remove_as_menos_acessadas_ate_90_por_cento(tmp_path, relogio_cache):
+    sorteio = random.Random(5)
+    caminho = tmp_path / "cache.db"
+    with CacheRespostas(caminho, 10**7) as cache:
+        for indice in range(10):
+            # texto aleatório: o tamanho comprimido fica próximo do original
+            texto = "".join(sorteio.choice("abcdefghij") for _ in range(2000))
+            cache.salvar(f"{URL}?page={indice}", "Cidade A", RespostaHttp(200, texto, None, None), CARTOES)
+        # as duas primeiras páginas passam a ser as acessadas mais recentemente
+        cache.obter(f"{URL}?page=0", "Cidade A")
+        cache.obter(f"{URL}?page=1", "Cidade A")
+        tamanhos = dict(sqlite3.connect(caminho).execute("SELECT url, tamanho FROM respostas").fetchall())
+
+    ordem_lru = [f"{URL}?page={indice}" for indice in [*range(2, 10), 0, 1]]
+    limite = sum(tamanhos.values())
+    with CacheRespostas(caminho, limite) as cache:
+        nova = RespostaHttp(200, "".join(sorteio.choice("abcdefghij") for _ in range(2000)), None, None)
+        cache.salvar(f"{URL}?page=10", "Cidade A", nova, CARTOES)
+        restantes = dict(sqlite3.connect(caminho).execute("SELECT url, tamanho FROM respostas").fetchall())
+
+        total = sum(tamanhos.values()) + restantes[f"{URL}?page=10"]
+        esperadas = set(ordem_lru)
+        for url in ordem_lru:
+            if total <= limite * 0.9:
+                break
+            esperadas.discard(url)
+            total -= tamanhos[url]
+        assert set(restantes) == esperadas | {f"{URL}?page=10"}
+        assert {f"{URL}?page=0", f"{URL}?page=1"} <= set(restantes)
+        assert cache.removidas == len(ordem_lru) - len(esperadas) > 0
+        assert sum(restantes.values()) == total <= limite * 0.9
+        assert f"{total / 1024 / 1024:.1f} MB" in cache.resumo()
+
+    # regravar uma página já em cache substitui o tamanho anterior em vez de somar
+    with CacheRespostas(caminho, limite) as cache:
+        for _ in range(3):
+            cache.salvar(f"{URL}?page=10", "Cidade A", nova, CARTOES)
+        assert cache.removidas == 0
@@ -0,0 +1,167 @@
+import asyncio
+from collections import Counter
+from datetime import timedelta
+
+import pytest
+from conftest import DIA_INICIAL
+
+from scraper import checkpoint as modulo_checkpoint
+from scraper import site_downloader
+from scraper.checkpoint import CheckpointCrawl
+from scraper.network.crawler import UnidadeTrabalho
+from scraper.price_zones import ZonaPreco
+
+URLS = [f"https://loja/categoria/{indice}" for indice in range(6)]
+# a zona de "Cidade A" vale também para "Cidade C"
+ZONAS = [ZonaPreco("Cidade A", {}, ["Cidade A", "Cidade C"]), ZonaPreco("Cidade B", {}, ["Cidade B"])]
+REPRESENTANTES = {membro: zona.representante for zona in ZONAS for membro in zona.membros}
+
+
+def resultado_da_pagina(url, cidade):
+    """Resultado (produtos, precos, cidade) determinístico por unidade; o id do produto identifica a URL."""
+    site_id = URLS.index(url) * 10 + ord(cidade[-1]) - ord("A")
+    produtos = [(site_id, f"Produto {site_id}", f"https://loja/produto-{site_id}", None)]
+    return produtos, [(site_id, 100 + site_id)], cidade
+
+
+def test_retoma_no_mesmo_dia(tmp_path, relogio):
+    caminho = tmp_path / "checkpoint.db"
+    unidade = UnidadeTrabalho(URLS[0], "mercearia", "Cidade A", {"sessao": "x"})
+    with CheckpointCrawl(caminho) as checkpoint:
+        checkpoint.salvar(unidade, resultado_da_pagina(URLS[0], "Cidade A"))
+
+    with CheckpointCrawl(caminho) as checkpoint:
+        assert checkpoint.concluidas() == {(URLS[0], "Cidade A")}
+        # o resultado volta com tuplas, como saiu do parsing, e a unidade sem o cookie
+        assert list(checkpoint.resultados()) == [
+            (unidade._replace(cookie=None), resultado_da_pagina(URLS[0], "Cidade A")),
+        ]
+        checkpoint.limpar()
+        assert checkpoint.concluidas() == set()
+
+
+def test_descarta_checkpoint_de_outro_dia(tmp_path, relogio):
+    caminho = tmp_path / "checkpoint.db"
+    with CheckpointCrawl(caminho) as checkpoint:
+        checkpoint.salvar(UnidadeTrabalho(URLS[0], None, "Cidade A", {}), resultado_da_pagina(URLS[0], "Cidade A"))
+
+    relogio.hoje = DIA_INICIAL + timedelta(days=1)
+    with CheckpointCrawl(caminho) as checkpoint:
+        assert checkpoint.concluidas() == set()
+        assert list(checkpoint.resultados()) == []
+
+    # nem volta a valer no dia original
+    relogio.hoje = DIA_INICIAL
+    with CheckpointCrawl(caminho) as checkpoint:
+        assert checkpoint.concluidas() == set()
+
+
+def test_descarta_checkpoint_de_outro_formato(tmp_path, relogio, monkeypatch):
+    caminho = tmp_path / "checkpoint.db"
+    with CheckpointCrawl(caminho) as checkpoint:
+        checkpoint.salvar(UnidadeTrabalho(URLS[0], None, "Cidade A", {}), resultado_da_pagina(URLS[0], "Cidade A"))
+
+    monkeypatch.setattr(modulo_checkpoint, "VERSAO_FORMATO", "3")
+    with CheckpointCrawl(caminho) as checkpoint:
+        assert checkpoint.concluidas() == set()
+
+
+class Interrompido(Exception):
+    """Simula a morte do processo no meio do crawl."""
+
+
+class PipelineFalso:
+    """Registra o que chega ao pipeline; pode interromper a execução depois de `interromper_apos` resultados."""
+
+    def __init__(self, interromper_apos=None):
+        self.recebidos = []
+        self.interromper_apos = interromper_apos
+
+    async def adicionar(self, resultado):
+        if self.interromper_apos is not None and len(self.recebidos) >= self.interromper_apos:
+            raise Interrompido
+        self.recebidos.append(resultado)
+
+    async def finalizar(self):
+        return True
+
+
+class ContextoFalso:
+    def fechar(self):
+        pass
+
+
+@pytest.fixture
+def execucao(tmp_path, relogio, monkeypatch):
+    """Prepara `baixar_site` para rodar sem rede nem banco; retorna o registro das execuções."""
+    registro = {"baixadas": [], "execucoes_registradas": 0, "pipeline": None, "falhas": set()}
+
+    async def process_url(crawler, unidade, executor, backend, cache=None):
+        registro["baixadas"].append((unidade.url, unidade.cidade))
+        if (unidade.url, unidade.cidade) in registro["falhas"]:
+            return [], [], unidade.cidade
+        return resultado_da_pagina(unidade.url, unidade.cidade)
+
+    async def obter_zonas(*args):
+        return ZONAS
+
+    def log_execucao():
+        registro["execucoes_registradas"] += 1
+
+    for nome, valor in {
+        "last_execution": lambda: None,
+        "load_cookie": lambda tipo: [("Cidade A", {}), ("Cidade B", {}), ("Cidade C", {})],
+        "set_cidades": lambda cidades: None,
+        "get_categories": lambda url: (URLS, URLS, [None] * len(URLS)),
+        "get_null_product_category": lambda: [],
+        "close_gap": lambda: None,
+        "log_execucao": log_execucao,
+        "ContextoExecucao": ContextoFalso,
+        "PipelineGravacao": lambda contexto: registro["pipeline"],
+        "process_url": process_url,
+        "obter_zonas": obter_zonas,
+        "CACHE_ATIVO": False,
+        "ZONAS_ATIVO": True,
+        "CHECKPOINT_ATIVO": True,
+        "CHECKPOINT_CAMINHO": tmp_path / "checkpoint.db",
+        "CONCORRENCIA_CAMINHO": tmp_path / "concorrencia.json",
+        "PARSER_EXECUTOR": "threads",
+        "PARSER_WORKERS": 1,
+    }.items():
+        monkeypatch.setattr(site_downloader, nome, valor)
+    return registro
+
+
+def recebidos_por_unidade(pipeline):
+    return Counter((produtos[0][0] // 10, cidade) for produtos, _, cidade in pipeline.recebidos)
+
+
+def test_retomada_reenvia_os_resultados_salvos_uma_vez(tmp_path, execucao):
+    # primeira execução: uma página falha (resultado vazio) e o processo morre no meio do crawl
+    execucao["falhas"] = {(URLS[0], "Cidade B")}
+    execucao["pipeline"] = PipelineFalso(interromper_apos=10)
+    with pytest.raises(Interrompido):
+        asyncio.run(site_downloader.baixar_site())
+    assert execucao["execucoes_registradas"] == 0
+    with CheckpointCrawl(tmp_path / "checkpoint.db") as checkpoint:
+        salvas = checkpoint.concluidas()
+    assert salvas and (URLS[0], "Cidade B") not in salvas
+
+    # retomada: baixa só o que falta e o pipeline novo recebe cada unidade uma única vez
+    execucao["falhas"] = set()
+    execucao["baixadas"] = []
+    execucao["pipeline"] = PipelineFalso()
+    assert asyncio.run(site_downloader.baixar_site())
+
+    todas = {(url, zona.representante) for url in URLS for zona in ZONAS}
+    assert sorted(execucao["baixadas"]) == sorted(todas - salvas)
+    assert recebidos_por_unidade(execucao["pipeline"]) == Counter(
+        (indice, cidade) for indice in range(len(URLS)) for cidade in REPRESENTANTES
+    )
+    for produtos, precos, cidade in execucao["pipeline"].recebidos:
+        assert (produtos, precos) == resultado_da_pagina(URLS[produtos[0][0] // 10], REPRESENTANTES[cidade])[:2]
+
+    # dia completo: registra a execução e limpa o checkpoint
+    assert execucao["execucoes_registradas"] == 1
+    with CheckpointCrawl(tmp_path / "checkpoint.db") as checkpoint:
+        assert checkpoint.concluidas() == set()
@@ -0,0 +1,27 @@
+import asyncio
+
+from scraper.network.concurrency import ControladorAIMD
+
+
+def test_aumento_do_limite_libera_quem_espera():
+    async def executar():
+        controlador = ControladorAIMD("teste", limite_inicial=1)
+        liberado = asyncio.Event()
+
+        async def esperar_vaga():
+            async with controlador:
+                liberado.set()
+
+        async with controlador:
+            espera = asyncio.create_task(esperar_vaga())
+            await asyncio.sleep(0)
+            assert not liberado.is_set()
+
+            # uma resposta com o limite em 1 já o leva a 2: a vaga abre sem ninguém sair
+            controlador.registrar(200, 0.1)
+            assert controlador._notificacoes
+            await asyncio.wait_for(liberado.wait(), timeout=1)
+            await espera
+        assert not controlador._notificacoes
+
+    asyncio.run(executar())
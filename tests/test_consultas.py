@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+import pytest
+from conftest import DIA_INICIAL
+from sqlalchemy import select
+
+from database import (
+    Cidade,
+    HistoricoPreco,
+    ProdutoInfo,
+    Session,
+    preco_em,
+    precos_em,
+    precos_no_periodo,
+    salvar_produto,
+    set_cidades,
+)
+
+UNIFORME = 1
+DIAS = [DIA_INICIAL + timedelta(days=dia) for dia in range(12)]
+
+
+def dia(numero):
+    return DIA_INICIAL + timedelta(days=numero)
+
+
+@pytest.fixture
+def historico(banco):
+    """Histórico SCD2 com lacunas, registros abertos e trocas entre preço uniforme e por cidade."""
+    set_cidades(["Cidade A", "Cidade B"])
+    ids = salvar_produto(
+        [ProdutoInfo(site_id, f"Produto {site_id}", f"https://loja/produto-{site_id}", None) for site_id in (1, 2, 3)],
+    )
+    with Session() as session:
+        cidades = dict(session.execute(select(Cidade.nome, Cidade.id)).all())
+    a, b = cidades["Cidade A"], cidades["Cidade B"]
+    registros = [
+        # só da cidade A: lacuna nos dias 4 e 5 e registro aberto no fim
+        (ids[1], a, 100, 1, 3),
+        (ids[1], a, 120, 6, 8),
+        (ids[1], a, 130, 9, None),
+        # uniforme, depois por cidade, depois uniforme de novo (aberto)
+        (ids[2], UNIFORME, 200, 0, 4),
+        (ids[2], a, 210, 5, 7),
+        (ids[2], b, 215, 5, 6),
+        (ids[2], UNIFORME, 220, 8, None),
+        # uniforme aberto com um preço da cidade A no meio: o uniforme é cortado em dois trechos
+        (ids[3], UNIFORME, 300, 2, None),
+        (ids[3], a, 310, 4, 5),
+        (ids[3], a, 320, 7, 7),
+    ]
+    with Session() as session:
+        session.add_all(
+            HistoricoPreco(
+                produto_id=produto_id,
+                cidade_id=cidade_id,
+                preco=preco,
+                data_inicio=dia(inicio),
+                data_fim=None if fim is None else dia(fim),
+            )
+            for produto_id, cidade_id, preco, inicio, fim in registros
+        )
+        session.commit()
+    return sorted(ids.values()), [UNIFORME, a, b]
+
+
+def preco_por_varredura(produto_id, cidade_id, data):
+    """Preço na data lendo todo o histórico: o da cidade, ou o uniforme na falta dele."""
+    with Session() as session:
+        registros = session.execute(
+            select(HistoricoPreco.cidade_id, HistoricoPreco.preco).where(
+                HistoricoPreco.produto_id == produto_id,
+                HistoricoPreco.cidade_id.in_([cidade_id, UNIFORME]),
+                HistoricoPreco.data_inicio <= data,
+                (HistoricoPreco.data_fim.is_(None)) | (HistoricoPreco.data_fim >= data),
+            ),
+        ).all()
+    precos = dict(registros)
+    return precos.get(cidade_id, precos.get(UNIFORME))
+
+
+def test_preco_em_igual_a_varredura(historico):
+    produtos, cidades = historico
+    for cidade_id in cidades:
+        for data in DIAS:
+            esperado = {produto_id: preco_por_varredura(produto_id, cidade_id, data) for produto_id in produtos}
+            assert precos_em(produtos, cidade_id, data) == {p: preco for p, preco in esperado.items() if preco}
+            for produto_id in produtos:
+                assert preco_em(produto_id, cidade_id, data) == esperado[produto_id]
+
+
+def test_precos_no_periodo_igual_a_varredura(historico):
+    produtos, cidades = historico
+    for produto_id in produtos:
+        for cidade_id in cidades:
+            diarios = {data: preco_por_varredura(produto_id, cidade_id, data) for data in DIAS}
+            for i, inicio in enumerate(DIAS):
+                for fim in DIAS[i:]:
+                    trechos = precos_no_periodo(produto_id, cidade_id, inicio, fim)
+                    # trechos em ordem, sem sobreposição e dentro do período
+                    assert all(de <= ate for de, ate, _ in trechos)
+                    assert all(ate < proximo for (_, ate, _), (proximo, _, _) in zip(trechos, trechos[1:]))
+                    assert all(inicio <= de and ate <= fim for de, ate, _ in trechos)
+
+                    cobertos = {
+                        de + timedelta(days=d): preco for de, ate, preco in trechos for d in range((ate - de).days + 1)
+                    }
+                    esperado = {data: preco for data, preco in diarios.items() if inicio <= data <= fim and preco}
+                    assert cobertos == esperado, (produto_id, cidade_id, inicio, fim)
+
+
+def test_precos_no_periodo_nas_bordas(historico):
+    produtos, cidades = historico
+    _, a, _ = cidades
+    # começa e termina exatamente nas bordas dos registros, com a lacuna entre eles
+    assert precos_no_periodo(produtos[0], a, dia(3), dia(6)) == [(dia(3), dia(3), 100), (dia(6), dia(6), 120)]
+    # o uniforme preenche antes, entre e depois dos preços da cidade
+    assert precos_no_periodo(produtos[2], a, dia(0), dia(9)) == [
+        (dia(2), dia(3), 300),
+        (dia(4), dia(5), 310),
+        (dia(6), dia(6), 300),
+        (dia(7), dia(7), 320),
+        (dia(8), dia(9), 300),
+    ]
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+from scraper.network.crawler import Crawler, UnidadeTrabalho
+from scraper.network.retry import Disjuntor
+
+
+async def iniciar_servidor(rotas):
+    app = web.Application()
+    for caminho, tratador in rotas.items():
+        app.router.add_get(caminho, tratador)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    porta = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{porta}"
+
+
+async def baixar_unidade(crawler, unidade):
+    return await crawler.baixar(unidade.url, unidade.cookie, cidade=unidade.cidade)
+
+
+def executar_crawl(rotas, caminhos, preparar=None, **kwargs):
+    """Roda o crawler contra um servidor local; retorna (caminho, cidade, conteúdo, instante) por conclusão."""
+
+    async def executar():
+        runner, base = await iniciar_servidor(rotas)
+        inicio = time.monotonic()
+        concluidas = []
+
+        async def ao_concluir(unidade, resultado):
+            concluidas.append((unidade.url[len(base) :], unidade.cidade, resultado, time.monotonic() - inicio))
+
+        try:
+            crawler = Crawler(baixar_unidade, ao_concluir, **kwargs)
+            if preparar:
+                preparar(crawler)
+            unidades = [UnidadeTrabalho(base + caminho, None, cidade, {}) for caminho, cidade in caminhos]
+            await crawler.executar(unidades, total=len(unidades))
+        finally:
+            await runner.cleanup()
+        return concluidas
+
+    return asyncio.run(executar())
+
+
+def test_espera_entre_tentativas_libera_a_vaga_do_host():
+    tentativas = {"lenta": 0}
+
+    async def lenta(request):
+        tentativas["lenta"] += 1
+        if tentativas["lenta"] == 1:
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.Response(text="lenta")
+
+    async def rapida(request):
+        return web.Response(text="rapida")
+
+    concluidas = executar_crawl(
+        {"/lenta": lenta, "/rapida": rapida},
+        [("/lenta", "Cidade A"), ("/rapida", "Cidade B")],
+        num_workers=2,
+        limite_por_host=1,
+    )
+
+    instantes = {caminho: instante for caminho, _, _, instante in concluidas}
+    # com a vaga presa durante o Retry-After, a rápida só sairia depois da lenta
+    assert instantes["/rapida"] < 0.5 < instantes["/lenta"]
+    assert [resultado for *_, resultado, _ in sorted(concluidas)] == ["lenta", "rapida"]
+
+
+def test_disjuntor_aberto_estaciona_a_unidade_sem_prender_o_worker():
+    tentativas = {"instavel": 0}
+
+    async def instavel(request):
+        tentativas["instavel"] += 1
+        if tentativas["instavel"] == 1:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return web.Response(text="instavel")
+
+    async def estavel(request):
+        return web.Response(text="estavel")
+
+    def disjuntor_sensivel(crawler):
+        crawler.disjuntores["Cidade A"] = Disjuntor("Cidade A", limite_falhas=1, tempo_aberto=0.5)
+
+    concluidas = executar_crawl(
+        {"/instavel": instavel, "/estavel": estavel},
+        [("/instavel", "Cidade A")] + [("/estavel", "Cidade B")] * 3,
+        preparar=disjuntor_sensivel,
+        num_workers=1,
+    )
+
+    # com um único worker, as unidades da Cidade B saem enquanto a da A espera o disjuntor fechar
+    assert [(caminho, resultado) for caminho, _, resultado, _ in concluidas] == [
+        ("/estavel", "estavel"),
+        ("/estavel", "estavel"),
+        ("/estavel", "estavel"),
+        ("/instavel", "instavel"),
+    ]
+    assert tentativas["instavel"] == 2
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+import pytest
+from conftest import DIA_INICIAL
+from sqlalchemy import select
+
+from database import HistoricoPreco, Session, processar_dados_brutos, salvar_preco, salvar_produto, set_cidades
+from database import exportacao
+from database.exportacao import ESQUEMAS, exportar, ler_exportacao
+
+
+def dia(numero):
+    return DIA_INICIAL + timedelta(days=numero)
+
+
+def gravar_dia(precos):
+    """Grava o crawl do dia com os preços (uniformes) de cada produto."""
+    produtos = [(p, f"Produto {p}", f"https://loja/produto-{p}", None) for p in precos]
+    dados = processar_dados_brutos([(produtos, list(precos.items()), "Cidade A")])
+    salvar_produto(dados.produtos)
+    salvar_preco(dados.precos_uniformes, dados.precos_variaveis)
+
+
+def arquivos(destino):
+    return {caminho.relative_to(destino).as_posix(): caminho.stat().st_mtime_ns for caminho in destino.rglob("*.*")}
+
+
+def historico_no_banco():
+    colunas = [HistoricoPreco.__table__.c[coluna] for coluna in ESQUEMAS["historico_precos"].names]
+    with Session() as session:
+        return [dict(linha._mapping) for linha in session.execute(select(*colunas).order_by(HistoricoPreco.id))]
+
+
+def historico_exportado(destino):
+    return sorted(ler_exportacao(destino, "historico_precos").to_pylist(), key=lambda linha: linha["id"])
+
+
+@pytest.fixture
+def lidos(monkeypatch):
+    """Partições de `historico_precos` lidas do Parquet durante a exportação."""
+    particoes = []
+    ler_original = exportacao.pq.read_table
+
+    def ler(caminho, *args, **kwargs):
+        if caminho.parent.parent.name == "historico_precos":
+            particoes.append(caminho.parent.name.partition("=")[2])
+        return ler_original(caminho, *args, **kwargs)
+
+    monkeypatch.setattr(exportacao.pq, "read_table", ler)
+    return particoes
+
+
+def test_exporta_apenas_as_particoes_alteradas(banco, relogio, tmp_path, lidos):
+    destino = tmp_path / "exportacao"
+    set_cidades(["Cidade A"])
+    precos = {produto: 100 * produto for produto in range(1, 7)}
+    for numero, mudancas in enumerate([{}, {1: 150, 2: 250}, {3: 350}]):
+        relogio.hoje = dia(numero)
+        precos.update(mudancas)
+        gravar_dia(precos)
+    exportar(destino)
+    assert historico_exportado(destino) == historico_no_banco()
+
+    # sem mudanças: nenhum arquivo gravado, nem o manifesto, e só a partição do dia é relida
+    antes = arquivos(destino)
+    lidos.clear()
+    assert not any(exportar(destino).values())
+    assert arquivos(destino) == antes
+    assert set(lidos) <= {dia(2).isoformat()}
+
+    # um preço aberto desde o primeiro dia muda: só a partição dele e a do dia recebem arquivos
+    relogio.hoje = dia(3)
+    precos[4] = 450
+    gravar_dia(precos)
+    lidos.clear()
+    exportar(destino)
+    novos = set(arquivos(destino)) - set(antes)
+    assert novos == {
+        f"historico_precos/data_inicio={dia(0).isoformat()}/parte-00002.parquet",
+        f"historico_precos/data_inicio={dia(3).isoformat()}/parte-00002.parquet",
+    }
+    assert set(lidos) == {dia(0).isoformat(), dia(2).isoformat()}
+    assert historico_exportado(destino) == historico_no_banco()
+
+    # o preço do dia é substituído em uma nova execução no mesmo dia (o registro do dia é removido)
+    precos[4] = 470
+    gravar_dia(precos)
+    lidos.clear()
+    exportar(destino)
+    assert set(lidos) == {dia(3).isoformat()}
+    assert historico_exportado(destino) == historico_no_banco()
+
+    # dia seguinte: fecha o produto 5 e remove o 6 do crawl
+    relogio.hoje = dia(4)
+    precos[5] = 550
+    del precos[6]
+    gravar_dia(precos)
+    exportar(destino)
+    assert historico_exportado(destino) == historico_no_banco()
+    assert ler_exportacao(destino, "produtos").num_rows == 6
@@ -0,0 +1,127 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+import pytest
+from conftest import DIA_INICIAL
+from sqlalchemy import select
+
+from database import (
+    HistoricoPreco,
+    IndicePrecoCategoria,
+    Produto,
+    Session,
+    atualizar_indice_categorias,
+    processar_dados_brutos,
+    reconstruir_indice_categorias,
+    salvar_preco,
+    salvar_produto,
+    set_cidades,
+    update_categoria,
+)
+
+CIDADES = ["Cidade A", "Cidade B"]
+CATEGORIAS = ["hortifruti/frutas", "hortifruti/legumes", "bebidas", None]
+
+
+def indice_do_dia(dia):
+    indice = IndicePrecoCategoria
+    with Session() as session:
+        linhas = session.execute(
+            select(
+                indice.categoria,
+                indice.cidade_id,
+                indice.nivel,
+                indice.produtos,
+                indice.soma_precos,
+                indice.comparaveis,
+                indice.mudancas,
+                indice.soma_variacao,
+            ).where(indice.data == dia),
+        ).all()
+    return {(categoria, cidade): (*valores[:-1], pytest.approx(valores[-1])) for categoria, cidade, *valores in linhas}
+
+
+def indice_esperado(dia):
+    """Agrega em Python os registros vigentes no dia, com as categorias atuais dos produtos."""
+    with Session() as session:
+        categorias = dict(session.execute(select(Produto.id, Produto.categoria)).all())
+        registros = session.execute(
+            select(
+                HistoricoPreco.produto_id,
+                HistoricoPreco.cidade_id,
+                HistoricoPreco.preco,
+                HistoricoPreco.data_inicio,
+                HistoricoPreco.data_fim,
+            ),
+        ).all()
+    fechados_ontem = {
+        (produto, cidade): preco for produto, cidade, preco, _, fim in registros if fim == dia - timedelta(days=1)
+    }
+    somas = defaultdict(lambda: [0, 0, 0, 0, 0.0])
+    for produto, cidade, preco, inicio, fim in registros:
+        if inicio > dia or (fim is not None and fim < dia) or not categorias[produto]:
+            continue
+        anterior = fechados_ontem.get((produto, cidade)) if inicio == dia else None
+        partes = categorias[produto].split("/")
+        for nivel in range(1, len(partes) + 1):
+            soma = somas[("/".join(partes[:nivel]), cidade, nivel)]
+            soma[0] += 1
+            soma[1] += preco
+            soma[2] += 0 if inicio == dia and anterior is None else 1
+            if anterior is not None:
+                soma[3] += anterior != preco
+                soma[4] += (preco - anterior) * 100.0 / anterior
+    return {
+        (categoria, cidade): (nivel, *soma[:-1], pytest.approx(soma[-1]))
+        for (categoria, cidade, nivel), soma in somas.items()
+    }
+
+
+def gravar_dia(sorteio, precos, categorias):
+    """Muda parte dos preços e das categorias e grava o crawl do dia (um resultado por cidade)."""
+    for produto in precos:
+        if sorteio.random() < 0.25:
+            precos[produto] = sorteio.randint(100, 9000)
+        if sorteio.random() < 0.1:
+            categorias[produto] = sorteio.choice(CATEGORIAS)
+    resultados = []
+    for indice, cidade in enumerate(CIDADES):
+        presentes = sorted(produto for produto in precos if sorteio.random() > 0.15)
+        resultados.append(
+            (
+                [(p, f"Produto {p}", f"https://loja/produto-{p}", categorias[p]) for p in presentes],
+                [(p, precos[p] + (indice if p % 3 == 0 else 0)) for p in presentes],
+                cidade,
+            ),
+        )
+    dados = processar_dados_brutos(resultados)
+    salvar_produto(dados.produtos)
+    salvar_preco(dados.precos_uniformes, dados.precos_variaveis)
+
+
+def test_indice_incremental_igual_a_agregar_o_dia(banco, relogio):
+    sorteio = random.Random(11)
+    set_cidades(CIDADES)
+    precos = {produto: sorteio.randint(100, 9000) for produto in range(1, 41)}
+    categorias = {produto: sorteio.choice(CATEGORIAS) for produto in precos}
+
+    for dia in range(8):
+        relogio.hoje = DIA_INICIAL + timedelta(days=dia)
+        # um dia sem execução: o seguinte parte das linhas de dois dias antes
+        if dia == 4:
+            continue
+        gravar_dia(sorteio, precos, categorias)
+        atualizar_indice_categorias()
+        assert indice_do_dia(relogio.hoje) == indice_esperado(relogio.hoje)
+
+        # produtos categorizados depois do crawl (como `extrair_link_categoria_restante`)
+        with Session() as session:
+            sem_categoria = session.execute(select(Produto.id).where(Produto.categoria.is_(None))).scalars().all()
+        update_categoria([(produto_id, sorteio.choice(CATEGORIAS[:-1])) for produto_id in sem_categoria[:3]])
+        atualizar_indice_categorias()
+        assert indice_do_dia(relogio.hoje) == indice_esperado(relogio.hoje)
+
+    incremental = indice_do_dia(relogio.hoje)
+    reconstruir_indice_categorias()
+    assert indice_do_dia(relogio.hoje) == incremental
@@ -0,0 +1,61 @@
+import random
+from datetime import timedelta
+
+import numpy as np
+from conftest import DIA_INICIAL
+
+from database import (
+    carregar_matriz_precos,
+    close_gap,
+    log_execucao,
+    materializar_precos_do_dia,
+    processar_dados_brutos,
+    reconstruir_matriz_precos,
+    salvar_preco,
+    salvar_produto,
+    set_cidades,
+)
+
+CIDADES = ["Cidade A", "Cidade B", "Cidade C"]
+
+
+def test_matriz_incremental_igual_a_reconstrucao(banco, relogio):
+    sorteio = random.Random(5)
+    set_cidades(CIDADES)
+    precos = {produto: sorteio.randint(100, 9000) for produto in range(1, 31)}
+    for dia in range(8):
+        relogio.hoje = DIA_INICIAL + timedelta(days=dia)
+        # dia sem execução: coluna vazia nas duas formas, pois o gap fecha os registros
+        if dia == 4:
+            continue
+        for produto in precos:
+            if sorteio.random() < 0.3:
+                precos[produto] = sorteio.randint(100, 9000)
+        # produtos novos ao longo dos dias ganham índices depois dos existentes
+        precos[100 + dia] = sorteio.randint(100, 9000)
+        resultados = []
+        for indice, cidade in enumerate(CIDADES):
+            presentes = sorted(produto for produto in precos if sorteio.random() > 0.2)
+            resultados.append(
+                (
+                    [(p, f"Produto {p}", f"https://loja/produto-{p}", None) for p in presentes],
+                    [(p, precos[p] + (indice if p % 3 == 0 else 0)) for p in presentes],
+                    cidade,
+                ),
+            )
+        dados = processar_dados_brutos(resultados)
+        close_gap()
+        salvar_produto(dados.produtos)
+        salvar_preco(dados.precos_uniformes, dados.precos_variaveis)
+        materializar_precos_do_dia()
+        log_execucao()
+
+    datas, pares, incremental = carregar_matriz_precos(como_dataframe=False)
+    assert len(datas) == 8
+    assert not incremental[4].any()
+
+    reconstruir_matriz_precos()
+    datas_reconstrucao, pares_reconstrucao, reconstrucao = carregar_matriz_precos(como_dataframe=False)
+    np.testing.assert_array_equal(datas_reconstrucao, datas)
+    np.testing.assert_array_equal(pares_reconstrucao, pares)
+    np.testing.assert_array_equal(reconstrucao, incremental)
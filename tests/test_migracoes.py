@@ -0,0 +1,118 @@
+from datetime import date
+
+import pytest
+from conftest import DIRETORIO_TESTES
+from sqlalchemy import create_engine, inspect, text
+
+from database import Base, init_db
+from database.migracoes import MIGRACOES, aplicar_migracoes, migracoes_pendentes
+
+# schema anterior às migrações: produtos sem site_id e preços em reais (FLOAT)
+SCHEMA_ORIGINAL = [
+    """CREATE TABLE produtos (
+        id INTEGER PRIMARY KEY, nome VARCHAR(255) NOT NULL, link VARCHAR(1024) NOT NULL UNIQUE,
+        categoria VARCHAR(255), data_atualizacao DATE NOT NULL)""",
+    "CREATE TABLE cidades (id INTEGER PRIMARY KEY AUTOINCREMENT, nome VARCHAR(255) NOT NULL UNIQUE)",
+    """CREATE TABLE historico_precos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, produto_id INTEGER NOT NULL REFERENCES produtos (id),
+        cidade_id INTEGER NOT NULL DEFAULT 1 REFERENCES cidades (id), preco FLOAT NOT NULL,
+        data_inicio DATE NOT NULL, data_fim DATE,
+        CONSTRAINT uq_historico_preco_periodo UNIQUE (produto_id, cidade_id, data_inicio))""",
+    """CREATE TABLE disponibilidade_cidades (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, produto_id INTEGER NOT NULL REFERENCES produtos (id),
+        cidade_id INTEGER NOT NULL REFERENCES cidades (id), disponivel BOOLEAN NOT NULL,
+        data_inicio DATE NOT NULL, data_fim DATE,
+        CONSTRAINT uq_disponibilidade_cidade_periodo UNIQUE (produto_id, cidade_id, data_inicio))""",
+    "CREATE TABLE log_execucao (data_execucao DATE PRIMARY KEY)",
+]
+
+DADOS_ORIGINAIS = [
+    "INSERT INTO cidades (nome) VALUES ('Sem Cidade'), ('Cidade A'), ('Cidade B')",
+    """INSERT INTO produtos (id, nome, link, categoria, data_atualizacao) VALUES
+        (1, 'Arroz', 'https://loja/arroz-101', 'mercearia/graos', '2026-01-03'),
+        (2, 'Feijão', 'https://loja/feijao-102', 'mercearia', '2026-01-03'),
+        (3, 'Café', 'https://loja/cafe', NULL, '2026-01-03')""",
+    """INSERT INTO historico_precos (produto_id, cidade_id, preco, data_inicio, data_fim) VALUES
+        (1, 1, 10.99, '2026-01-01', '2026-01-01'),
+        (1, 1, 12.5, '2026-01-02', NULL),
+        (2, 2, 7.1, '2026-01-01', NULL),
+        (2, 3, 7.35, '2026-01-02', NULL),
+        (3, 1, 19.9, '2026-01-01', '2026-01-02')""",
+    """INSERT INTO disponibilidade_cidades (produto_id, cidade_id, disponivel, data_inicio, data_fim) VALUES
+        (1, 2, 1, '2026-01-01', NULL), (2, 2, 1, '2026-01-01', NULL)""",
+    "INSERT INTO log_execucao VALUES ('2026-01-01'), ('2026-01-02'), ('2026-01-03')",
+]
+
+
+@pytest.fixture
+def banco_original(relogio):
+    relogio.hoje = date(2026, 1, 3)
+    engine = create_engine(f"sqlite:///{DIRETORIO_TESTES / 'original.db'}")
+    Base.metadata.drop_all(engine)
+    with engine.begin() as conexao:
+        for comando in SCHEMA_ORIGINAL + DADOS_ORIGINAIS:
+            conexao.exec_driver_sql(comando)
+    # o que a importação do pacote faz: cria apenas as tabelas novas
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def consultar(engine, sql):
+    with engine.connect() as conexao:
+        return [tuple(linha) for linha in conexao.execute(text(sql))]
+
+
+def test_migracoes_sobre_o_schema_original(banco_original):
+    engine = banco_original
+    assert [migracao.versao for migracao in migracoes_pendentes(engine)] == [m.versao for m in MIGRACOES]
+
+    assert aplicar_migracoes(engine) == [migracao.versao for migracao in MIGRACOES]
+    assert aplicar_migracoes(engine) == []
+
+    # 1: site_id a partir do final do link (sem id numérico fica nulo)
+    assert consultar(engine, "SELECT id, site_id FROM produtos ORDER BY id") == [(1, 101), (2, 102), (3, None)]
+    # 2 e 3: índices
+    indices = {indice["name"] for indice in inspect(engine).get_indexes("historico_precos")}
+    assert {"ix_historico_precos_abertos", "ix_historico_precos_produto_cidade_fim"} <= indices
+    assert "ix_produtos_sem_categoria" in {indice["name"] for indice in inspect(engine).get_indexes("produtos")}
+    # 4: preços em centavos, com o id dos registros preservado
+    assert consultar(engine, "SELECT id, preco FROM historico_precos ORDER BY id") == [
+        (1, 1099),
+        (2, 1250),
+        (3, 710),
+        (4, 735),
+        (5, 1990),
+    ]
+    # 5: resumo a partir do histórico
+    assert consultar(engine, "SELECT * FROM resumo_precos WHERE produto_id = 1") == [
+        (1, 1, 1099, 1250, "2026-01-01", "2026-01-02", 1),
+    ]
+    # 6: uma coluna da matriz por dia até hoje
+    assert consultar(engine, "SELECT data, pares FROM matriz_precos ORDER BY data") == [
+        ("2026-01-01", 4),
+        ("2026-01-02", 4),
+        ("2026-01-03", 4),
+    ]
+    # 8: índice por categoria; o produto 3 não tem categoria
+    assert consultar(
+        engine,
+        "SELECT data, categoria, cidade_id, produtos, soma_precos, mudancas FROM indice_precos_categorias "
+        "WHERE data = '2026-01-02' ORDER BY categoria, cidade_id",
+    ) == [
+        ("2026-01-02", "mercearia", 1, 1, 1250, 1),
+        ("2026-01-02", "mercearia", 2, 1, 710, 0),
+        ("2026-01-02", "mercearia", 3, 1, 735, 0),
+        ("2026-01-02", "mercearia/graos", 1, 1, 1250, 1),
+    ]
+
+
+def test_importar_nao_aplica_migracoes(banco):
+    with banco.ENGINE.begin() as conexao:
+        conexao.execute(text("DELETE FROM migracoes_aplicadas WHERE versao = :versao"), {"versao": MIGRACOES[-1].versao})
+
+    init_db()
+    assert migracoes_pendentes(banco.ENGINE) == [MIGRACOES[-1]]
+
+    assert aplicar_migracoes(banco.ENGINE) == [MIGRACOES[-1].versao]
+    assert migracoes_pendentes(banco.ENGINE) == []
@@ -0,0 +1,154 @@
+import asyncio
+import random
+from datetime import timedelta
+
+import pytest
+from conftest import DIA_INICIAL, limpar_banco
+from sqlalchemy import select
+
+from database import (
+    Cidade,
+    ContextoExecucao,
+    DisponibilidadeCidade,
+    HistoricoPreco,
+    Produto,
+    Session,
+    processar_dados_brutos,
+    salvar_disponibilidade,
+    salvar_preco,
+    salvar_produto,
+    set_cidades,
+)
+from scraper import pipeline as modulo_pipeline
+from scraper.pipeline import PipelineGravacao
+
+CIDADES = ["Cidade A", "Cidade B", "Cidade C"]
+CATEGORIAS = ["hortifruti/frutas", "hortifruti/legumes", "bebidas"]
+
+
+def gerar_dias(dias, produtos=60, semente=7):
+    """Resultados do crawl de cada dia: [(produtos, precos, cidade)], uma entrada por categoria e cidade.
+
+    Parte dos produtos aparece em duas categorias, com preço igual nas duas listagens da mesma
+    cidade, e parte tem preço diferente entre as cidades; os preços mudam e os produtos somem
+    e voltam de um dia para o outro.
+    """
+    sorteio = random.Random(semente)
+    categorias = {p: sorteio.sample(CATEGORIAS, sorteio.choice([1, 1, 2])) for p in range(1, produtos + 1)}
+    base = {p: sorteio.randint(100, 9000) for p in categorias}
+    for _ in range(dias):
+        for p in base:
+            if sorteio.random() < 0.2:
+                base[p] = sorteio.randint(100, 9000)
+        variaveis = {p for p in base if sorteio.random() < 0.3}
+        resultados = []
+        for indice, cidade in enumerate(CIDADES):
+            presentes = {p for p in base if sorteio.random() > 0.1}
+            for categoria in CATEGORIAS:
+                itens = sorted(p for p in presentes if categoria in categorias[p])
+                resultados.append(
+                    (
+                        [(p, f"Produto {p}", f"https://loja/produto-{p}", categoria) for p in itens],
+                        [(p, base[p] + (indice if p in variaveis else 0)) for p in itens],
+                        cidade,
+                    ),
+                )
+        # a ordem de chegada dos resultados não segue as categorias nem as cidades
+        sorteio.shuffle(resultados)
+        yield resultados
+
+
+def gravar_em_uma_passada(resultados):
+    dados = processar_dados_brutos(resultados)
+    salvar_produto(dados.produtos)
+    salvar_preco(dados.precos_uniformes, dados.precos_variaveis)
+    salvar_disponibilidade(dados.disponibilidades)
+    return True
+
+
+def gravar_pelo_pipeline(resultados, tamanho_lote=1):
+    async def executar():
+        with ContextoExecucao() as contexto:
+            pipeline = PipelineGravacao(contexto=contexto, tamanho_lote=tamanho_lote)
+            for resultado in resultados:
+                await pipeline.adicionar(resultado)
+            return await pipeline.finalizar()
+
+    return asyncio.run(executar())
+
+
+def historicos():
+    with Session() as session:
+        precos = session.execute(
+            select(Produto.site_id, Cidade.nome, HistoricoPreco.preco, HistoricoPreco.data_inicio, HistoricoPreco.data_fim)
+            .join(Produto, Produto.id == HistoricoPreco.produto_id)
+            .join(Cidade, Cidade.id == HistoricoPreco.cidade_id),
+        ).all()
+        disponibilidades = session.execute(
+            select(
+                Produto.site_id,
+                Cidade.nome,
+                DisponibilidadeCidade.disponivel,
+                DisponibilidadeCidade.data_inicio,
+                DisponibilidadeCidade.data_fim,
+            )
+            .join(Produto, Produto.id == DisponibilidadeCidade.produto_id)
+            .join(Cidade, Cidade.id == DisponibilidadeCidade.cidade_id),
+        ).all()
+    return sorted(precos), sorted(disponibilidades)
+
+
+def executar_dias(relogio, gravar, dias):
+    set_cidades(CIDADES)
+    for dia, resultados in enumerate(dias):
+        relogio.hoje = DIA_INICIAL + timedelta(days=dia)
+        assert gravar(resultados)
+    return historicos()
+
+
+@pytest.mark.parametrize("tamanho_lote", [1, 50, 10**6])
+def test_pipeline_em_lotes_igual_a_uma_passada(banco, relogio, tamanho_lote):
+    dias = list(gerar_dias(5))
+    esperado = executar_dias(relogio, gravar_em_uma_passada, dias)
+
+    limpar_banco(banco.ENGINE)
+    obtido = executar_dias(relogio, lambda resultados: gravar_pelo_pipeline(resultados, tamanho_lote), dias)
+
+    assert obtido == esperado
+
+
+def test_produto_em_duas_categorias_classificado_uma_vez(banco, relogio):
+    """Preço igual em A e B numa categoria e diferente em C noutra: é variável, sem registro uniforme."""
+    set_cidades(CIDADES)
+    produto = [(1, "Produto 1", "https://loja/produto-1", "bebidas")]
+    resultados = [
+        (produto, [(1, 500)], "Cidade A"),
+        (produto, [(1, 500)], "Cidade B"),
+        ([(1, "Produto 1", "https://loja/produto-1", "hortifruti/frutas")], [(1, 650)], "Cidade C"),
+    ]
+    assert gravar_pelo_pipeline(resultados, tamanho_lote=1)
+
+    precos, _ = historicos()
+    assert precos == [
+        (1, "Cidade A", 500, relogio.hoje, None),
+        (1, "Cidade B", 500, relogio.hoje, None),
+        (1, "Cidade C", 650, relogio.hoje, None),
+    ]
+
+
+def test_lote_com_falha_nao_reconcilia(banco, relogio, monkeypatch):
+    set_cidades(CIDADES)
+    produto = [(1, "Produto 1", "https://loja/produto-1", "bebidas")]
+    assert gravar_pelo_pipeline([(produto, [(1, 500)], cidade) for cidade in CIDADES])
+
+    def falhar(*args, **kwargs):
+        raise ValueError("falha simulada")
+
+    relogio.hoje += timedelta(days=1)
+    monkeypatch.setattr(modulo_pipeline, "salvar_disponibilidade", falhar)
+    assert not gravar_pelo_pipeline([(produto, [(1, 700)], cidade) for cidade in CIDADES])
+
+    # nada do dia foi gravado nem fechado: o registro de ontem continua aberto
+    precos, disponibilidades = historicos()
+    assert precos == [(1, "Sem Cidade", 500, relogio.hoje - timedelta(days=1), None)]
+    assert all(data_fim is None for *_, data_fim in disponibilidades)
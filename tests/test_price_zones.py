@@ -0,0 +1,35 @@
+import json
+from datetime import timedelta
+
+from conftest import DIRETORIO_TESTES
+
+from scraper.price_zones import ZonaPreco, carregar_zonas, salvar_zonas
+
+CAMINHO = DIRETORIO_TESTES / "zonas_preco.json"
+
+
+def test_zonas_salvas_sem_cookies(relogio):
+    zonas = [
+        ZonaPreco("Cidade A", {"sessao": "a-antigo"}, ["Cidade A", "Cidade B"]),
+        ZonaPreco("Cidade C", {"sessao": "c-antigo"}, ["Cidade C"]),
+    ]
+    salvar_zonas(zonas, CAMINHO)
+    assert "antigo" not in CAMINHO.read_text(encoding="utf-8")
+
+    relogio.hoje += timedelta(days=1)
+    cookies = [("Cidade A", {"sessao": "a"}), ("Cidade B", {"sessao": "b"}), ("Cidade C", {"sessao": "c"})]
+    assert carregar_zonas(cookies, CAMINHO, validade_dias=7) == [
+        ZonaPreco("Cidade A", {"sessao": "a"}, ["Cidade A", "Cidade B"]),
+        ZonaPreco("Cidade C", {"sessao": "c"}, ["Cidade C"]),
+    ]
+    assert carregar_zonas(cookies[:2], CAMINHO, validade_dias=7) is None
+
+
+def test_arquivo_antigo_com_cookies_e_detectado_de_novo(relogio):
+    dados = {
+        "data": relogio.hoje.isoformat(),
+        "zonas": [{"representante": "Cidade A", "cookie": {"sessao": "a"}, "membros": ["Cidade A"]}],
+    }
+    CAMINHO.write_text(json.dumps(dados), encoding="utf-8")
+
+    assert carregar_zonas([("Cidade A", {"sessao": "a"})], CAMINHO, validade_dias=7) is None
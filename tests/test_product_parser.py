@@ -0,0 +1,118 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from scraper.utils import product_parser
+from scraper.utils.product_parser import (
+    BACKENDS,
+    CLASSE_NOME,
+    CLASSE_PRECO,
+    URL_SITE,
+    Cartao,
+    MontadorCartoes,
+    backend_disponivel,
+    converter_preco,
+    iterar_cartoes,
+    parsear_pagina,
+)
+
+
+def cartao(nome, preco):
+    return (
+        '<div class="flex flex-col bg-white rounded">'
+        '<div class="flex justify-center mt-5 cursor-pointer"><img src="/img/produto.jpg"></div>'
+        f'<div class="{CLASSE_NOME}">{nome}</div>'
+        f'<div class="flex flex-col items-center">{preco}</div></div>'
+    )
+
+
+def preco(texto):
+    return f'<div class="{CLASSE_PRECO}">{texto}</div>'
+
+
+LISTAGEM = (
+    "<html><body><ul><li><a href='/categoria/mercearia'>menu</a></li></ul><main>"
+    + cartao('<a href="/produto/arroz-tipo-1-5kg-101">Arroz Tipo 1 5kg</a>', preco("R$ 25,90"))
+    + cartao('<a href="/produto/tv-50-102">TV 50" &amp; suporte</a>', preco("R$ 1.234,56"))
+    + cartao('<a href="/produto/geladeira-103">\n  Geladeira  \n</a>', preco(" R$ 12.345,00 "))
+    # sem imagem
+    + '<div class="flex flex-col bg-white rounded">'
+    f'<div class="{CLASSE_NOME}"><a href="/produto/cafe-104">Café</a></div>'
+    f'<div class="flex flex-col items-center">{preco("R$ 9,99")}</div></div>'
+    # sem preço, sem link e um card normal depois deles
+    + cartao('<a href="/produto/feijao-105">Feijão</a>', "")
+    + cartao("<span>Produto sem link</span>", preco("R$ 3,00"))
+    + cartao('<a href="/produto/leite-107">Leite</a>', preco("R$ 4,50"))
+    + "</main></body></html>"
+)
+
+ESPERADO = [
+    Cartao(0, "Arroz Tipo 1 5kg", URL_SITE + "/produto/arroz-tipo-1-5kg-101", 2590),
+    Cartao(1, 'TV 50" & suporte', URL_SITE + "/produto/tv-50-102", 123456),
+    Cartao(2, "Geladeira", URL_SITE + "/produto/geladeira-103", 1234500),
+    Cartao(3, "Café", URL_SITE + "/produto/cafe-104", 999),
+    Cartao(4, "Feijão", URL_SITE + "/produto/feijao-105", None, "card sem preço"),
+    Cartao(5, None, None, None, "card sem link"),
+    Cartao(6, "Leite", URL_SITE + "/produto/leite-107", 450),
+]
+
+BACKENDS_INSTALADOS = [backend for backend in BACKENDS if backend_disponivel(backend)]
+
+
+def cartoes_beautifulsoup(html):
+    """Referência: os blocos de nome e de preço localizados pelo BeautifulSoup, como no extrator original."""
+
+    def bloco(tag):
+        classe = " ".join(tag.get("class", []))
+        return classe == CLASSE_NOME or (tag.name == "div" and classe == CLASSE_PRECO)
+
+    montador = MontadorCartoes()
+    for tag in BeautifulSoup(html, "html.parser").find_all(bloco):
+        if " ".join(tag["class"]) == CLASSE_NOME:
+            link = tag.find("a")
+            nome = link.text.strip() if link else ""
+            montador.nome(nome or None, link.get("href") if link else None)
+        else:
+            montador.preco(tag.text.strip())
+    montador.fechar()
+    return montador.retirar()
+
+
+def test_referencia_beautifulsoup():
+    assert cartoes_beautifulsoup(LISTAGEM) == ESPERADO
+
+
+@pytest.mark.parametrize("backend", BACKENDS_INSTALADOS)
+@pytest.mark.parametrize("tamanho_pedaco", [7, product_parser.TAMANHO_PEDACO])
+def test_backends_iguais_ao_beautifulsoup(monkeypatch, backend, tamanho_pedaco):
+    # pedaços pequenos cortam tags e textos entre duas chamadas de `feed`
+    monkeypatch.setattr(product_parser, "TAMANHO_PEDACO", tamanho_pedaco)
+    assert list(iterar_cartoes(LISTAGEM, backend)) == cartoes_beautifulsoup(LISTAGEM)
+
+
+@pytest.mark.parametrize("backend", BACKENDS_INSTALADOS)
+def test_parsear_pagina_descarta_cards_malformados(backend):
+    produtos, precos, erros = parsear_pagina(LISTAGEM, "mercearia", backend)
+
+    assert produtos == [
+        (101, "Arroz Tipo 1 5kg", URL_SITE + "/produto/arroz-tipo-1-5kg-101", "mercearia"),
+        (102, 'TV 50" & suporte', URL_SITE + "/produto/tv-50-102", "mercearia"),
+        (103, "Geladeira", URL_SITE + "/produto/geladeira-103", "mercearia"),
+        (104, "Café", URL_SITE + "/produto/cafe-104", "mercearia"),
+        (107, "Leite", URL_SITE + "/produto/leite-107", "mercearia"),
+    ]
+    assert precos == [(101, 2590), (102, 123456), (103, 1234500), (104, 999), (107, 450)]
+    assert [erro.split(":")[0] for erro in erros] == ["card 4", "card 5"]
+
+
+@pytest.mark.parametrize(
+    ("texto", "centavos"),
+    [("R$ 25,90", 2590), ("R$ 1.234,56", 123456), ("R$ 1.000.000,01", 100000001), ("R$ 10", 1000), ("7,5", 750)],
+)
+def test_converter_preco(texto, centavos):
+    assert converter_preco(texto) == centavos
+
+
+@pytest.mark.parametrize("texto", ["", "R$ -1,00", "R$ 1,234", "R$ 1.2,3a", "Indisponível"])
+def test_converter_preco_invalido(texto):
+    with pytest.raises(ValueError, match="preço inválido"):
+        converter_preco(texto)
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from sqlalchemy import select
+
+from database import Produto, ProdutoInfo, Session, salvar_produto
+
+
+def produtos_gravados():
+    with Session() as session:
+        return {
+            site_id: (nome, categoria, data)
+            for site_id, nome, categoria, data in session.execute(
+                select(Produto.site_id, Produto.nome, Produto.categoria, Produto.data_atualizacao),
+            )
+        }
+
+
+def test_so_reescreve_produtos_que_mudaram(banco, relogio):
+    ontem = relogio.hoje
+    ids = salvar_produto(
+        [
+            ProdutoInfo(1, "Arroz", "https://loja/arroz-1", "mercearia"),
+            ProdutoInfo(2, "Feijão", "https://loja/feijao-2", "mercearia"),
+            ProdutoInfo(3, "Café", "https://loja/cafe-3", None),
+        ],
+    )
+
+    relogio.hoje += timedelta(days=1)
+    novos_ids = salvar_produto(
+        [
+            ProdutoInfo(1, "Arroz", "https://loja/arroz-1", "mercearia"),
+            ProdutoInfo(2, "Feijão Carioca", "https://loja/feijao-2", "mercearia"),
+            ProdutoInfo(3, "Café", "https://loja/cafe-3", "bebidas"),
+            ProdutoInfo(4, "Leite", "https://loja/leite-4", None),
+        ],
+    )
+
+    assert novos_ids == ids | {4: novos_ids[4]}
+    assert produtos_gravados() == {
+        1: ("Arroz", "mercearia", ontem),
+        2: ("Feijão Carioca", "mercearia", relogio.hoje),
+        3: ("Café", "bebidas", relogio.hoje),
+        4: ("Leite", None, relogio.hoje),
+    }
+
+
+def test_categoria_vazia_nao_apaga_a_atual(banco, relogio):
+    salvar_produto([ProdutoInfo(1, "Arroz", "https://loja/arroz-1", "mercearia")])
+    relogio.hoje += timedelta(days=1)
+    salvar_produto([ProdutoInfo(1, "Arroz", "https://loja/arroz-1", None)])
+
+    assert produtos_gravados() == {1: ("Arroz", "mercearia", relogio.hoje - timedelta(days=1))}
@@ -0,0 +1,62 @@
+import random
+from datetime import timedelta
+
+from conftest import DIA_INICIAL
+from sqlalchemy import select
+
+from database import (
+    ResumoPreco,
+    Session,
+    close_gap,
+    log_execucao,
+    processar_dados_brutos,
+    reconstruir_resumo_precos,
+    salvar_preco,
+    salvar_produto,
+    set_cidades,
+)
+
+CIDADES = ["Cidade A", "Cidade B"]
+
+
+def gravar_dias(relogio, dias, produtos=30, semente=3, pular=()):
+    """Grava `dias` execuções com preços que mudam, somem e voltam (iguais ou não) entre os dias."""
+    sorteio = random.Random(semente)
+    set_cidades(CIDADES)
+    precos = {produto: sorteio.randint(100, 9000) for produto in range(1, produtos + 1)}
+    for dia in range(dias):
+        relogio.hoje = DIA_INICIAL + timedelta(days=dia)
+        if dia in pular:
+            continue
+        for produto in precos:
+            if sorteio.random() < 0.3:
+                precos[produto] = sorteio.choice([precos[produto] + 10, sorteio.randint(100, 9000)])
+        resultados = []
+        for indice, cidade in enumerate(CIDADES):
+            presentes = sorted(produto for produto in precos if sorteio.random() > 0.2)
+            resultados.append(
+                (
+                    [(p, f"Produto {p}", f"https://loja/produto-{p}", None) for p in presentes],
+                    [(p, precos[p] + (indice if p % 4 == 0 else 0)) for p in presentes],
+                    cidade,
+                ),
+            )
+        dados = processar_dados_brutos(resultados)
+        close_gap()
+        salvar_produto(dados.produtos)
+        salvar_preco(dados.precos_uniformes, dados.precos_variaveis)
+        log_execucao()
+
+
+def resumo():
+    with Session() as session:
+        return sorted(tuple(linha) for linha in session.execute(select(*ResumoPreco.__table__.columns)))
+
+
+def test_resumo_incremental_igual_a_reconstrucao(banco, relogio):
+    gravar_dias(relogio, 8, pular={3})
+    incremental = resumo()
+    assert any(mudancas > 1 for *_, mudancas in incremental)
+
+    reconstruir_resumo_precos()
+    assert resumo() == incremental
@@ -0,0 +1,53 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Cronometro:
+    """Acumula o tempo gasto em cada etapa nomeada (ex: "db.precos"), inclusive entre threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tempos = {}
+        self.chamadas = {}
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            decorrido = time.perf_counter() - inicio
+            with self._lock:
+                self.tempos[nome] = self.tempos.get(nome, 0.0) + decorrido
+                self.chamadas[nome] = self.chamadas.get(nome, 0) + 1
+
+    def resumo(self, prefixo=""):
+        """Retorna {etapa: segundos} das etapas que começam com `prefixo`."""
+        with self._lock:
+            return {nome: round(tempo, 4) for nome, tempo in self.tempos.items() if nome.startswith(prefixo)}
+
+    def limpar(self):
+        with self._lock:
+            self.tempos.clear()
+            self.chamadas.clear()
+
+
+# cronômetro global do processo, usado pelo pipeline e lido pelo benchmark
+CRONOMETRO = Cronometro()
+
+
+def pico_memoria_mb():
+    """Pico de memória residente (RSS) do processo em MB."""
+    try:
+        import resource
+    except ImportError:
+        # Windows: o psutil expõe o pico do working set
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em bytes no macOS e em KB no Linux
+    return pico / 1024 / 1024 if sys.platform == "darwin" else pico / 1024